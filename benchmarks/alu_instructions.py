@@ -0,0 +1,191 @@
+"""
+Instructions executed by common loops written with and without the extended ALU instructions.
+
+    python benchmarks/alu_instructions.py [runs]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crash_vm import VM, Engine, RunStatus, Address, asm_compile  # noqa: E402
+
+FACTORIAL_ARG = 7
+GCD_ARGS = (1071, 462)
+POPCOUNT_ARG = 0x7ff7
+
+FACTORIAL = '''
+        Ld :a
+        St :a_i
+    loop:
+        Ld :result
+        Mul :a_i
+        St :result
+{decrement}
+{check}
+        Jif :loop
+        Int 0
+    Offset 250
+        a_i:
+            0
+        const_1:
+            1
+        a:
+            {arg}
+        result:
+            1
+'''
+
+FACTORIAL_CASES = {
+    'base': ('''
+        Ld :const_1
+        Neg
+        Add :a_i
+        St :a_i''', '''
+        Gt :const_1'''),
+    'extended': ('''
+        Ld :a_i
+        Sub :const_1
+        St :a_i''', '''
+        Gt :const_1'''),
+}
+
+GCD_BASE = '''
+    # subtract the smaller of a, b from the greater one until they are equal
+    loop:
+        Ld :a
+        Gt :b
+        Jif :a_greater
+        Ld :b
+        Gt :a
+        Not
+        Jif :done
+        Ld :a
+        Neg
+        Add :b
+        St :b
+        Jmp :loop
+    a_greater:
+        Ld :b
+        Neg
+        Add :a
+        St :a
+        Jmp :loop
+    done:
+        Int 0
+    Offset 250
+        a:
+            {a}
+        b:
+            {b}
+'''
+
+GCD_EXTENDED = '''
+    # a, b = b, a % b until b is 0
+    loop:
+        Ld :b
+        Eq :zero
+        Jif :done
+        Ld :a
+        Mod :b
+        Xchg :b
+        St :a
+        Jmp :loop
+    done:
+        Int 0
+    Offset 250
+        a:
+            {a}
+        b:
+            {b}
+        zero:
+            0
+'''
+
+POPCOUNT_BASE = '''
+    # count odd values while halving
+    loop:
+        Ld :x
+        Not
+        Jif :done
+        Ld :x
+        Div :const_2
+        Mul :const_2
+        Neg
+        Add :x
+        Add :count
+        St :count
+        Ld :x
+        Div :const_2
+        St :x
+        Jmp :loop
+    done:
+        Int 0
+    Offset 250
+        x:
+            {x}
+        count:
+            0
+        const_2:
+            2
+'''
+
+POPCOUNT_EXTENDED = '''
+    loop:
+        Ld :x
+        Not
+        Jif :done
+        Ld :x
+        BAnd :const_1
+        Add :count
+        St :count
+        Ld :x
+        Shr :const_1
+        St :x
+        Jmp :loop
+    done:
+        Int 0
+    Offset 250
+        x:
+            {x}
+        count:
+            0
+        const_1:
+            1
+'''
+
+CASES = [
+    ('factorial', 253, {variant: FACTORIAL.format(decrement=decrement, check=check, arg=FACTORIAL_ARG)
+                        for variant, (decrement, check) in FACTORIAL_CASES.items()}),
+    ('gcd', 250, {'base': GCD_BASE.format(a=GCD_ARGS[0], b=GCD_ARGS[1]),
+                  'extended': GCD_EXTENDED.format(a=GCD_ARGS[0], b=GCD_ARGS[1])}),
+    ('popcount', 251, {'base': POPCOUNT_BASE.format(x=POPCOUNT_ARG),
+                       'extended': POPCOUNT_EXTENDED.format(x=POPCOUNT_ARG)}),
+]
+
+
+def measure(program, result_address: int, runs: int):
+    best = None
+    for _ in range(runs):
+        vm = VM()
+        vm.load_program(program)
+        start_ts = time.perf_counter()
+        status = vm.run(engine=Engine.Fast)
+        elapsed = time.perf_counter() - start_ts
+        assert status is RunStatus.Halted
+        best = elapsed if best is None else min(best, elapsed)
+    return vm[Address(result_address)].value, vm.instructions, vm.cycles, best
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f'{"program":<12}{"variant":<10}{"result":>8}{"instructions":>14}{"cycles":>10}{"best, ms":>10}')
+    for name, result_address, variants in CASES:
+        for variant, source in variants.items():
+            result, instructions, cycles, best = measure(asm_compile(source), result_address, runs)
+            print(f'{name:<12}{variant:<10}{result:>8}{instructions:>14}{cycles:>10}{best * 1000:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
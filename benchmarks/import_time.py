@@ -0,0 +1,39 @@
+"""
+Cold start benchmark, measures imports in fresh interpreters.
+
+    python benchmarks/import_time.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = [
+    ('interpreter', 'pass'),
+    ('runtime', 'import crash_vm'),
+    ('runtime + assembler', 'import crash_vm; crash_vm.asm_compile'),
+    ('first VM', 'import crash_vm; crash_vm.VM()'),
+]
+
+TIMER = 'import time; _ts = time.perf_counter(); {}; print(time.perf_counter() - _ts)'
+
+
+def measure(statement: str, runs: int):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', TIMER.format(statement)], cwd=ROOT)
+        samples.append(float(output))
+    return min(samples), statistics.median(samples)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for name, statement in CASES:
+        best, median = measure(statement, runs)
+        print(f'{name:<24} best {best * 1000:7.2f} ms    median {median * 1000:7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,25 @@
 __version__ = '0.0.3'
 
+import importlib
+
 from .cpu import CPU, Instructions
 from .bus import Bus
-from .ram import RAM
-from .vm import VM
+from .ram import RAM, PagedRAM
+from .vm import VM, Engine, RunStatus
 from ._types import Address, NativeNumber, AddressRange, NativeFalse, NativeTrue
-from .asm import compile as asm_compile
+
+# optional components imported on first use, so running prebuilt images doesn't pay for them
+# and the runtime only bundle can leave them out
+_lazy_attributes = {
+    'asm_compile': ('.asm', 'compile'),
+    'MMU': ('.mmu', 'MMU'),
+    'MultiCoreVM': ('.smp', 'MultiCoreVM'),
+}
+
+
+def __getattr__(name):
+    try:
+        module_name, attribute = _lazy_attributes[name]
+    except KeyError:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    return getattr(importlib.import_module(module_name, __name__), attribute)
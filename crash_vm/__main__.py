@@ -0,0 +1,149 @@
+"""
+Headless runner.
+
+    python -m crash_vm run program.asm --arg 5 --ram 0xf0 --engine fast --max-cycles 100000 --timeout 10
+    python -m crash_vm run program.img --arg 5 --cache ~/.cache/crash_vm
+    python -m crash_vm run program.img --arg 5 --engine fast --verify
+    python -m crash_vm compile program.asm -o program.img
+    python -m crash_vm translate program.asm -o program_aot.py
+
+Sources with .asm extension are assembled, any other file is loaded as an image written by `compile`.
+Argument words are attached right after RAM and followed by output words, as in the tests and the web page.
+Modules are imported on demand, so short jobs are not dominated by the runner startup.
+"""
+import argparse
+import json
+import sys
+import time
+
+SOURCE_EXTENSIONS = ('.asm',)
+
+
+def _int(value: str) -> int:
+    return int(value, 0)
+
+
+def _load_program(path: str):
+    if path.lower().endswith(SOURCE_EXTENSIONS):
+        from .asm import compile as asm_compile
+        with open(path) as source:
+            return asm_compile(source.read())
+    from .image import load_image
+    with open(path, 'rb') as image:
+        return load_image(image)
+
+
+def _compile(args) -> int:
+    from .asm import compile as asm_compile
+    from .image import save_image
+    with open(args.source) as source:
+        program = asm_compile(source.read())
+    with open(args.output, 'wb') as image:
+        save_image(program, image)
+    return 0
+
+
+def _translate(args) -> int:
+    from .aot import translate
+    source = translate(_load_program(args.source))
+    with open(args.output, 'w') as module:
+        module.write(source)
+    return 0
+
+
+def _run(args) -> int:
+    from .vm import VM
+    from .peripherals import ArgvPeripheral, OutputPeripheral
+    from .cpu import SWInterrupt
+    from .verify import VerificationError
+
+    program = _load_program(args.program)
+    peripherals = []
+    if args.arg:
+        peripherals.append((len(args.arg), ArgvPeripheral(*args.arg)))
+    outp = OutputPeripheral(args.out)
+    if args.out > 0:
+        peripherals.append((args.out, outp))
+
+    vm = VM(args.ram, peripherals, ram_page_size=args.ram_page_size)
+    try:
+        vm.load_program(program, verify=args.verify)
+    except VerificationError as error:
+        sys.stderr.write(f'{args.program}: {error}\n')
+        return 1
+
+    result = {}
+    start_ts = time.perf_counter()
+    deadline = None if args.timeout is None else time.monotonic() + args.timeout
+    try:
+        if args.cache is not None:
+            from .cache import ResultCache
+            cache = ResultCache(args.cache, args.cache_size)
+            status = cache.run(vm, args.frequency, engine=args.engine, max_cycles=args.max_cycles,
+                               max_instructions=args.max_instructions, deadline=deadline).status
+            result['cached'] = cache.hits > 0
+        else:
+            status = vm.run(args.frequency, engine=args.engine, max_cycles=args.max_cycles,
+                            max_instructions=args.max_instructions, deadline=deadline)
+        result['status'] = status.value
+    except SWInterrupt as interrupt:
+        result['status'] = 'interrupt'
+        result['interrupt'] = interrupt.code
+    elapsed = time.perf_counter() - start_ts
+
+    result.update({
+        'out': [value.value for value in outp.values()],
+        'registers': vm.registers(),
+        'cycles': vm.cycles,
+        'instructions': vm.instructions,
+        'time': elapsed,
+        'frequency': vm.cycles / elapsed if elapsed > 0 else None,
+    })
+    json.dump(result, sys.stdout, indent=args.indent)
+    sys.stdout.write('\n')
+    if args.dump:
+        vm.dump(sys.stderr)
+    return 0 if result['status'] != 'interrupt' else 1
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m crash_vm', description='Crash VM headless runner')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    run_parser = commands.add_parser('run', help='run a program and print results as JSON')
+    run_parser.add_argument('program', help='assembler source (.asm) or image')
+    run_parser.add_argument('--arg', type=_int, action='append', default=[],
+                            help='argument word, may be repeated')
+    run_parser.add_argument('--out', type=_int, default=1, help='number of output words')
+    run_parser.add_argument('--ram', type=_int, default=0xf0, help='RAM size in words')
+    run_parser.add_argument('--ram-page-size', type=_int, default=None, help='use paged RAM with given page size')
+    run_parser.add_argument('--engine', choices=['cycle', 'fast'], default='cycle')
+    run_parser.add_argument('--frequency', type=float, default=None, help='clock frequency, cycle engine only')
+    run_parser.add_argument('--max-cycles', type=_int, default=None)
+    run_parser.add_argument('--max-instructions', type=_int, default=None)
+    run_parser.add_argument('--timeout', type=float, default=None, help='wall clock budget in seconds')
+    run_parser.add_argument('--indent', type=int, default=None, help='JSON indentation')
+    run_parser.add_argument('--dump', action='store_true', help='print VM state to stderr after the run')
+    run_parser.add_argument('--verify', action='store_true',
+                            help='verify the program when loading and run it with the verified dispatch')
+    run_parser.add_argument('--cache', default=None, help='directory of the run result cache')
+    run_parser.add_argument('--cache-size', type=_int, default=64 * 1024 * 1024, help='cache size limit in bytes')
+    run_parser.set_defaults(handler=_run)
+
+    compile_parser = commands.add_parser('compile', help='assemble a source into an image')
+    compile_parser.add_argument('source')
+    compile_parser.add_argument('-o', '--output', required=True)
+    compile_parser.set_defaults(handler=_compile)
+
+    translate_parser = commands.add_parser('translate', help='translate a program into a Python module')
+    translate_parser.add_argument('source', help='assembler source (.asm) or image')
+    translate_parser.add_argument('-o', '--output', required=True)
+    translate_parser.set_defaults(handler=_translate)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,70 +1,127 @@
+import os
 from typing import Union
 
-_CTYPE = False
-# _CTYPE = True
+# machine word size, 16 or 32 bits, chosen for the process by CRASH_VM_WORD_BITS before crash_vm is imported,
+# since modules bind the constants below when they are imported
+WORD_BITS = int(os.environ.get('CRASH_VM_WORD_BITS', '16'))
+if WORD_BITS not in (16, 32):
+    raise ValueError(f'Unsupported word size {WORD_BITS}, CRASH_VM_WORD_BITS must be 16 or 32')
+WORD_MASK = (1 << WORD_BITS) - 1
+SIGN_BIT = 1 << (WORD_BITS - 1)
+# array module type code of unsigned words
+WORD_TYPECODE = 'H' if WORD_BITS == 16 else 'I'
+# instances kept by the flyweight tables before they are dropped, never reached by 16 bit words
+MAX_FLYWEIGHTS = 1 << 16
 
-if _CTYPE:
 
-    import ctypes
-    from ctypes import memset, sizeof
+class NativeNumber:
+    """
+    Immutable WORD_BITS bit signed machine word.
+    Instances are shared through NATIVE_NUMBERS, so constructing one is a table lookup.
+    """
+    __slots__ = ('value',)
 
-    NativeNumber = ctypes.c_short
+    def __new__(cls, value: int = 0):
+        return NATIVE_NUMBERS[value & WORD_MASK]
 
-    def float_to_native_number(f):
-        return NativeNumber(int(f))
+    def __setattr__(self, key, value):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
 
-    def int_to_native_number(i):
-        return NativeNumber(i)
+    def __reduce__(self):
+        return self.__class__, (self.value,)
 
-    # NativeNumber = ctypes.c_double
-    #
-    #
-    # def float_to_native_number(f):
-    #     return NativeNumber(f)
-    #
-    #
-    # def int_to_native_number(i):
-    #     return NativeNumber(float(i))
+    def __int__(self):
+        return self.value
 
-    Address = ctypes.c_ushort
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.value})'
 
-    def array(capacity):
-        return (NativeNumber * capacity)()
+    if WORD_BITS != 16:
+        # wide words are dropped by their flyweight tables, equal values may be different instances
+        def __eq__(self, other):
+            return other.__class__ is self.__class__ and other.value == self.value
 
-else:
+        def __hash__(self):
+            return hash(self.value)
 
-    class NativeNumber:
-        def __init__(self, value: int = 0):
-            self.value = value & 0xffff
-            if self.value > 0x7fff:
-                self.value = self.value - 0x10000
 
-        def __int__(self):
-            return self.value
+class Address:
+    """
+    Immutable WORD_BITS bit unsigned address.
+    Instances are shared through ADDRESSES, so constructing one is a table lookup.
+    """
+    __slots__ = ('value',)
 
-    class Address:
-        def __init__(self, value: int = 0):
-            self.value = value & 0xffff
+    def __new__(cls, value: int = 0):
+        return ADDRESSES[value & WORD_MASK]
 
-        def __int__(self):
-            return self.value
+    def __setattr__(self, key, value):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
 
-    def float_to_native_number(f):
-        return NativeNumber(int(f))
+    def __reduce__(self):
+        return self.__class__, (self.value,)
 
-    def int_to_native_number(i):
-        return NativeNumber(i)
+    def __int__(self):
+        return self.value
 
-    def sizeof(number):
-        return 2
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.value})'
 
-    def memset(lst, value, size):
-        num_size = sizeof(NativeNumber())
-        for i in range(size // num_size):
-            lst[i] = value
+    if WORD_BITS != 16:
+        def __eq__(self, other):
+            return other.__class__ is self.__class__ and other.value == self.value
+
+        def __hash__(self):
+            return hash(self.value)
+
+
+class _Flyweights(dict):
+    """
+    Instances by unsigned word, an instance is created on first use, so importing doesn't pay for values
+    a program never uses. 16 bit words are shared for the lifetime of the process, wide ones until the table
+    holds MAX_FLYWEIGHTS instances and is emptied, so they are compared by value.
+    """
+
+    def __init__(self, cls, signed: bool):
+        super().__init__()
+        self._cls = cls
+        self._signed = signed
+
+    def __missing__(self, word: int):
+        if len(self) >= MAX_FLYWEIGHTS:
+            # dropping all instances at once is safe with concurrent lookups, unlike evicting single ones
+            self.clear()
+        instance = object.__new__(self._cls)
+        self._cls.value.__set__(instance, word - ((word & SIGN_BIT) << 1) if self._signed else word)
+        return self.setdefault(word, instance)
+
+
+# indexed by the unsigned representation of a value: NATIVE_NUMBERS[v & WORD_MASK] is NativeNumber(v)
+NATIVE_NUMBERS = _Flyweights(NativeNumber, True)
+ADDRESSES = _Flyweights(Address, False)
+
+
+def float_to_native_number(f):
+    return NATIVE_NUMBERS[int(f) & WORD_MASK]
+
+
+def int_to_native_number(i):
+    return NATIVE_NUMBERS[i & WORD_MASK]
+
+
+def sizeof(number):
+    return WORD_BITS // 8
+
+
+def memset(lst, value, size):
+    num_size = sizeof(NativeNumber())
+    num = size // num_size
+    lst[:num] = [NATIVE_NUMBERS[value & WORD_MASK]] * num
+
+
+def array(capacity):
+    return [NATIVE_NUMBERS[0]] * capacity
 
-    def array(capacity):
-        return [0] * capacity
 
 NativeFalse = NativeNumber(0)
 NativeTrue = NativeNumber(1)
@@ -0,0 +1,412 @@
+"""
+Ahead of time translation of program images to Python modules.
+
+    python -m crash_vm translate program.asm -o program_aot.py
+
+Code reachable from address 0 is split into blocks ending at jumps, each block becomes a Python function
+working on register values in locals, so a block runs without decoding, dispatch or micro-step generators.
+Blocks start at address 0, static jump and call targets, addresses after conditional jumps and calls,
+and literals loaded and pushed before a jump, the return addresses of the stack calling convention.
+Other literals, e.g. addresses of data tables, are not translated as code. `VM.run_translated` runs
+a translated module and falls back to the interpreter for addresses with no block, e.g. computed jumps
+into unknown targets, software interrupts, block memory instructions and invalid opcodes.
+Blocks are specialized for the operation mode flags they are predicted to be entered with, from the reset state
+and modes left by their predecessors, so most arguments resolve at translation time. A block entered in another
+mode returns without executing and the interpreter takes the instruction. Translated code is compared with RAM
+when a run starts, code overwritten by the guest during a run is interpreted from then on.
+
+Instruction and cycle counts match the interpreter, hardware interrupts are served at block boundaries.
+"""
+from .cpu import Instructions, InstructionArgTypes, OMFlags, instruction_methods
+from .image import ProgramWord, to_words
+from ._types import SIGN_BIT, WORD_BITS, WORD_MASK
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+# longest block, longer straight line code is split
+MAX_BLOCK_INSTRUCTIONS = 256
+# translation passes refining operation modes blocks are specialized for
+MAX_TRANSLATION_PASSES = 4
+
+# masks words in generated code
+_MASK = hex(WORD_MASK)
+_INSTRUCTIONS = {instruction.value: instruction for instruction in instruction_methods}
+# instructions left to the interpreter
+_INTERPRETED = {Instructions.Int, Instructions.Mcpy, Instructions.Mset, Instructions.Wait}
+# left to the interpreter with a zero divisor, which raises the division by zero interrupt
+_DIVISIONS = {Instructions.Div, Instructions.Mod}
+
+_A0_TYPE = 1 << OMFlags.A0Type.value
+_A0_VALUE_TYPE = 1 << OMFlags.A0ValueType.value
+_A0_ADDRESSING_MODE = 1 << OMFlags.A0AddressingMode.value
+_MODE_INSTRUCTIONS = {
+    Instructions.A0A: (_A0_TYPE, 0),
+    Instructions.A0L: (_A0_TYPE, 1),
+    Instructions.A0V: (_A0_VALUE_TYPE, 0),
+    Instructions.A0P: (_A0_VALUE_TYPE, 1),
+    Instructions.A0R: (_A0_ADDRESSING_MODE, 0),
+    Instructions.A0S: (_A0_ADDRESSING_MODE, 1),
+}
+
+_BINARY_EXPRESSIONS = {
+    Instructions.Add: '_signed(AC + A0)',
+    Instructions.Mul: '_signed(AC * A0)',
+    Instructions.Div: '_signed(int(AC / A0))',
+    Instructions.Gt: '1 if AC > A0 else 0',
+    Instructions.And: '1 if AC and A0 else 0',
+    Instructions.Or: '1 if AC or A0 else 0',
+    Instructions.Sub: '_signed(AC - A0)',
+    Instructions.Mod: '_signed(abs(AC) % abs(A0) * (-1 if AC < 0 else 1))',
+    Instructions.Eq: '1 if AC == A0 else 0',
+    Instructions.Lt: '1 if AC < A0 else 0',
+    Instructions.Shl: f'_signed(AC << min(A0 & {_MASK}, {WORD_BITS}))',
+    Instructions.Shr: f'_signed((AC & {_MASK}) >> min(A0 & {_MASK}, {WORD_BITS}))',
+    Instructions.BAnd: '_signed(AC & A0)',
+    Instructions.BOr: '_signed(AC | A0)',
+    Instructions.BXor: '_signed(AC ^ A0)',
+}
+
+_MODULE_HEADER = '''"""
+Translated by crash_vm.aot from a {size} words image, run with VM.run_translated.
+"""
+from crash_vm._types import NATIVE_NUMBERS, ADDRESSES
+from math import sqrt
+
+WORD_BITS = {word_bits}
+
+
+def _signed(value):
+    return ((value + {sign_bit}) & {mask}) - {sign_bit}
+
+'''
+
+
+class _OperationMode:
+    """
+    Operation mode flags known at translation time, a flag is None when it depends on the path the block
+    was entered from.
+    """
+
+    def __init__(self, entry: Optional[int]):
+        self.flags: Dict[int, Optional[int]] = {
+            flag: None if entry is None else int(bool(entry & flag))
+            for flag in (_A0_TYPE, _A0_VALUE_TYPE, _A0_ADDRESSING_MODE)}
+        self._assumed = set() if entry is None else set(self.flags)
+        # flags the translated code relies on being entered with, checked by the block guard
+        self.guarded = 0
+
+    def condition(self, flag: int) -> str:
+        known = self.flags[flag]
+        if flag in self._assumed:
+            self.guarded |= flag
+        return 'OM & {}'.format(flag) if known is None else str(known)
+
+    def set(self, flag: int, value: int):
+        self.flags[flag] = value
+        self._assumed.discard(flag)
+
+    def forget(self):
+        for flag in self.flags:
+            self.set(flag, None)
+
+    def value(self) -> Optional[int]:
+        if any(known is None for known in self.flags.values()):
+            return None
+        return sum(flag for flag, known in self.flags.items() if known)
+
+
+class _BlockWriter:
+    def __init__(self, words: Sequence[int], address: int, entry_mode: Optional[int]):
+        self._words = words
+        self.address = address
+        self.entry_mode = entry_mode
+        self.lines: List[str] = []
+        self.successors: Set[int] = set()
+        # operation modes at exits, by static successor, and at exits to computed addresses
+        self.exit_modes: List[Tuple[int, Optional[int]]] = []
+        self.computed_exit_modes: List[Optional[int]] = []
+        self._mode = _OperationMode(entry_mode)
+        self.end = address  # address after the last translated instruction
+        self._instructions = 0
+        self._cycles = 0
+        self._opcode = None
+        self._indent = 1
+        # address, instructions and cycles counted before the current instruction
+        self._instruction_start = (address, 0, 0)
+        # literal loaded by the previous instruction, and literals pushed since, possibly return addresses
+        self._loaded_literal: Optional[int] = None
+        self._pushed_literals: List[int] = []
+
+    def emit(self, line: str):
+        self.lines.append('    ' * self._indent + line)
+
+    def exit(self, ia_expression: str, successor: Optional[int] = None,
+             counts: Optional[Tuple[int, int, str]] = None):
+        # counts are instructions, static and dynamic cycles returned instead of the ones counted so far
+        if successor is None:
+            self.computed_exit_modes.append(self._mode.value())
+        else:
+            self.successors.add(successor)
+            self.exit_modes.append((successor, self._mode.value()))
+        self.emit(f'cpu._IA = ADDRESSES[{ia_expression}]')
+        self.emit(f'cpu._OC = NATIVE_NUMBERS[{self._opcode}]')
+        self.emit(f'cpu._OM = NATIVE_NUMBERS[OM & {_MASK}]')
+        self.emit(f'cpu._A0 = NATIVE_NUMBERS[A0 & {_MASK}]')
+        self.emit(f'cpu._AC = NATIVE_NUMBERS[AC & {_MASK}]')
+        self.emit('cpu._SP = ADDRESSES[SP]')
+        if counts is None:
+            counts = (self._instructions, self._cycles, 'c')
+        instructions, cycles, dynamic_cycles = counts
+        self.emit(f'return {instructions}, {cycles} + {dynamic_cycles}')
+
+    def _resolve_argument(self, arg_type: InstructionArgTypes, literal: int):
+        # mirrors CPU._resolve_arg0, counting its micro-steps
+        self.emit(f'A0 = {literal}')
+        if arg_type == InstructionArgTypes.ValueArg:
+            return None
+        stack_address = f'(SP - {literal} - 1) & {_MASK}'
+        static_address = None
+        stack = self._mode.condition(_A0_ADDRESSING_MODE)
+        if arg_type == InstructionArgTypes.ValueAddressArg:
+            address_type = self._mode.condition(_A0_TYPE)
+            if address_type == '0':
+                if stack in ('0', '1'):
+                    address = stack_address if stack == '1' else str(literal & WORD_MASK)
+                else:
+                    address = f'{stack_address} if {stack} else {literal & WORD_MASK}'
+                self.emit(f'A0 = bus[ADDRESSES[{address}]].value')
+                self._cycles += 1
+            elif address_type != '1':
+                self.emit(f'if not {address_type}:')
+                address = f'{stack_address} if {stack} else {literal & WORD_MASK}'
+                self.emit(f'    A0 = bus[ADDRESSES[{address}]].value')
+                self.emit('    c += 1')
+        else:
+            if stack == '1':
+                self.emit(f'A0 = _signed(SP - {literal} - 1)')
+            elif stack != '0':
+                self.emit(f'if {stack}:')
+                self.emit(f'    A0 = _signed(SP - {literal} - 1)')
+            else:
+                static_address = literal & WORD_MASK
+        pointer = self._mode.condition(_A0_VALUE_TYPE)
+        if pointer == '1':
+            self.emit(f'A0 = bus[ADDRESSES[A0 & {_MASK}]].value')
+            self._cycles += 1
+            return None
+        if pointer != '0':
+            self.emit(f'if {pointer}:')
+            self.emit(f'    A0 = bus[ADDRESSES[A0 & {_MASK}]].value')
+            self.emit('    c += 1')
+            return None
+        return static_address
+
+    def write(self):
+        words = self._words
+        address = self.address
+        while True:
+            if not 0 <= address < len(words) or self._instructions >= MAX_BLOCK_INSTRUCTIONS:
+                self.exit(str(address & WORD_MASK), address & WORD_MASK)
+                return
+            instruction = _INSTRUCTIONS.get(words[address])
+            if instruction is None or instruction in _INTERPRETED or \
+                    (instruction_methods[instruction][1] != InstructionArgTypes.NoArg and
+                     address + 1 >= len(words)):
+                # left to the interpreter
+                if self._instructions > 0:
+                    self.exit(str(address), address)
+                return
+            _, arg_type = instruction_methods[instruction]
+
+            self.emit(f'# {address:#06x}: {instruction.name}')
+            self._instruction_start = (address, self._instructions, self._cycles)
+            if instruction in _DIVISIONS:
+                self.emit('c_start = c')
+            self._opcode = instruction.value
+            self._instructions += 1
+            self._cycles += 2  # fetch, decode
+            next_address = address + 1
+            static_address = None
+            if arg_type != InstructionArgTypes.NoArg:
+                literal = words[address + 1]
+                literal = literal - (WORD_MASK + 1) if literal & SIGN_BIT else literal
+                next_address += 1
+                self._cycles += 1  # fetch argument
+                static_address = self._resolve_argument(arg_type, literal)
+            if instruction == Instructions.Push and self._loaded_literal is not None:
+                self._pushed_literals.append(self._loaded_literal)
+            self._loaded_literal = None
+            if instruction == Instructions.Ld and \
+                    self._mode.condition(_A0_TYPE) == '1' and self._mode.condition(_A0_VALUE_TYPE) != '1':
+                self._loaded_literal = literal & WORD_MASK
+            self._cycles += 4 if instruction == Instructions.IHR else 1  # execute
+            self.end = next_address
+            if self._translate(instruction, static_address, next_address & WORD_MASK):
+                return
+            address = next_address
+
+    def _translate(self, instruction: Instructions, static_address: Optional[int], next_address: int) -> bool:
+        # returns True if the instruction ends the block
+        if instruction in (Instructions.Jmp, Instructions.Jif, Instructions.Call):
+            # literals pushed before a jump are return addresses of the stack calling convention
+            self.successors.update(self._pushed_literals)
+        if instruction in _MODE_INSTRUCTIONS:
+            flag, value = _MODE_INSTRUCTIONS[instruction]
+            self.emit(f'OM |= {flag}' if value else f'OM &= ~{flag}')
+            self._mode.set(flag, value)
+        elif instruction in _BINARY_EXPRESSIONS:
+            if instruction in _DIVISIONS:
+                # exits before the instruction, the interpreter repeats its argument reads
+                address, instructions, cycles = self._instruction_start
+                self.emit('if not A0:')
+                self._indent += 1
+                self.exit(str(address), address, (instructions, cycles, 'c_start'))
+                self._indent -= 1
+            self.emit(f'AC = {_BINARY_EXPRESSIONS[instruction]}')
+        elif instruction == Instructions.Ld:
+            self.emit('AC = A0')
+        elif instruction == Instructions.St:
+            self.emit(f'bus[ADDRESSES[A0 & {_MASK}]] = NATIVE_NUMBERS[AC & {_MASK}]')
+        elif instruction == Instructions.Xchg:
+            self.emit(f'AC = bus.exchange(ADDRESSES[A0 & {_MASK}], NATIVE_NUMBERS[AC & {_MASK}]).value')
+        elif instruction == Instructions.Neg:
+            self.emit('AC = _signed(-AC)')
+        elif instruction == Instructions.Sqrt:
+            self.emit('AC = _signed(int(sqrt(AC)))')
+        elif instruction == Instructions.Not:
+            self.emit('AC = 1 if AC == 0 else 0')
+        elif instruction == Instructions.HIH:
+            self.emit(f'cpu._HI = ADDRESSES[A0 & {_MASK}]')
+        elif instruction == Instructions.SIH:
+            self.emit(f'cpu._SI = ADDRESSES[A0 & {_MASK}]')
+        elif instruction == Instructions.Stk:
+            self.emit(f'SP = A0 & {_MASK}')
+        elif instruction == Instructions.Push:
+            self.emit(f'bus[ADDRESSES[SP]] = NATIVE_NUMBERS[AC & {_MASK}]')
+            self.emit(f'SP = (SP + 1) & {_MASK}')
+        elif instruction == Instructions.Pop:
+            self.emit(f'SP = (SP - A0) & {_MASK}')
+        elif instruction == Instructions.IHR:
+            self.emit(f'SP = (SP - 1) & {_MASK}')
+            self.emit('OM = bus[ADDRESSES[SP]].value')
+            self.emit(f'SP = (SP - 1) & {_MASK}')
+            self.emit('AC = bus[ADDRESSES[SP]].value')
+            self.emit(f'SP = (SP - 1) & {_MASK}')
+            self.emit('cpu._IL = bus[ADDRESSES[SP]]')
+            self.emit(f'SP = (SP - 1) & {_MASK}')
+            self._mode.forget()
+            self.exit(f'bus[ADDRESSES[SP]].value & {_MASK}')
+            return True
+        elif instruction == Instructions.Jmp:
+            if static_address is not None:
+                self.exit(str(static_address), static_address)
+            else:
+                self.exit(f'A0 & {_MASK}')
+            return True
+        elif instruction == Instructions.Call:
+            # the return address is a block of its own
+            self.successors.add(next_address)
+            function_address = str(static_address) if static_address is not None else f'A0 & {_MASK}'
+            self.emit(f'args = bus[ADDRESSES[{function_address}]].value & {_MASK}')
+            self.emit('for i in range(args):')
+            self.emit(f'    bus[ADDRESSES[(SP - i) & {_MASK}]] = bus[ADDRESSES[(SP - i - 1) & {_MASK}]]')
+            self.emit(f'bus[ADDRESSES[(SP - args) & {_MASK}]] = NATIVE_NUMBERS[{next_address}]')
+            self.emit(f'SP = (SP + 1) & {_MASK}')
+            self.emit('c += args + 1')
+            if static_address is not None:
+                self.exit(str((static_address + 1) & WORD_MASK), (static_address + 1) & WORD_MASK)
+            else:
+                self.exit(f'(A0 + 1) & {_MASK}')
+            return True
+        elif instruction == Instructions.Ret:
+            self.exit(f'bus[ADDRESSES[(SP - A0 - 1) & {_MASK}]].value & {_MASK}')
+            return True
+        elif instruction == Instructions.Jif:
+            self.emit('if AC:')
+            self._indent += 1
+            if static_address is not None:
+                self.exit(str(static_address), static_address)
+            else:
+                self.exit(f'A0 & {_MASK}')
+            self._indent -= 1
+            self.exit(str(next_address), next_address)
+            return True
+        else:
+            assert instruction == Instructions.Noop, f'{instruction} is not supported by the translator'
+        return False
+
+    def function(self) -> str:
+        guarded = self._mode.guarded
+        guard = [] if not guarded else [
+            f'    if OM & {guarded} != {self.entry_mode & guarded}:',
+            '        return 0, 0',
+        ]
+        return '\n'.join([
+            f'def _block_{self.address:04x}(cpu, bus):',
+            '    OM = cpu._OM.value',
+        ] + guard + [
+            '    A0 = cpu._A0.value',
+            '    AC = cpu._AC.value',
+            '    SP = cpu._SP.value',
+            '    c = 0',
+        ] + self.lines)
+
+
+def _discover(words: Sequence[int], entry_modes: Dict[int, int]) -> Dict[int, _BlockWriter]:
+    blocks: Dict[int, _BlockWriter] = {}
+    pending = [0]
+    while pending:
+        address = pending.pop()
+        if address in blocks or not 0 <= address < len(words):
+            continue
+        block = _BlockWriter(words, address, entry_modes.get(address))
+        block.write()
+        blocks[address] = block
+        pending.extend(block.successors)
+    return blocks
+
+
+def _predict_entry_modes(blocks: Dict[int, _BlockWriter]) -> Dict[int, int]:
+    # a block is specialized for the operation mode most of its static predecessors leave, blocks entered only
+    # through computed jumps, like return addresses, for the most common mode known at computed jumps
+    votes: Dict[int, Counter] = defaultdict(Counter)
+    votes[0][0] += 1  # reset state
+    computed_votes = Counter()
+    for block in blocks.values():
+        for successor, mode in block.exit_modes:
+            if mode is not None:
+                votes[successor][mode] += 1
+        computed_votes.update(mode for mode in block.computed_exit_modes if mode is not None)
+    modes = {}
+    for address in blocks:
+        counter = votes.get(address) or computed_votes
+        if counter:
+            modes[address] = counter.most_common(1)[0][0]
+    return modes
+
+
+def translate(program: Sequence[ProgramWord]) -> str:
+    """
+    Translate a program, as produced by asm.compile or loaded by image.load_image, into Python module source.
+    """
+    words = to_words(program)
+    entry_modes: Dict[int, int] = {0: 0}
+    blocks = _discover(words, entry_modes)
+    for _ in range(MAX_TRANSLATION_PASSES - 1):
+        predicted = _predict_entry_modes(blocks)
+        if predicted == entry_modes:
+            break
+        entry_modes = predicted
+        blocks = _discover(words, entry_modes)
+
+    translated = sorted(address for address, block in blocks.items() if block.lines)
+    source = [_MODULE_HEADER.format(size=len(words), word_bits=WORD_BITS, sign_bit=SIGN_BIT, mask=WORD_MASK)]
+    for address in translated:
+        source.append('\n' + blocks[address].function() + '\n')
+    source.append('\nBLOCKS = {\n' + ''.join(
+        f'    {address}: _block_{address:04x},\n' for address in translated) + '}\n')
+    # translated words, checked against RAM before running
+    source.append('CODE = (\n' + ''.join(
+        f'    ({address}, {tuple(words[address:blocks[address].end])!r}),\n'
+        for address in translated) + ')\n')
+    return '\n'.join(source)
@@ -1,8 +1,9 @@
 import re
 from itertools import count
 from .cpu import Instructions, InstructionArgTypes, instruction_methods
-from ._types import NativeNumber, Address
-from typing import Generator, List, Union
+from ._types import NativeNumber, Address, WORD_MASK
+from typing import Dict, Generator, Iterable, List, Tuple, Union
+from difflib import SequenceMatcher
 import itertools
 
 LowercaseInstructions = {instruction.name.lower(): instruction for instruction in Instructions}
@@ -16,11 +17,13 @@ ADDRESS_LITERAL_PATTERN = NUMBER_PATTERN
 IDENTIFIER_FIRST_CHARACTER_PATTERN = r'[a-zA-Z_]'
 IDENTIFIER_CHARACTER_PATTERN = r'[a-zA-Z_0-9]'
 SPACER_CHARACTER_PATTERN = r'[ \t]'
-LABEL_PATTERN = rf'{IDENTIFIER_FIRST_CHARACTER_PATTERN}{IDENTIFIER_CHARACTER_PATTERN}*:'
-LABEL_VALUE_PATTERN = rf':{IDENTIFIER_FIRST_CHARACTER_PATTERN}{IDENTIFIER_CHARACTER_PATTERN}*'
+IDENTIFIER_PATTERN = rf'{IDENTIFIER_FIRST_CHARACTER_PATTERN}{IDENTIFIER_CHARACTER_PATTERN}*'
+LABEL_PATTERN = rf'{IDENTIFIER_PATTERN}:'
+LABEL_VALUE_PATTERN = rf':{IDENTIFIER_PATTERN}'
 ADDRESS_PATTERN = rf'(?:{ADDRESS_LITERAL_PATTERN}|{LABEL_VALUE_PATTERN})'
 INDENTATION_PATTERN = rf'^{SPACER_CHARACTER_PATTERN}*'
 LINE_END_PATTERN = rf'{SPACER_CHARACTER_PATTERN}*(?:#.*)?$'
+SYMBOLS_PATTERN = rf'((?:{SPACER_CHARACTER_PATTERN}+{IDENTIFIER_PATTERN})+)'
 INSTRUCTION_NAME_PATTERN = '|'.join(map(lambda i: f'(?i:{i.name})', Instructions))
 
 
@@ -92,6 +95,9 @@ class Line:
     def __init__(self, address: Address, *args):
         self.address = address
 
+    def relocate(self, address: Address):
+        self.address = address
+
     def produced_bytes_padded_num(self) -> int:
         return 0
 
@@ -112,7 +118,8 @@ class EmptyLine(Line):
 
 
 class OffsetLine(Line):
-    Pattern = rf'{INDENTATION_PATTERN}(?i:offset){SPACER_CHARACTER_PATTERN}+({ADDRESS_LITERAL_PATTERN}){LINE_END_PATTERN}'
+    Pattern = (rf'{INDENTATION_PATTERN}(?i:offset){SPACER_CHARACTER_PATTERN}+({ADDRESS_LITERAL_PATTERN})'
+               rf'{LINE_END_PATTERN}')
 
     def __init__(self, address, offset_str):
         super().__init__(address)
@@ -120,6 +127,11 @@ class OffsetLine(Line):
         if self.offset.value < address.value:
             raise CompilationError(f'Inavalid offset {self.offset.value} at {address.value}')
 
+    def relocate(self, address: Address):
+        if self.offset.value < address.value:
+            raise CompilationError(f'Inavalid offset {self.offset.value} at {address.value}')
+        super().relocate(address)
+
     def produced_bytes_padded_num(self) -> int:
         return self.offset.value - self.address.value
 
@@ -132,6 +144,26 @@ class LabelLine(Line):
         self.label = Label(identifier)
 
 
+class SymbolsLine(Line):
+    """
+    Labels shared between modules linked by `link.link`, ignored by `compile`.
+    """
+
+    def __init__(self, address: Address, symbols_str: str):
+        super().__init__(address)
+        self.symbols = tuple(symbols_str.split())
+
+
+class ExportLine(SymbolsLine):
+    # labels of the module visible to other modules
+    Pattern = rf'{INDENTATION_PATTERN}(?i:export){SYMBOLS_PATTERN}{LINE_END_PATTERN}'
+
+
+class ImportLine(SymbolsLine):
+    # labels of other modules referenced by the module
+    Pattern = rf'{INDENTATION_PATTERN}(?i:import){SYMBOLS_PATTERN}{LINE_END_PATTERN}'
+
+
 class ValueLine(Line):
     Pattern = rf'{INDENTATION_PATTERN}({ADDRESS_PATTERN}){LINE_END_PATTERN}'
 
@@ -147,7 +179,8 @@ class ValueLine(Line):
 
 
 class InstructionLine(Line):
-    Pattern = rf'{INDENTATION_PATTERN}({INSTRUCTION_NAME_PATTERN})((?:{SPACER_CHARACTER_PATTERN}+{ADDRESS_PATTERN})*){LINE_END_PATTERN}'
+    Pattern = (rf'{INDENTATION_PATTERN}({INSTRUCTION_NAME_PATTERN})'
+               rf'((?:{SPACER_CHARACTER_PATTERN}+{ADDRESS_PATTERN})*){LINE_END_PATTERN}')
 
     def __init__(self, address: Address, instruction_name: str, args_str: str):
         super().__init__(address, instruction_name, args_str)
@@ -171,37 +204,181 @@ class InstructionLine(Line):
         return [self.instruction, *self.args]
 
 
+LINE_CLASSES = [EmptyLine, OffsetLine, ExportLine, ImportLine, ValueLine, InstructionLine, LabelLine]
+
+
+def parse_line(line: str, address: Address) -> Line:
+    try:
+        cls, match = next(filter(lambda p: p[1], map(lambda c: (c, re.match(c.Pattern, line)), LINE_CLASSES)))
+    except StopIteration:
+        raise CompilationError('Invalid syntax')
+    return cls(address, *match.groups())
+
+
+def _line_error(error: CompilationError, line_number: int, line: str) -> CompilationError:
+    error.message = f'Line {line_number}: {line}\n    {error.message}'
+    return error
+
+
 def parse(lines) -> Generator[Line, None, None]:
     if isinstance(lines, str):
         lines = lines.split('\n')
-    classes = [EmptyLine, OffsetLine, ValueLine, InstructionLine, LabelLine]
     line_address = 0
     for line_number, line in zip(count(1), lines):
         try:
-            try:
-                cls, match = next(filter(lambda p: p[1], map(lambda c: (c, re.match(c.Pattern, line)), classes)))
-            except StopIteration:
-                raise CompilationError('Invalid syntax')
-            line = cls(Address(line_address), *match.groups())
+            line = parse_line(line, Address(line_address))
             line_address += line.produced_bytes_padded_num()
             yield line
         except CompilationError as error:
-            error.message = f'Line {line_number}: {line}\n    {error.message}'
-            raise error
+            raise _line_error(error, line_number, line)
 
 
-def compile(lines):
-    parsed = list(parse(lines))
+def _labels(parsed: List[Line]) -> Dict[str, Address]:
+    return {line.label: line.address for line in [line for line in parsed if isinstance(line, LabelLine)]}
 
-    # first pass to determine addresses of labels
-    labels = {line.label: line.address for line in [line for line in parsed if isinstance(line, LabelLine)]}
 
-    def resolve(line_number, byte):
+def _assemble_line(labels: Dict[str, Address], line_number: int,
+                   line: Line) -> List[Union[Instructions, NativeNumber, Address]]:
+    def resolve(byte):
         try:
             return labels[byte] if isinstance(byte, LabelValue) else byte
         except KeyError:
             raise CompilationError(f'Line {line_number}: Invalid label {byte}')
 
+    return [resolve(byte) for byte in line.produce_bytes_padded()]
+
+
+def assemble(parsed: List[Line]) -> List[Union[Instructions, NativeNumber, Address]]:
+    # first pass to determine addresses of labels
+    labels = _labels(parsed)
+
     # second pass to produce bytecode
-    return list(chain([[resolve(line_number, byte) for byte in line.produce_bytes_padded()]
-                       for line_number, line in zip(count(0), parsed)]))
+    return list(chain([_assemble_line(labels, line_number, line) for line_number, line in zip(count(0), parsed)]))
+
+
+def compile(lines):
+    return assemble(list(parse(lines)))
+
+
+def _word(value: Union[Instructions, NativeNumber, Address]) -> int:
+    return value.value & WORD_MASK
+
+
+class IncrementalAssembler:
+    """
+    Keeps parsed lines of a source between updates, so a changed source only has changed lines parsed again.
+    Unchanged lines are relocated if their addresses shift and reassembled only if shifted
+    or referencing a label which moved.
+    `update` returns a word diff to bring memory loaded with the previous program up to date with the new one.
+    """
+
+    def __init__(self, source: Union[str, List[str]] = ''):
+        self._lines: List[str] = []
+        self._parsed: List[Line] = []
+        self._line_words: List[list] = []
+        self._line_label_values: List[frozenset] = []
+        self._labels: Dict[str, Address] = {}
+        self.program: List[Union[Instructions, NativeNumber, Address]] = []
+        self.update(source)
+
+    def update(self, source: Union[str, List[str]]
+               ) -> List[Tuple[int, List[Union[Instructions, NativeNumber, Address]]]]:
+        """
+        Reassemble changed source, returns changed words as (address, words) runs.
+        Words past the end of a shrunk program are cleared to 0.
+        On compilation error the assembler state is left unchanged.
+        """
+        lines = source.split('\n') if isinstance(source, str) else list(source)
+        parsed = []
+        reused = []  # index of the previous line reused unchanged at the same address, or None
+        line_address = 0
+        for tag, old_start, old_end, new_start, new_end in _line_opcodes(self._lines, lines):
+            for line_number in range(new_start, new_end):
+                address = Address(line_address)
+                old_index = None
+                try:
+                    if tag == 'equal':
+                        line = self._parsed[old_start + line_number - new_start]
+                        if line.address is address:
+                            old_index = old_start + line_number - new_start
+                        else:
+                            line.relocate(address)
+                    else:
+                        line = parse_line(lines[line_number], address)
+                except CompilationError as error:
+                    self._restore_addresses()
+                    raise _line_error(error, line_number + 1, lines[line_number])
+                line_address += line.produced_bytes_padded_num()
+                parsed.append(line)
+                reused.append(old_index)
+
+        labels = _labels(parsed)
+        moved_labels = {label for label in labels.keys() | self._labels.keys()
+                        if labels.get(label) is not self._labels.get(label)}
+        line_words = []
+        line_label_values = []
+        reassembled = []
+        try:
+            for line_number, (line, old_index) in enumerate(zip(parsed, reused)):
+                if old_index is not None and moved_labels.isdisjoint(self._line_label_values[old_index]):
+                    line_words.append(self._line_words[old_index])
+                    line_label_values.append(self._line_label_values[old_index])
+                    continue
+                words = _assemble_line(labels, line_number, line)
+                line_words.append(words)
+                line_label_values.append(frozenset(byte for byte in line.produce_bytes_padded()
+                                                   if isinstance(byte, LabelValue)))
+                reassembled.append(line)
+        except CompilationError:
+            self._restore_addresses()
+            raise
+
+        program = list(chain(line_words))
+        diff = _diff(self.program, program, chain(
+            range(line.address.value, line.address.value + line.produced_bytes_padded_num()) for line in reassembled))
+        self._lines = lines
+        self._parsed = parsed
+        self._line_words = line_words
+        self._line_label_values = line_label_values
+        self._labels = labels
+        self.program = program
+        return diff
+
+    def _restore_addresses(self):
+        line_address = 0
+        for line in self._parsed:
+            line.address = Address(line_address)
+            line_address += line.produced_bytes_padded_num()
+
+
+def _line_opcodes(old: List[str], new: List[str]):
+    # edits are usually local, only lines between common prefix and suffix go through the matcher
+    prefix = 0
+    max_common = min(len(old), len(new))
+    while prefix < max_common and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < max_common - prefix and old[-suffix - 1] == new[-suffix - 1]:
+        suffix += 1
+    if prefix:
+        yield 'equal', 0, prefix, 0, prefix
+    matcher = SequenceMatcher(None, old[prefix:len(old) - suffix], new[prefix:len(new) - suffix], autojunk=False)
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        yield tag, old_start + prefix, old_end + prefix, new_start + prefix, new_end + prefix
+    if suffix:
+        yield 'equal', len(old) - suffix, len(old), len(new) - suffix, len(new)
+
+
+def _diff(old: List[Union[Instructions, NativeNumber, Address]],
+          new: List[Union[Instructions, NativeNumber, Address]],
+          candidates: Iterable[int]) -> List[Tuple[int, list]]:
+    # only candidate addresses and the tail of a shrunk program may differ
+    zero = NativeNumber(0)
+    changed = sorted(set(address for address in chain((candidates, range(len(new), len(old))))
+                         if address >= len(old) or
+                         _word(old[address]) != _word(new[address] if address < len(new) else zero)))
+    runs = []
+    for _, group in itertools.groupby(enumerate(changed), key=lambda item: item[1] - item[0]):
+        addresses = [address for _, address in group]
+        runs.append((addresses[0], [new[address] if address < len(new) else zero for address in addresses]))
+    return runs
@@ -1,6 +1,6 @@
 import sys
-from ._types import Address, AddressRange, NativeNumber
-from typing import Tuple, List
+from ._types import Address, AddressRange, NativeNumber, ADDRESSES, WORD_MASK
+from typing import Callable, Tuple, List, Optional, Sequence
 
 if sys.version_info[0] == 3 and sys.version_info[1] == 7:
     class Protocol:
@@ -10,6 +10,15 @@ else:
 
 
 class Slave(Protocol):
+    """
+    Device attached to the bus, addressed by words relative to its attach address.
+
+    Slaves moving many words at once may also provide
+        read_block(offset: int, n: int) -> List[NativeNumber]
+        write_block(offset: int, values: Sequence[NativeNumber]) -> None
+    used by Bus block transfers instead of per word access.
+    """
+
     def __setitem__(self, address: Address, value: NativeNumber) -> None:
         raise NotImplementedError()
 
@@ -20,19 +29,133 @@ class Slave(Protocol):
 class Bus:
     def __init__(self):
         self._attached: List[Tuple[AddressRange, Slave]] = []
+        # flattened (start, end, slave) routes, avoids AddressRange.__contains__ calls on every access
+        self._routes: List[Tuple[int, int, Slave]] = []
+        self._wrapper: Optional[Callable[[AddressRange, Slave], Slave]] = None
+
+    def _route(self, address_range: AddressRange, slave: Slave) -> Tuple[int, int, Slave]:
+        if self._wrapper is not None:
+            slave = self._wrapper(address_range, slave)
+        return address_range.start_value, address_range.end_value, slave
+
+    def instrument(self, wrapper: Optional[Callable[[AddressRange, Slave], Slave]]):
+        """
+        Serve accesses through `wrapper(address_range, slave)` results instead of attached slaves,
+        e.g. to count them, including slaves attached later. None removes the instrumentation.
+        """
+        self._wrapper = wrapper
+        self._routes = [self._route(address_range, slave) for address_range, slave in self._attached]
+
+    def attached(self) -> List[Tuple[AddressRange, Slave]]:
+        return list(self._attached)
 
     def attach(self, address_range: AddressRange, slave: Slave):
         self._attached.append((address_range, slave))
+        self._routes.append(self._route(address_range, slave))
 
-    def __setitem__(self, address: Address, value: NativeNumber):
+    def overlay(self, address_range: AddressRange, slave: Slave):
+        """
+        Attach a slave taking precedence over already attached ones in the given range.
+        """
+        self._attached.insert(0, (address_range, slave))
+        self._routes.insert(0, self._route(address_range, slave))
+
+    def detach(self, slave: Slave):
+        self._attached = [(address_range, s) for address_range, s in self._attached if s is not slave]
+        self._routes = [self._route(address_range, s) for address_range, s in self._attached]
+
+    def replace(self, slave: Slave, replacement: Slave):
+        """
+        Serve address ranges of an attached slave by another one, keeping their precedence.
+        """
+        self._attached = [(address_range, replacement if s is slave else s) for address_range, s in self._attached]
+        self._routes = [self._route(address_range, s) for address_range, s in self._attached]
+
+    def resolve(self, address: Address) -> Tuple[Slave, Address]:
+        """
+        Find the attached slave serving an address and the address local to it.
+        """
         for address_range, slave in self._attached:
             if address in address_range:
-                slave[Address(address.value - address_range.start_value)] = value
+                return slave, ADDRESSES[address.value - address_range.start_value]
+        raise ValueError('Invalid address')
+
+    def __setitem__(self, address: Address, value: NativeNumber):
+        address_value = address.value
+        for start, end, slave in self._routes:
+            if start <= address_value < end:
+                slave[ADDRESSES[address_value - start]] = value
                 return
         raise ValueError('Invalid address')
 
     def __getitem__(self, address: Address):
-        for address_range, slave in self._attached:
-            if address in address_range:
-                return slave[Address(address.value - address_range.start_value)]
+        address_value = address.value
+        for start, end, slave in self._routes:
+            if start <= address_value < end:
+                return slave[ADDRESSES[address_value - start]]
         raise ValueError('Invalid address')
+
+    def exchange(self, address: Address, value: NativeNumber) -> NativeNumber:
+        """
+        Write a value and return the previous one as a single bus transaction.
+        Slaves shared with other processors provide an atomic `exchange` method,
+        for the rest the read and the write are done without yielding in between.
+        """
+        address_value = address.value
+        for start, end, slave in self._routes:
+            if start <= address_value < end:
+                local_address = ADDRESSES[address_value - start]
+                exchange = getattr(slave, 'exchange', None)
+                if exchange is not None:
+                    return exchange(local_address, value)
+                previous = slave[local_address]
+                slave[local_address] = value
+                return previous
+        raise ValueError('Invalid address')
+
+    def _block_routes(self, address: int, n: int):
+        # yield (slave, local offset, number of words) chunks covering the range, honouring overlays
+        stop = address + n
+        if address < 0 or stop > WORD_MASK + 1:
+            raise ValueError('Invalid address')
+        routes = self._routes
+        while address < stop:
+            for index, (start, end, slave) in enumerate(routes):
+                if start <= address < end:
+                    chunk_end = min(end, stop)
+                    for overlay_start, _, _ in routes[:index]:
+                        if address < overlay_start < chunk_end:
+                            chunk_end = overlay_start
+                    yield slave, address - start, chunk_end - address
+                    address = chunk_end
+                    break
+            else:
+                raise ValueError('Invalid address')
+
+    def read_block(self, address: int, n: int) -> List[NativeNumber]:
+        """
+        Read `n` words starting at `address`, the range may span several slaves.
+        """
+        values = []
+        for slave, offset, length in self._block_routes(address, n):
+            read_block = getattr(slave, 'read_block', None)
+            if read_block is not None:
+                values.extend(read_block(offset, length))
+            else:
+                values.extend(slave[ADDRESSES[local]] for local in range(offset, offset + length))
+        return values
+
+    def write_block(self, address: int, values: Sequence[NativeNumber]):
+        """
+        Write words starting at `address`, the range may span several slaves.
+        """
+        position = 0
+        for slave, offset, length in self._block_routes(address, len(values)):
+            chunk = values[position:position + length]
+            write_block = getattr(slave, 'write_block', None)
+            if write_block is not None:
+                write_block(offset, chunk)
+            else:
+                for local, value in enumerate(chunk, offset):
+                    slave[ADDRESSES[local]] = value
+            position += length
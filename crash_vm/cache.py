@@ -0,0 +1,214 @@
+"""
+On-disk cache of whole run results.
+
+A run is looked up by a hash of everything its result depends on: RAM contents, CPU registers and requested
+interrupts at the start, the layout and input contents of peripherals, the engine and the budgets. Cached are the
+status, final registers and requested interrupts, executed cycles, instructions and raised software interrupts,
+RAM words changed by the run and contents of output peripherals, so a hit leaves the VM in the state the run
+would have, and a run stopped by a budget can be continued.
+
+Peripherals take part in caching by declaring:
+    deterministic = True  - reads depend only on `state()` and on writes of the run
+    state()               - optional, input contents included in the key
+    values()              - optional, output contents included in the key, cached and written back
+                            through the peripheral on a hit
+A VM with any other peripheral, with posted interrupts or instrumented by breakpoints, watchpoints, memoized
+routines, recording or replay is run without the cache, as are runs which entered a hardware interrupt handler,
+since the clock interrupt is raised by the wall clock, and runs stopped by the deadline, `stop` or a debugger.
+"""
+import hashlib
+import json
+import os
+import time
+from array import array
+from ._types import ADDRESSES, NATIVE_NUMBERS, WORD_BITS, WORD_MASK, WORD_TYPECODE
+from .vm import VM, Engine, RunStatus
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+CACHE_FORMAT_VERSION = 2
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+_ENTRY_SUFFIX = '.json'
+
+
+class CachedRun(NamedTuple):
+    status: RunStatus
+    registers: Dict[str, int]
+    cycles: int  # executed by the run
+    instructions: int
+    outputs: List[List[int]]  # contents of peripherals with values(), in attachment order
+    hit: bool
+
+
+class ResultCache:
+    """
+    Cache entries are files in `directory`, least recently used ones are removed when their total size
+    exceeds `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0  # runs executed without the cache
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _ram_words(vm: VM) -> array:
+        return array(WORD_TYPECODE, [value.value & WORD_MASK for value in vm.snapshot()])
+
+    @classmethod
+    def key(cls, vm: VM, max_cycles: Optional[int], max_instructions: Optional[int],
+            engine=Engine.Cycle) -> Optional[str]:
+        """
+        Key of a run of `vm` from its current state, None if the run can't be cached.
+        """
+        key_and_words = cls._key_and_words(vm, max_cycles, max_instructions, engine)
+        return None if key_and_words is None else key_and_words[0]
+
+    @classmethod
+    def _key_and_words(cls, vm: VM, max_cycles: Optional[int], max_instructions: Optional[int],
+                       engine) -> Optional[Tuple[str, array]]:
+        if vm.instruction_in_flight() or vm.interrupts_posted() or vm.instrumented():
+            # neither an instruction in flight, interrupts posted by other threads nor debugger stops
+            # and logging are part of the key
+            return None
+        peripherals = []
+        for peripheral in vm.peripherals():
+            if not getattr(peripheral, 'deterministic', False):
+                return None
+            state = getattr(peripheral, 'state', None)
+            values = getattr(peripheral, 'values', None)
+            peripherals.append([type(peripheral).__qualname__, len(peripheral),
+                                [value & WORD_MASK for value in state()] if state is not None else None,
+                                # outputs left unwritten by the run keep their contents
+                                [value.value for value in values()] if values is not None else None])
+        words = cls._ram_words(vm)
+        header = json.dumps([CACHE_FORMAT_VERSION, WORD_BITS, len(words), peripherals, vm.registers(),
+                             vm.requested_interrupts(), Engine(engine).value, max_cycles, max_instructions],
+                            sort_keys=True)
+        digest = hashlib.sha256(header.encode())
+        digest.update(words.tobytes())
+        return digest.hexdigest(), words
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _ENTRY_SUFFIX)
+
+    def _load(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            with open(path) as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if entry.get('version') != CACHE_FORMAT_VERSION:
+            return None
+        # reading an entry makes it the most recently used
+        os.utime(path)
+        return entry
+
+    def _store(self, key: str, entry: dict):
+        path = self._path(key)
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(entry, file)
+        os.replace(temporary_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(_ENTRY_SUFFIX):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(_ENTRY_SUFFIX):
+                os.remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def _changed_words(before: array, after: array) -> List[List]:
+        # [address, words] runs of words differing between RAM contents
+        runs = []
+        for address, (old, new) in enumerate(zip(before, after)):
+            if old != new:
+                if runs and runs[-1][0] + len(runs[-1][1]) == address:
+                    runs[-1][1].append(new)
+                else:
+                    runs.append([address, [new]])
+        return runs
+
+    @staticmethod
+    def _outputs(vm: VM) -> List[List[int]]:
+        return [[value.value for value in peripheral.values()]
+                for peripheral in vm.peripherals() if getattr(peripheral, 'values', None) is not None]
+
+    def run(self, vm: VM, frequency=None, engine=Engine.Cycle, max_cycles: int = None, max_instructions: int = None,
+            deadline: float = None) -> CachedRun:
+        """
+        Run `vm` as `VM.run` does, or restore the result of an identical earlier run.
+        """
+        start_ts = time.perf_counter()
+        key_and_words = self._key_and_words(vm, max_cycles, max_instructions, engine)
+        if key_and_words is None:
+            self.uncacheable += 1
+        else:
+            entry = self._load(key_and_words[0])
+            if entry is not None:
+                self.hits += 1
+                return self._restore(vm, entry, start_ts)
+            self.misses += 1
+
+        start_cycles = vm.cycles
+        start_instructions = vm.instructions
+        start_interrupts, start_software_interrupts = vm.interrupts_taken()
+        status = vm.run(frequency, engine=engine, max_cycles=max_cycles, max_instructions=max_instructions,
+                        deadline=deadline)
+        result = CachedRun(status, vm.registers(), vm.cycles - start_cycles, vm.instructions - start_instructions,
+                           self._outputs(vm), False)
+        interrupts, software_interrupts = vm.interrupts_taken()
+        deterministic = interrupts == start_interrupts and \
+            (status is RunStatus.Halted or (status is RunStatus.BudgetExhausted and deadline is None))
+        if key_and_words is not None and deterministic and not vm.instruction_in_flight():
+            key, words = key_and_words
+            self._store(key, {
+                'version': CACHE_FORMAT_VERSION,
+                'status': status.value,
+                'registers': result.registers,
+                'interrupts': vm.requested_interrupts(),
+                'cycles': result.cycles,
+                'instructions': result.instructions,
+                'software_interrupts': software_interrupts - start_software_interrupts,
+                'ram': self._changed_words(words, self._ram_words(vm)),
+                'outputs': result.outputs,
+            })
+        return result
+
+    @staticmethod
+    def _restore(vm: VM, entry: dict, start_ts: float) -> CachedRun:
+        for address, words in entry['ram']:
+            # through the bus, so guarded verified code notices changes
+            vm.write_block(address, [NATIVE_NUMBERS[word] for word in words])
+        vm.set_registers(entry['registers'])
+        vm.set_requested_interrupts(entry['interrupts'])
+        outputs = [peripheral for peripheral in vm.peripherals() if getattr(peripheral, 'values', None) is not None]
+        for peripheral, values in zip(outputs, entry['outputs']):
+            for offset, value in enumerate(values):
+                peripheral[ADDRESSES[offset]] = NATIVE_NUMBERS[value & WORD_MASK]
+        vm.account_run(entry['cycles'], entry['instructions'], entry['software_interrupts'],
+                       time.perf_counter() - start_ts)
+        return CachedRun(RunStatus(entry['status']), entry['registers'], entry['cycles'], entry['instructions'],
+                         entry['outputs'], True)
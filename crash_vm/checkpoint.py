@@ -0,0 +1,185 @@
+"""
+Checkpoint files.
+
+A checkpoint file is a sequence of records. The first record holds the whole RAM, every following one only
+pages changed since the previous record, so saving a checkpoint of a long running guest writes its working set.
+A record:
+    header: magic, format version, flags, cycles, instructions, CPU registers, requested interrupts bit mask,
+            RAM size, number of pages in the record
+    pages: page index followed by CHECKPOINT_PAGE_SIZE words (less for the last page of RAM)
+All numbers are little endian, registers and words have WORD_BITS bits and records of 32 bit words are flagged.
+A truncated last record, left by an interrupted write, is ignored on load.
+"""
+import os
+import struct
+import sys
+import threading
+from ._types import NativeNumber, NATIVE_NUMBERS, WORD_BITS, WORD_MASK, WORD_TYPECODE
+from array import array
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+CHECKPOINT_MAGIC = b'CVMC'
+CHECKPOINT_VERSION = 1
+CHECKPOINT_PAGE_SIZE = 0x100
+# incremental records appended to a file before it is rewritten with a single full record
+MAX_INCREMENTS = 64
+
+REGISTERS = ('IA', 'OC', 'OM', 'A0', 'AC', 'SP', 'HI', 'SI', 'IL')
+_FULL_RECORD = 1
+_WIDE_RECORD = 2
+_WORD_FLAGS = 0 if WORD_BITS == 16 else _WIDE_RECORD
+_RECORD_HEADER = struct.Struct(f'<4sHBQQ{len(REGISTERS)}{WORD_TYPECODE}III')
+_PAGE_HEADER = struct.Struct('<I')
+
+
+class CheckpointState(NamedTuple):
+    cycles: int
+    instructions: int
+    registers: Dict[str, int]
+    interrupts: List[int]  # requested hardware interrupt levels
+    ram: List[NativeNumber]
+
+
+def _page_bounds(page: int, ram_size: int) -> Tuple[int, int]:
+    start = page * CHECKPOINT_PAGE_SIZE
+    return start, min(start + CHECKPOINT_PAGE_SIZE, ram_size)
+
+
+def encode_record(state: CheckpointState, pages: Sequence[int], full: bool) -> bytes:
+    ram = state.ram
+    chunks = [_RECORD_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, (_FULL_RECORD if full else 0) | _WORD_FLAGS,
+                                  state.cycles, state.instructions,
+                                  *(state.registers[name] & WORD_MASK for name in REGISTERS),
+                                  sum(1 << level for level in state.interrupts), len(ram), len(pages))]
+    for page in pages:
+        start, end = _page_bounds(page, len(ram))
+        words = array(WORD_TYPECODE, [value.value & WORD_MASK for value in ram[start:end]])
+        if sys.byteorder == 'big':
+            words.byteswap()
+        chunks.append(_PAGE_HEADER.pack(page))
+        chunks.append(words.tobytes())
+    return b''.join(chunks)
+
+
+def read_checkpoint(file: BinaryIO) -> Tuple[CheckpointState, int, bool]:
+    """
+    Read a checkpoint file, returns the state saved by its last complete record, the number of complete records
+    and whether the file has no truncated record at its end.
+    """
+    state = None
+    records = 0
+    intact = True
+    ram: List[NativeNumber] = []
+    while True:
+        header = file.read(_RECORD_HEADER.size)
+        if len(header) < _RECORD_HEADER.size:
+            intact = not header
+            break
+        magic, version, flags, cycles, instructions, *fields = _RECORD_HEADER.unpack(header)
+        registers, (interrupts_mask, ram_size, pages_num) = fields[:len(REGISTERS)], fields[len(REGISTERS):]
+        if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+            raise ValueError(f'Unsupported checkpoint {magic!r} version {version}')
+        if flags & _WIDE_RECORD != _WORD_FLAGS:
+            raise ValueError(f'Checkpoint holds {32 if flags & _WIDE_RECORD else 16} bit words')
+        if records == 0 and not flags & _FULL_RECORD:
+            raise ValueError('Checkpoint does not start with a full record')
+        record_ram = [NATIVE_NUMBERS[0]] * ram_size if flags & _FULL_RECORD else list(ram)
+        if len(record_ram) != ram_size:
+            raise ValueError('Checkpoint RAM size changed between records')
+        try:
+            for _ in range(pages_num):
+                page, = _PAGE_HEADER.unpack(file.read(_PAGE_HEADER.size))
+                start, end = _page_bounds(page, ram_size)
+                words = array(WORD_TYPECODE)
+                words.fromfile(file, end - start)
+                if sys.byteorder == 'big':
+                    words.byteswap()
+                record_ram[start:end] = [NATIVE_NUMBERS[word] for word in words]
+        except (struct.error, EOFError):
+            # interrupted append
+            intact = False
+            break
+        ram = record_ram
+        state = CheckpointState(cycles, instructions, dict(zip(REGISTERS, registers)),
+                                [level for level in range(32) if interrupts_mask >> level & 1], ram)
+        records += 1
+    if state is None:
+        raise ValueError('Invalid checkpoint')
+    return state, records, intact
+
+
+class Checkpointer:
+    """
+    Writes checkpoints of one VM, appending pages changed since the last checkpoint to the same file.
+    Changed pages are passed by the caller when its RAM tracks them, otherwise they are found by comparing RAM
+    with a copy taken at the last checkpoint. Background saves only encode on the calling thread.
+    """
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self._snapshot: Optional[List[NativeNumber]] = None
+        self._increments = 0
+        self._writer: Optional[threading.Thread] = None
+
+    def save(self, path: str, state: CheckpointState, background: bool = False,
+             changed: Optional[Sequence[Tuple[int, int]]] = None):
+        """
+        Save `state`, `changed` holds [start, end) address ranges written since the last save if known.
+        """
+        self.wait()
+        ram = state.ram
+        pages_num = (len(ram) + CHECKPOINT_PAGE_SIZE - 1) // CHECKPOINT_PAGE_SIZE
+        snapshot = self._snapshot
+        full = path != self.path or snapshot is None or len(snapshot) != len(ram) or \
+            self._increments >= MAX_INCREMENTS or not os.path.exists(path)
+        if full:
+            pages = range(pages_num)
+        elif changed is not None:
+            pages = sorted({page for start, end in changed
+                            for page in range(start // CHECKPOINT_PAGE_SIZE, (end - 1) // CHECKPOINT_PAGE_SIZE + 1)})
+        else:
+            pages = []
+            for page in range(pages_num):
+                start, end = _page_bounds(page, len(ram))
+                # pages hold shared NativeNumber instances, comparison mostly checks identities
+                if ram[start:end] != snapshot[start:end]:
+                    pages.append(page)
+        data = encode_record(state, pages, full)
+        self.path = path
+        self._snapshot = ram
+        self._increments = 0 if full else self._increments + 1
+        if background:
+            self._writer = threading.Thread(target=self._write, args=(path, data, full), daemon=True)
+            self._writer.start()
+        else:
+            self._write(path, data, full)
+
+    @staticmethod
+    def _write(path: str, data: bytes, full: bool):
+        if full:
+            # replace the file only when the new one is complete
+            temporary_path = path + '.tmp'
+            with open(temporary_path, 'wb') as file:
+                file.write(data)
+            os.replace(temporary_path, path)
+        else:
+            with open(path, 'ab') as file:
+                file.write(data)
+
+    def load(self, path: str) -> CheckpointState:
+        self.wait()
+        with open(path, 'rb') as file:
+            state, records, intact = read_checkpoint(file)
+        self.path = path
+        self._snapshot = state.ram
+        # records appended after a truncated one would be unreadable, the next save rewrites the file
+        self._increments = records - 1 if intact else MAX_INCREMENTS
+        return state
+
+    def wait(self):
+        """
+        Wait for a background write to complete.
+        """
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
@@ -1,7 +1,10 @@
 from .bus import Bus
-from ._types import Address, NativeNumber, NativeFalse, NativeTrue, float_to_native_number
+from ._types import Address, NativeNumber, NativeFalse, NativeTrue, float_to_native_number, \
+    NATIVE_NUMBERS, ADDRESSES, WORD_BITS, WORD_MASK
+import threading
+from collections import deque
 from enum import Enum
-from typing import Dict, Callable, Tuple, Generator
+from typing import Dict, Callable, Iterable, List, Optional, Tuple, Generator
 from math import sqrt
 
 
@@ -15,6 +18,7 @@ class Instructions(Enum):
     Neg = 0x04  # AC = -AC
     Mul = 0x05  # AC *= [A0]
     Div = 0x06  # AC //= [A0]
+    Sub = 0x07  # AC -= [A0]
 
     Gt = 0x08  # AC = 1 if AC > [A0] else 0
 
@@ -25,6 +29,20 @@ class Instructions(Enum):
     Jmp = 0x0c  # IA = [A0]
     Jif = 0x0d  # if AC != 0: IA = [A0]
 
+    Xchg = 0x0e  # AC, [A0] = [A0], AC atomically
+
+    Mod = 0x30  # AC = remainder of AC //= [A0], with the sign of AC
+    Eq = 0x31  # AC = 1 if AC == [A0] else 0
+    Lt = 0x32  # AC = 1 if AC < [A0] else 0
+    Shl = 0x33  # AC <<= [A0]
+    Shr = 0x34  # AC >>= [A0], logical
+    BAnd = 0x35  # AC &= [A0]
+    BOr = 0x36  # AC |= [A0]
+    BXor = 0x37  # AC ^= [A0]
+
+    Mcpy = 0x40  # copy [A0 + 2] words from [[A0]] to [[A0 + 1]]
+    Mset = 0x41  # fill [A0 + 2] words at [[A0 + 1]] with [A0]
+
     A0A = 0x10  # OM[0] = 0
     A0L = 0x11  # OM[0] = 1
     A0V = 0x12  # OM[1] = 1
@@ -35,10 +53,13 @@ class Instructions(Enum):
     HIH = 0x20  # HI = A0
     SIH = 0x21  # SI = A0
     IHR = 0x22  #
+    Wait = 0x23  # idle until a hardware interrupt is requested
 
     Stk = 0x70  # PS = [A0]
     Push = 0x71  # [SP] = AC
     Pop = 0x72  # AC = [SP]
+    Call = 0x73  # insert IA under [[A0]] arguments on the stack, IA = [A0] + 1
+    Ret = 0x74  # IA = [SP - A0 - 1]
 
     Sqrt = 0xe1  # sqrt(AC)
 
@@ -65,6 +86,11 @@ class OMFlags(Enum):
     A0AddressingMode = 2  # 0 - RAM address, 1 - stack offset
 
 
+# words moved by block memory instructions between checks for hardware interrupts
+BLOCK_TRANSFER_CHUNK = 16
+# hexadecimal digits of printed registers
+_REGISTER_DIGITS = WORD_BITS // 4
+
 instruction_methods: Dict[Instructions, Tuple[Callable, InstructionArgTypes]] = {}
 
 
@@ -82,6 +108,8 @@ class SWInterrupt(Exception):
         Halt = 0
         InvalidInstruction = 1
         Breakpoint = 2
+        InvalidPage = 3
+        DivisionByZero = 4
 
     def __init__(self, code):
         super().__init__()
@@ -108,6 +136,21 @@ class CPU:
         self._SI = Address()  # software interrupt handlers table address
         self._IL = NativeNumber()  # current executed interrupt level + 1 (0 - no interrupt handler executed)
 
+        # statistics, entered hardware interrupt handlers by level and raised software interrupts
+        self.hardware_interrupts_taken = [0] * irq_levels
+        self.software_interrupts_raised = 0
+
+        # interrupts posted by other threads, deque appends and pops are atomic
+        self._posted_interrupts = deque()
+        # requested before the next instruction, the owner may take over by disabling it and calling `irq` itself
+        self.drain_posted_interrupts = True
+        self._wakeup = threading.Event()
+        # called by Wait with no interrupt requested, returns when the CPU should check for interrupts again
+        self.idle_handler: Callable[[], None] = lambda: None
+        # instructions decoded at load time by address, see `verified_cycle`
+        self._decoded: Dict[int, Tuple[Callable, InstructionArgTypes, NativeNumber, NativeNumber,
+                                       Address, Address]] = {}
+
         self.reset()
 
     def reset(self):
@@ -120,53 +163,82 @@ class CPU:
         self._HI = Address(0)
         self._SI = Address(0)
         self._IL = NativeNumber(0)
+        self.hardware_interrupts_taken = [0] * self._irq_levels
+        self.software_interrupts_raised = 0
+        self._posted_interrupts.clear()
 
     def get_irq_levels(self):
         return self._irq_levels
 
+    def get_instruction_address(self) -> Address:
+        return self._IA
+
+    def get_stack_pointer(self) -> Address:
+        return self._SP
+
+    def get_accumulator(self) -> NativeNumber:
+        return self._AC
+
+    def get_operation_mode(self) -> NativeNumber:
+        return self._OM
+
+    def return_to(self, address: Address, stack_pointer: Address, accumulator: NativeNumber,
+                  operation_mode: NativeNumber):
+        """
+        Set registers to the state after a subroutine return, must be called between instructions.
+        """
+        self._IA = address
+        self._SP = stack_pointer
+        self._AC = accumulator
+        self._OM = operation_mode
+
     def _push_state(self) -> Generator:
-        self._fsb[self._SP] = NativeNumber(self._IA.value)
-        self._SP = Address(self._SP.value + 1)
+        self._fsb[self._SP] = NATIVE_NUMBERS[self._IA.value]
+        self._SP = ADDRESSES[(self._SP.value + 1) & WORD_MASK]
         yield
-        self._fsb[self._SP] = NativeNumber(self._IL.value)
-        self._SP = Address(self._SP.value + 1)
+        self._fsb[self._SP] = self._IL
+        self._SP = ADDRESSES[(self._SP.value + 1) & WORD_MASK]
         yield
-        self._fsb[self._SP] = NativeNumber(self._AC.value)
-        self._SP = Address(self._SP.value + 1)
+        self._fsb[self._SP] = self._AC
+        self._SP = ADDRESSES[(self._SP.value + 1) & WORD_MASK]
         yield
-        self._fsb[self._SP] = NativeNumber(self._OM.value)
-        self._SP = Address(self._SP.value + 1)
+        self._fsb[self._SP] = self._OM
+        self._SP = ADDRESSES[(self._SP.value + 1) & WORD_MASK]
         yield
 
     def _process_software_interrupt(self, interrupt: SWInterrupt) -> Generator:
         if self._SI.value == 0 or interrupt.code >= self._sw_interrupts:
             raise interrupt
 
-        handler_address = self._fsb[Address(self._SI.value + interrupt.code)]
+        handler_address = self._fsb[ADDRESSES[(self._SI.value + interrupt.code) & WORD_MASK]]
         if handler_address.value == 0:
             raise interrupt
 
         yield from self._push_state()
 
-        self._IA = Address(handler_address.value)
-        self._IL = NativeNumber(self._sw_interrupt_level + 1)
+        self._IA = ADDRESSES[handler_address.value & WORD_MASK]
+        self._IL = NATIVE_NUMBERS[self._sw_interrupt_level + 1]
         yield
 
     def _process_hardware_interrupt(self, level: int) -> Generator:
         if self._HI.value == 0:
             return
 
-        handler_address = self._fsb[Address(self._HI.value + level)]
+        handler_address = self._fsb[ADDRESSES[(self._HI.value + level) & WORD_MASK]]
         if handler_address.value == 0:
             return
 
+        self.hardware_interrupts_taken[level] += 1
         yield from self._push_state()
 
-        self._IA = Address(handler_address.value)
-        self._IL = NativeNumber(level + 1)
+        self._IA = ADDRESSES[handler_address.value & WORD_MASK]
+        self._IL = NATIVE_NUMBERS[level + 1]
         yield
 
     def cycle(self) -> Generator:
+        if self._posted_interrupts and self.drain_posted_interrupts:
+            self._request_posted_interrupts()
+
         for irq_level in range(self._irq_levels - 1, max(self._IL.value - 2, 0), -1):
             if self._interrupts_requested[irq_level]:
                 self._interrupts_requested[irq_level] = False
@@ -175,22 +247,21 @@ class CPU:
 
         # fetch opcode
         self._OC = self._fsb[self._IA]
-        self._IA = Address(self._IA.value + 1)
+        self._IA = ADDRESSES[(self._IA.value + 1) & WORD_MASK]
         yield
 
         try:
             # decode opcode
             try:
-                instruction = Instructions(self._OC.value)
-            except ValueError:
+                method, arg_type = DISPATCH_TABLE[self._OC.value]
+            except KeyError:
                 raise SWInterrupt(SWInterrupt.ReservedCodes.InvalidInstruction.value)
-            method, arg_type = instruction_methods[instruction]
             yield
 
             if arg_type != InstructionArgTypes.NoArg:
                 # fetch argument
                 self._A0 = self._fsb[self._IA]
-                self._IA = Address(self._IA.value + 1)
+                self._IA = ADDRESSES[(self._IA.value + 1) & WORD_MASK]
                 yield
 
                 yield from self._resolve_arg0(arg_type)
@@ -205,6 +276,53 @@ class CPU:
                 yield
 
         except SWInterrupt as swi:
+            self.software_interrupts_raised += 1
+            yield from self._process_software_interrupt(swi)
+
+    def set_verified(self, instructions: Dict[int, Tuple[int, int]]):
+        """
+        Decode instructions by address, as returned by `verify.verify`, for `verified_cycle`.
+        An empty dict makes `verified_cycle` check every instruction again.
+        """
+        self._decoded = {
+            address: (*DISPATCH_TABLE[opcode], NATIVE_NUMBERS[opcode], NATIVE_NUMBERS[argument & WORD_MASK],
+                      ADDRESSES[(address + 1) & WORD_MASK], ADDRESSES[(address + 2) & WORD_MASK])
+            for address, (opcode, argument) in instructions.items()}
+
+    def verified_cycle(self) -> Generator:
+        """
+        `cycle` for verified code: an instruction decoded by `set_verified` is executed without fetching its words
+        and checking its opcode. Other addresses and pending interrupts are handled by `cycle`.
+        """
+        decoded = self._decoded.get(self._IA.value)
+        if decoded is None or self._posted_interrupts or True in self._interrupts_requested.values():
+            return self.cycle()
+        return self._verified_instruction(*decoded)
+
+    def _verified_instruction(self, method: Callable, arg_type: InstructionArgTypes, opcode: NativeNumber,
+                              argument: NativeNumber, opcode_next: Address, argument_next: Address) -> Generator:
+        # same micro-steps as `cycle`
+        self._OC = opcode
+        self._IA = opcode_next
+        yield
+        yield
+
+        try:
+            if arg_type is not InstructionArgTypes.NoArg:
+                self._A0 = argument
+                self._IA = argument_next
+                yield
+
+                yield from self._resolve_arg0(arg_type)
+
+            method_iter = method(self)
+            if method_iter is not None:
+                yield from method_iter
+            else:
+                yield
+
+        except SWInterrupt as swi:
+            self.software_interrupts_raised += 1
             yield from self._process_software_interrupt(swi)
 
     @staticmethod
@@ -214,9 +332,9 @@ class CPU:
     @staticmethod
     def _set_flag(register, flag, value) -> NativeNumber:
         if value:
-            return NativeNumber(register.value | 1 << flag.value)
+            return NATIVE_NUMBERS[(register.value | 1 << flag.value) & WORD_MASK]
         else:
-            return NativeNumber(register.value & ~(1 << flag.value))
+            return NATIVE_NUMBERS[register.value & ~(1 << flag.value) & WORD_MASK]
 
     def _resolve_arg0(self, arg_type: InstructionArgTypes) -> Generator:
         if arg_type == InstructionArgTypes.ValueArg:
@@ -225,24 +343,80 @@ class CPU:
         if arg_type == InstructionArgTypes.ValueAddressArg:
             if self._flag(self._OM, OMFlags.A0Type) == 0:
                 if self._flag(self._OM, OMFlags.A0AddressingMode) == 1:
-                    self._A0 = NativeNumber(self._SP.value - self._A0.value - 1)
+                    self._A0 = NATIVE_NUMBERS[(self._SP.value - self._A0.value - 1) & WORD_MASK]
                 # fetch argument value
-                self._A0 = self._fsb[Address(self._A0.value)]
+                self._A0 = self._fsb[ADDRESSES[self._A0.value & WORD_MASK]]
                 yield
 
         if arg_type == InstructionArgTypes.AddressArg:
             if self._flag(self._OM, OMFlags.A0AddressingMode) == 1:
-                self._A0 = NativeNumber(self._SP.value - self._A0.value - 1)
+                self._A0 = NATIVE_NUMBERS[(self._SP.value - self._A0.value - 1) & WORD_MASK]
 
         if self._flag(self._OM, OMFlags.A0ValueType) == 1:
             # resolve argument value as pointer
-            self._A0 = self._fsb[Address(self._A0.value)]
+            self._A0 = self._fsb[ADDRESSES[self._A0.value & WORD_MASK]]
             yield
 
     def irq(self, level: int):
         assert level in self._interrupts_requested
         self._interrupts_requested[level] = True
 
+    def post_irq(self, level: int):
+        """
+        Request a hardware interrupt from any thread, it is requested before the next instruction.
+        Wakes up a CPU idling in Wait.
+        """
+        if level not in self._interrupts_requested:
+            raise ValueError(f'Invalid IRQ level {level}')
+        self._posted_interrupts.append(level)
+        self._wakeup.set()
+
+    def take_posted_interrupts(self) -> List[int]:
+        levels = []
+        posted = self._posted_interrupts
+        while posted:
+            levels.append(posted.popleft())
+        return levels
+
+    def interrupts_posted(self) -> bool:
+        return bool(self._posted_interrupts)
+
+    def _request_posted_interrupts(self):
+        for level in self.take_posted_interrupts():
+            self._interrupts_requested[level] = True
+
+    def wake(self):
+        """
+        Return from `wait_for_interrupt` without an interrupt, may be called from any thread.
+        """
+        self._wakeup.set()
+
+    def wait_for_interrupt(self, timeout: Optional[float]) -> bool:
+        """
+        Block until an interrupt is posted, `wake` is called or `timeout` seconds pass.
+        Returns False on timeout.
+        """
+        self._wakeup.clear()
+        # posted after clear are seen here or set the event
+        if self._posted_interrupts or self.interrupt_pending():
+            return True
+        return self._wakeup.wait(timeout)
+
+    def interrupt_pending(self) -> bool:
+        """
+        Whether a requested hardware interrupt is checked before the next instruction.
+        """
+        requested = self._interrupts_requested
+        return any(requested[irq_level] for irq_level in range(self._irq_levels - 1, max(self._IL.value - 2, 0), -1))
+
+    def requested_interrupts(self) -> List[int]:
+        return [level for level, requested in self._interrupts_requested.items() if requested]
+
+    def set_requested_interrupts(self, levels: Iterable[int]):
+        self._interrupts_requested = {i: False for i in range(self._irq_levels)}
+        for level in levels:
+            self.irq(level)
+
     @perform_instruction(Instructions.Noop)
     def _noop(self):
         pass
@@ -257,24 +431,42 @@ class CPU:
 
     @perform_instruction(Instructions.St, InstructionArgTypes.AddressArg)
     def _store(self):
-        self._fsb[Address(self._A0.value)] = self._AC
+        self._fsb[ADDRESSES[self._A0.value & WORD_MASK]] = self._AC
+
+    @perform_instruction(Instructions.Xchg, InstructionArgTypes.AddressArg)
+    def _exchange(self):
+        self._AC = self._fsb.exchange(ADDRESSES[self._A0.value & WORD_MASK], self._AC)
 
     @perform_instruction(Instructions.Add, InstructionArgTypes.ValueAddressArg)
     def _add(self):
-        self._AC = NativeNumber(self._AC.value + self._A0.value)
+        self._AC = NATIVE_NUMBERS[(self._AC.value + self._A0.value) & WORD_MASK]
+
+    @perform_instruction(Instructions.Sub, InstructionArgTypes.ValueAddressArg)
+    def _subtract(self):
+        self._AC = NATIVE_NUMBERS[(self._AC.value - self._A0.value) & WORD_MASK]
 
     @perform_instruction(Instructions.Neg)
     def _neg(self):
-        self._AC = NativeNumber(-self._AC.value)
+        self._AC = NATIVE_NUMBERS[-self._AC.value & WORD_MASK]
 
     @perform_instruction(Instructions.Mul, InstructionArgTypes.ValueAddressArg)
     def _multiply(self):
-        self._AC = NativeNumber(self._AC.value * self._A0.value)
+        self._AC = NATIVE_NUMBERS[(self._AC.value * self._A0.value) & WORD_MASK]
 
     @perform_instruction(Instructions.Div, InstructionArgTypes.ValueAddressArg)
     def _divide(self):
+        if not self._A0.value:
+            raise SWInterrupt(SWInterrupt.ReservedCodes.DivisionByZero.value)
         self._AC = float_to_native_number(self._AC.value / self._A0.value)
 
+    @perform_instruction(Instructions.Mod, InstructionArgTypes.ValueAddressArg)
+    def _modulo(self):
+        # consistent with Div, which truncates towards zero
+        if not self._A0.value:
+            raise SWInterrupt(SWInterrupt.ReservedCodes.DivisionByZero.value)
+        remainder = abs(self._AC.value) % abs(self._A0.value)
+        self._AC = NATIVE_NUMBERS[(-remainder if self._AC.value < 0 else remainder) & WORD_MASK]
+
     @perform_instruction(Instructions.Sqrt)
     def _square_root(self):
         self._AC = float_to_native_number(sqrt(self._AC.value))
@@ -283,6 +475,35 @@ class CPU:
     def _greater(self):
         self._AC = NativeTrue if self._AC.value > self._A0.value else NativeFalse
 
+    @perform_instruction(Instructions.Eq, InstructionArgTypes.ValueAddressArg)
+    def _equal(self):
+        self._AC = NativeTrue if self._AC.value == self._A0.value else NativeFalse
+
+    @perform_instruction(Instructions.Lt, InstructionArgTypes.ValueAddressArg)
+    def _less(self):
+        self._AC = NativeTrue if self._AC.value < self._A0.value else NativeFalse
+
+    @perform_instruction(Instructions.Shl, InstructionArgTypes.ValueAddressArg)
+    def _shift_left(self):
+        # shift counts are unsigned, counts over the word size clear AC
+        self._AC = NATIVE_NUMBERS[(self._AC.value << min(self._A0.value & WORD_MASK, WORD_BITS)) & WORD_MASK]
+
+    @perform_instruction(Instructions.Shr, InstructionArgTypes.ValueAddressArg)
+    def _shift_right(self):
+        self._AC = NATIVE_NUMBERS[(self._AC.value & WORD_MASK) >> min(self._A0.value & WORD_MASK, WORD_BITS)]
+
+    @perform_instruction(Instructions.BAnd, InstructionArgTypes.ValueAddressArg)
+    def _bitwise_and(self):
+        self._AC = NATIVE_NUMBERS[self._AC.value & self._A0.value & WORD_MASK]
+
+    @perform_instruction(Instructions.BOr, InstructionArgTypes.ValueAddressArg)
+    def _bitwise_or(self):
+        self._AC = NATIVE_NUMBERS[(self._AC.value | self._A0.value) & WORD_MASK]
+
+    @perform_instruction(Instructions.BXor, InstructionArgTypes.ValueAddressArg)
+    def _bitwise_xor(self):
+        self._AC = NATIVE_NUMBERS[(self._AC.value ^ self._A0.value) & WORD_MASK]
+
     @perform_instruction(Instructions.Not)
     def _not(self):
         self._AC = NativeTrue if self._AC.value == NativeFalse.value else NativeFalse
@@ -297,7 +518,7 @@ class CPU:
 
     @perform_instruction(Instructions.Jmp, InstructionArgTypes.AddressArg)
     def _jump(self):
-        self._IA = Address(self._A0.value)
+        self._IA = ADDRESSES[self._A0.value & WORD_MASK]
 
     @perform_instruction(Instructions.Jif, InstructionArgTypes.AddressArg)
     def _jump_if(self):
@@ -330,39 +551,112 @@ class CPU:
 
     @perform_instruction(Instructions.HIH, InstructionArgTypes.AddressArg)
     def _set_hardware_interrupt_handlers_address(self):
-        self._HI = Address(self._A0.value)
+        self._HI = ADDRESSES[self._A0.value & WORD_MASK]
 
     @perform_instruction(Instructions.SIH, InstructionArgTypes.AddressArg)
     def _set_software_interrupt_handlers_address(self):
-        self._SI = Address(self._A0.value)
+        self._SI = ADDRESSES[self._A0.value & WORD_MASK]
 
     @perform_instruction(Instructions.IHR)
     def _interrupt_handler_return(self) -> Generator:
-        self._OM = self._fsb[Address(self._SP.value - 1)]
-        self._SP = Address(self._SP.value - 1)
+        self._SP = ADDRESSES[(self._SP.value - 1) & WORD_MASK]
+        self._OM = self._fsb[self._SP]
         yield
-        self._AC = self._fsb[Address(self._SP.value - 1)]
-        self._SP = Address(self._SP.value - 1)
+        self._SP = ADDRESSES[(self._SP.value - 1) & WORD_MASK]
+        self._AC = self._fsb[self._SP]
         yield
-        self._IL = self._fsb[Address(self._SP.value - 1)]
-        self._SP = Address(self._SP.value - 1)
+        self._SP = ADDRESSES[(self._SP.value - 1) & WORD_MASK]
+        self._IL = self._fsb[self._SP]
         yield
-        self._IA = self._fsb[Address(self._SP.value - 1)]
-        self._SP = Address(self._SP.value - 1)
+        self._SP = ADDRESSES[(self._SP.value - 1) & WORD_MASK]
+        self._IA = ADDRESSES[self._fsb[self._SP].value & WORD_MASK]
+        yield
+
+    def _block_transfer(self, fill: bool) -> Generator:
+        # descriptor words: source address (fill value for Mset), destination address, number of words;
+        # an instruction interrupted by a hardware interrupt, requested or posted, stores its progress
+        # in the descriptor and is executed again with it after the handler returns
+        fsb = self._fsb
+        descriptor = [ADDRESSES[(self._A0.value + i) & WORD_MASK] for i in range(3)]
+        source, destination, count = (fsb[address].value & WORD_MASK for address in descriptor)
+        yield
+        while count:
+            if self.interrupt_pending() or (self._posted_interrupts and self.drain_posted_interrupts):
+                self._IA = ADDRESSES[(self._IA.value - 2) & WORD_MASK]
+                for address, value in zip(descriptor, (source, destination, count)):
+                    fsb[address] = NATIVE_NUMBERS[value & WORD_MASK]
+                break
+            n = min(count, BLOCK_TRANSFER_CHUNK)
+            if fill:
+                fsb.write_block(destination, [NATIVE_NUMBERS[source]] * n)
+                destination += n
+            elif source < destination < source + count:
+                # overlapping ranges are copied from the end
+                fsb.write_block(destination + count - n, fsb.read_block(source + count - n, n))
+            else:
+                fsb.write_block(destination, fsb.read_block(source, n))
+                source += n
+                destination += n
+            count -= n
+            for _ in range(n):
+                yield
+        yield
+
+    @perform_instruction(Instructions.Mcpy, InstructionArgTypes.AddressArg)
+    def _memory_copy(self) -> Generator:
+        return self._block_transfer(False)
+
+    @perform_instruction(Instructions.Mset, InstructionArgTypes.AddressArg)
+    def _memory_set(self) -> Generator:
+        return self._block_transfer(True)
+
+    @perform_instruction(Instructions.Wait)
+    def _wait(self) -> Generator:
+        if self.drain_posted_interrupts:
+            self._request_posted_interrupts()
+        if not self.interrupt_pending():
+            self.idle_handler()
+            if self.drain_posted_interrupts:
+                self._request_posted_interrupts()
+            if not self.interrupt_pending():
+                # woken up without an interrupt, wait again when execution is resumed
+                self._IA = ADDRESSES[(self._IA.value - 1) & WORD_MASK]
         yield
 
     @perform_instruction(Instructions.Stk, InstructionArgTypes.AddressArg)
     def _set_stack_pointer(self):
-        self._SP = Address(self._A0.value)
+        self._SP = ADDRESSES[self._A0.value & WORD_MASK]
 
     @perform_instruction(Instructions.Push)
     def _stack_push(self):
         self._fsb[self._SP] = self._AC
-        self._SP = Address(self._SP.value + 1)
+        self._SP = ADDRESSES[(self._SP.value + 1) & WORD_MASK]
 
     @perform_instruction(Instructions.Pop, InstructionArgTypes.ValueArg)
     def _stack_pop(self):
-        self._SP = Address(self._SP.value - self._A0.value)
+        self._SP = ADDRESSES[(self._SP.value - self._A0.value) & WORD_MASK]
+
+    @perform_instruction(Instructions.Call, InstructionArgTypes.AddressArg)
+    def _call(self) -> Generator:
+        # the first word of a function holds the number of its arguments, the return address is inserted under
+        # arguments already pushed by the caller, as in the documented calling convention
+        fsb = self._fsb
+        function_address = self._A0.value & WORD_MASK
+        args = fsb[ADDRESSES[function_address]].value & WORD_MASK
+        yield
+        stack_pointer = self._SP.value
+        for i in range(args):
+            fsb[ADDRESSES[(stack_pointer - i) & WORD_MASK]] = fsb[ADDRESSES[(stack_pointer - i - 1) & WORD_MASK]]
+            yield
+        fsb[ADDRESSES[(stack_pointer - args) & WORD_MASK]] = NATIVE_NUMBERS[self._IA.value]
+        self._SP = ADDRESSES[(stack_pointer + 1) & WORD_MASK]
+        self._IA = ADDRESSES[(function_address + 1) & WORD_MASK]
+        yield
+
+    @perform_instruction(Instructions.Ret, InstructionArgTypes.ValueArg)
+    def _return(self):
+        # A0 is the number of arguments and returned values above the return address, the caller pops them
+        self._IA = ADDRESSES[self._fsb[ADDRESSES[(self._SP.value - self._A0.value - 1) & WORD_MASK]].value & WORD_MASK]
 
     def to_dict(self):
         return {
@@ -377,8 +671,29 @@ class CPU:
             'IL': self._IL.value,
         }
 
+    def from_dict(self, registers: Dict[str, int]):
+        """
+        Restore registers returned by `to_dict`.
+        """
+        self._IA = ADDRESSES[registers['IA'] & WORD_MASK]
+        self._OC = NATIVE_NUMBERS[registers['OC'] & WORD_MASK]
+        self._OM = NATIVE_NUMBERS[registers['OM'] & WORD_MASK]
+        self._A0 = NATIVE_NUMBERS[registers['A0'] & WORD_MASK]
+        self._AC = NATIVE_NUMBERS[registers['AC'] & WORD_MASK]
+        self._SP = ADDRESSES[registers['SP'] & WORD_MASK]
+        self._HI = ADDRESSES[registers['HI'] & WORD_MASK]
+        self._SI = ADDRESSES[registers['SI'] & WORD_MASK]
+        self._IL = NATIVE_NUMBERS[registers['IL'] & WORD_MASK]
+
     def __str__(self):
-        return 'CPU(' + ', '.join(map(lambda item: f'{item[0]}: {item[1]:04x}', self.to_dict().items())) + ')'
+        return 'CPU(' + ', '.join(map(lambda item: f'{item[0]}: {item[1]:0{_REGISTER_DIGITS}x}',
+                                      self.to_dict().items())) + ')'
 
     def __repr__(self):
-        return 'CPU:\n' + '\n'.join(map(lambda item: f'    {item[0]}: {item[1]:04x}', self.to_dict().items()))
+        return 'CPU:\n' + '\n'.join(map(lambda item: f'    {item[0]}: {item[1]:0{_REGISTER_DIGITS}x}',
+                                             self.to_dict().items()))
+
+
+# opcode value -> (method, argument type), precomputed so decoding doesn't go through Enum lookups
+DISPATCH_TABLE: Dict[int, Tuple[Callable, InstructionArgTypes]] = {
+    instruction.value: method_and_arg_type for instruction, method_and_arg_type in instruction_methods.items()}
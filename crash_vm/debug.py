@@ -0,0 +1,47 @@
+from ._types import Address, NativeNumber
+from .bus import Slave
+from typing import Callable, NamedTuple, Optional
+
+
+class WatchpointHit(NamedTuple):
+    address: Address
+    write: bool
+    value: NativeNumber
+
+
+# returns True to stop execution at the next instruction boundary
+WatchpointCallback = Callable[[WatchpointHit], Optional[bool]]
+
+
+class WatchedSlave(Slave):
+    """
+    Single word route overlaid on a bus to observe accesses to one address.
+    Every other address keeps being served directly by its slave.
+    """
+
+    def __init__(self, address: Address, slave: Slave, local_address: Address,
+                 read: bool, write: bool, on_hit: Callable[[WatchpointHit], None]):
+        self.address = address
+        self._slave = slave
+        self._local_address = local_address
+        self._read = read
+        self._write = write
+        self._on_hit = on_hit
+
+    def retarget(self, slave: Slave, local_address: Address):
+        """
+        Forward accesses to another slave, e.g. one overlaid on the bus after the watchpoint.
+        """
+        self._slave = slave
+        self._local_address = local_address
+
+    def __getitem__(self, address: Address) -> NativeNumber:
+        value = self._slave[self._local_address]
+        if self._read:
+            self._on_hit(WatchpointHit(self.address, False, value))
+        return value
+
+    def __setitem__(self, address: Address, value: NativeNumber) -> None:
+        self._slave[self._local_address] = value
+        if self._write:
+            self._on_hit(WatchpointHit(self.address, True, value))
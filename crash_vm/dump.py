@@ -0,0 +1,61 @@
+"""
+Memory dumps rendered line by line into a text stream.
+
+Lines hold WORDS_PER_LINE words prefixed by the address of the first one, as in `RAM.__repr__`.
+A run of lines holding only zeros is replaced by a single `*` line. Dumps against a snapshot, a list of
+values taken earlier, show only lines with changed words, unchanged words are left blank.
+"""
+from ._types import NATIVE_NUMBERS, NativeNumber, WORD_BITS, WORD_MASK
+from typing import Callable, List, Optional, Sequence, TextIO
+
+WORDS_PER_LINE = 16
+# lines read from memory at once
+_READ_LINES = 256
+_WORD_WIDTH = WORD_BITS // 4
+_INDENT = '    '
+_ZERO = NATIVE_NUMBERS[0]
+_WORD_FORMAT = f'%0{_WORD_WIDTH}x'
+_LINE_FORMAT = ' '.join([_WORD_FORMAT] * WORDS_PER_LINE)
+
+
+def write_header(file: TextIO):
+    columns = ' '.join(f'{i:0{_WORD_WIDTH}x}' for i in range(WORDS_PER_LINE))
+    separators = ' '.join(['.' * _WORD_WIDTH] * WORDS_PER_LINE)
+    padding = _INDENT + ' ' * (_WORD_WIDTH + 3)
+    file.write(f'{padding}{columns}\n{padding}{separators}\n')
+
+
+def dump_words(read_block: Callable[[int, int], List[NativeNumber]], size: int, file: TextIO,
+               start: int = 0, end: Optional[int] = None, snapshot: Optional[Sequence[NativeNumber]] = None,
+               skip_zeros: bool = True):
+    """
+    Write lines covering words [start, end) of a memory of `size` words, read with `read_block(offset, n)`.
+    The range is widened to whole lines.
+    """
+    end = size if end is None else min(end + (-end % WORDS_PER_LINE), size)
+    start = max(start - start % WORDS_PER_LINE, 0)
+    write = file.write
+    skipping = False
+    chunk_size = WORDS_PER_LINE * _READ_LINES
+    for chunk_start in range(start, end, chunk_size):
+        chunk = read_block(chunk_start, min(chunk_size, end - chunk_start))
+        for line_offset in range(0, len(chunk), WORDS_PER_LINE):
+            line = chunk[line_offset:line_offset + WORDS_PER_LINE]
+            address = chunk_start + line_offset
+            if snapshot is not None:
+                previous = snapshot[address:address + WORDS_PER_LINE]
+                # memories hold shared NativeNumber instances, comparison mostly checks identities
+                if line == previous:
+                    continue
+                words = ' '.join(' ' * _WORD_WIDTH if i < len(previous) and value == previous[i]
+                                 else _WORD_FORMAT % (value.value & WORD_MASK) for i, value in enumerate(line)).rstrip()
+            else:
+                if skip_zeros and line.count(_ZERO) == len(line):
+                    if not skipping:
+                        write(f'{_INDENT}*\n')
+                        skipping = True
+                    continue
+                line_format = _LINE_FORMAT if len(line) == WORDS_PER_LINE else ' '.join([_WORD_FORMAT] * len(line))
+                words = line_format % tuple([value.value & WORD_MASK for value in line])
+            skipping = False
+            write(f'{_INDENT}{address:0{_WORD_WIDTH}x} : {words}\n')
@@ -0,0 +1,54 @@
+import struct
+import sys
+from ._types import NativeNumber, Address, WORD_BITS, WORD_MASK, WORD_TYPECODE
+from enum import Enum
+from array import array
+from typing import BinaryIO, List, Sequence, Union
+
+ProgramWord = Union[Enum, NativeNumber, Address, int]
+
+IMAGE_MAGIC = b'CVMI'
+IMAGE_VERSION = 1
+# magic, version, bits of image words
+_IMAGE_HEADER = struct.Struct('<4sHB')
+
+
+def to_words(program: Sequence[ProgramWord]) -> List[int]:
+    """
+    Convert a program produced by asm.compile to unsigned words.
+    """
+    return [(value.value if isinstance(value, (Enum, NativeNumber, Address)) else value) & WORD_MASK
+            for value in program]
+
+
+def save_image(program: Sequence[ProgramWord], file: BinaryIO):
+    """
+    Write a program as an image: a header with the word size followed by little endian words, of WORD_BITS bits.
+    """
+    words = array(WORD_TYPECODE, to_words(program))
+    if sys.byteorder == 'big':
+        words.byteswap()
+    file.write(_IMAGE_HEADER.pack(IMAGE_MAGIC, IMAGE_VERSION, WORD_BITS))
+    file.write(words.tobytes())
+
+
+def load_image(file: BinaryIO) -> List[NativeNumber]:
+    """
+    Read an image written by `save_image`, images of the other word size are rejected.
+    """
+    header = file.read(_IMAGE_HEADER.size)
+    if len(header) < _IMAGE_HEADER.size:
+        raise ValueError('Invalid image')
+    magic, version, word_bits = _IMAGE_HEADER.unpack(header)
+    if magic != IMAGE_MAGIC or version != IMAGE_VERSION:
+        raise ValueError(f'Unsupported image {magic!r} version {version}')
+    if word_bits != WORD_BITS:
+        raise ValueError(f'Image holds {word_bits} bit words')
+    data = file.read()
+    words = array(WORD_TYPECODE)
+    if len(data) % words.itemsize:
+        raise ValueError('Invalid image size')
+    words.frombytes(data)
+    if sys.byteorder == 'big':
+        words.byteswap()
+    return [NativeNumber(word) for word in words]
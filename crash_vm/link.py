@@ -0,0 +1,128 @@
+import hashlib
+from collections import OrderedDict
+from .asm import CompilationError, ExportLine, ImportLine, LabelLine, LabelValue, parse
+from ._types import Address, NativeNumber, WORD_MASK
+from .cpu import Instructions
+from typing import Dict, Iterable, List, Tuple, Union
+
+# number of assembled modules kept by assemble_module
+MODULE_CACHE_SIZE = 256
+
+
+class LinkError(CompilationError):
+    pass
+
+
+class ObjectModule:
+    """
+    Relocatable assembled module.
+
+    Addresses of module labels are relative to the module start, including `OFFSET` lines.
+    Labels are local to the module unless listed by an `EXPORT` line, labels of other modules
+    are referenced after listing them by an `IMPORT` line and resolved by `link`:
+
+        IMPORT fun_factorial stack
+        EXPORT main
+
+    Literal addresses are absolute and never relocated.
+    """
+
+    def __init__(self, words: Tuple[Union[Instructions, NativeNumber, Address], ...],
+                 exports: Dict[str, int], relocations: Tuple[int, ...], imports: Tuple[Tuple[int, str], ...]):
+        self.words = words
+        self.exports = exports
+        self.relocations = relocations  # offsets of words holding module relative addresses
+        self.imports = imports  # offsets of words holding imported label addresses
+
+    def __len__(self):
+        return len(self.words)
+
+
+class LinkedProgram(list):
+    """
+    Program produced by `link`, with addresses of all exported labels.
+    """
+
+    def __init__(self, words, symbols: Dict[str, Address]):
+        super().__init__(words)
+        self.symbols = symbols
+
+
+_module_cache: 'OrderedDict[str, ObjectModule]' = OrderedDict()
+
+
+def assemble_module(source: str) -> ObjectModule:
+    """
+    Assemble a relocatable module, modules are cached by content hash.
+    """
+    key = hashlib.sha256(source.encode()).hexdigest()
+    module = _module_cache.get(key)
+    if module is not None:
+        _module_cache.move_to_end(key)
+        return module
+
+    parsed = list(parse(source))
+    labels = {line.label: line.address.value for line in parsed if isinstance(line, LabelLine)}
+    exported = [symbol for line in parsed if isinstance(line, ExportLine) for symbol in line.symbols]
+    imported = {symbol for line in parsed if isinstance(line, ImportLine) for symbol in line.symbols}
+    for label in exported:
+        if label not in labels:
+            raise LinkError(f'Exported label {label} is not defined in the module')
+    for label in imported & labels.keys():
+        raise LinkError(f'Imported label {label} is defined in the module')
+    exports = {label: labels[label] for label in exported}
+    words = []
+    relocations = []
+    imports = []
+    for line in parsed:
+        for byte in line.produce_bytes_padded():
+            if isinstance(byte, LabelValue):
+                if byte in labels:
+                    relocations.append(len(words))
+                    byte = Address(labels[byte])
+                elif byte in imported:
+                    imports.append((len(words), str(byte)))
+                    byte = Address(0)
+                else:
+                    raise LinkError(f'Label {byte} is neither defined nor imported')
+            words.append(byte)
+    module = ObjectModule(tuple(words), exports, tuple(relocations), tuple(imports))
+
+    _module_cache[key] = module
+    if len(_module_cache) > MODULE_CACHE_SIZE:
+        _module_cache.popitem(last=False)
+    return module
+
+
+def link(modules: Iterable[Union[str, ObjectModule]]) -> LinkedProgram:
+    """
+    Place modules one after another starting at address 0 and resolve imported labels to exported ones.
+    Sources are assembled with `assemble_module`. Execution starts at the beginning of the first module.
+    """
+    placed: List[Tuple[int, ObjectModule]] = []
+    symbols: Dict[str, Address] = {}
+    address = 0
+    for module in modules:
+        if isinstance(module, str):
+            module = assemble_module(module)
+        for label, offset in module.exports.items():
+            if label in symbols:
+                raise LinkError(f'Label {label} is exported by more than one module')
+            symbols[label] = Address(address + offset)
+        placed.append((address, module))
+        address += len(module)
+    if address > WORD_MASK + 1:
+        raise LinkError(f'Program size {address} exceeds address space')
+
+    program = []
+    for base, module in placed:
+        words = list(module.words)
+        for offset in module.relocations:
+            words[offset] = Address(base + words[offset].value)
+        for offset, label in module.imports:
+            try:
+                words[offset] = symbols[label]
+            except KeyError:
+                raise LinkError(f'Unresolved label {label}')
+        program.extend(words)
+    return LinkedProgram(program, symbols)
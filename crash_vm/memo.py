@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from ._types import NativeNumber, ADDRESSES, WORD_MASK
+from .bus import Bus
+from .cpu import CPU
+from typing import Dict, List, Tuple
+
+
+class MemoizedRoutine:
+    """
+    Subroutine following the documented calling convention, declared pure by the host:
+    its returned values, accumulator and operation mode on return depend only on its arguments.
+    """
+
+    def __init__(self, address: int, args: int, returns: int, maxsize: int):
+        self.address = address
+        self.args = args
+        self.returns = returns
+        self.maxsize = maxsize
+        self.cache: 'OrderedDict[Tuple[int, ...], Tuple[Tuple[NativeNumber, ...], NativeNumber, NativeNumber]]' = \
+            OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+class _Frame:
+    __slots__ = ('routine', 'key', 'return_address', 'stack_pointer')
+
+    def __init__(self, routine: MemoizedRoutine, key: Tuple[int, ...], return_address: int, stack_pointer: int):
+        self.routine = routine
+        self.key = key
+        self.return_address = return_address
+        self.stack_pointer = stack_pointer
+
+
+class Memoizer:
+    """
+    Short-circuits calls to memoized routines.
+
+    Calling convention: caller pushes return address, then Arg[N] .. Arg[0] and jumps to the routine,
+    callee pushes Ret[N] .. Ret[0] and jumps to the return address. For functions called by `Call` the routine
+    address is the one after the number of arguments word.
+    A call is recognized when an instruction at a routine address is about to execute. On a cache hit returned values
+    are pushed and execution continues at the return address, on a miss the call runs and its results are cached
+    once the instruction at the return address is reached with all returned values pushed.
+    """
+
+    def __init__(self, cpu: CPU, fsb: Bus):
+        self._cpu = cpu
+        self._fsb = fsb
+        self.routines: Dict[int, MemoizedRoutine] = {}
+        self._frames: List[_Frame] = []
+
+    def clear(self):
+        self._frames.clear()
+        for routine in self.routines.values():
+            routine.cache.clear()
+
+    def _complete_frames(self, address: int, stack_pointer: int):
+        frames = self._frames
+        while frames:
+            frame = frames[-1]
+            routine = frame.routine
+            if address == frame.return_address and stack_pointer == frame.stack_pointer + routine.returns:
+                fsb = self._fsb
+                returned = tuple(fsb[ADDRESSES[(frame.stack_pointer + i) & WORD_MASK]]
+                                 for i in range(routine.returns))
+                routine.cache[frame.key] = (returned, self._cpu.get_accumulator(), self._cpu.get_operation_mode())
+                if len(routine.cache) > routine.maxsize:
+                    routine.cache.popitem(last=False)
+            elif stack_pointer < frame.stack_pointer - routine.args - 1:
+                # return address was popped without returning, the call was abandoned
+                pass
+            else:
+                return
+            frames.pop()
+
+    def enter(self, address: int) -> bool:
+        """
+        Called before an instruction at `address` executes, returns True if a call was short-circuited.
+        """
+        stack_pointer = self._cpu.get_stack_pointer().value
+        if self._frames:
+            self._complete_frames(address, stack_pointer)
+        routine = self.routines.get(address)
+        if routine is None:
+            return False
+
+        fsb = self._fsb
+        key = tuple(fsb[ADDRESSES[(stack_pointer - 1 - i) & WORD_MASK]].value for i in range(routine.args))
+        return_address = fsb[ADDRESSES[(stack_pointer - routine.args - 1) & WORD_MASK]].value & WORD_MASK
+        cached = routine.cache.get(key)
+        if cached is None:
+            routine.misses += 1
+            self._frames.append(_Frame(routine, key, return_address, stack_pointer))
+            return False
+
+        routine.hits += 1
+        routine.cache.move_to_end(key)
+        returned, accumulator, operation_mode = cached
+        for i, value in enumerate(returned):
+            fsb[ADDRESSES[(stack_pointer + i) & WORD_MASK]] = value
+        self._cpu.return_to(ADDRESSES[return_address], ADDRESSES[(stack_pointer + routine.returns) & WORD_MASK],
+                            accumulator, operation_mode)
+        return True
@@ -0,0 +1,161 @@
+from ._types import Address, AddressRange, NativeNumber
+from .bus import Bus, Slave
+from .cpu import CPU
+from typing import Dict, List, Optional, Sequence
+
+
+class CountingSlave(Slave):
+    """
+    Bus route counting accesses to a slave, block transfers count every transferred word.
+    """
+
+    def __init__(self, slave: Slave):
+        self.reads = 0
+        self.writes = 0
+        self._slave = slave
+        # block and exchange methods are provided only when the slave has them, as Bus checks for their presence
+        if getattr(slave, 'read_block', None) is not None:
+            self.read_block = self._read_block
+        if getattr(slave, 'write_block', None) is not None:
+            self.write_block = self._write_block
+        if getattr(slave, 'exchange', None) is not None:
+            self.exchange = self._exchange
+
+    def __getitem__(self, address: Address) -> NativeNumber:
+        self.reads += 1
+        return self._slave[address]
+
+    def __setitem__(self, address: Address, value: NativeNumber) -> None:
+        self.writes += 1
+        self._slave[address] = value
+
+    def _read_block(self, offset: int, n: int) -> List[NativeNumber]:
+        self.reads += n
+        return self._slave.read_block(offset, n)
+
+    def _write_block(self, offset: int, values: Sequence[NativeNumber]):
+        self.writes += len(values)
+        self._slave.write_block(offset, values)
+
+    def _exchange(self, address: Address, value: NativeNumber) -> NativeNumber:
+        self.reads += 1
+        self.writes += 1
+        return self._slave.exchange(address, value)
+
+
+class Metrics:
+    """
+    Runtime health of a VM.
+
+    Counters are kept by the VM and the CPU where they are cheap to maintain, VM ones are updated once per
+    executed chunk of instructions, and gathered on `collect`, so runs don't import this module until metrics
+    are read. Counting bus accesses routes every access through a counting wrapper, so it is enabled
+    separately by `count_bus_accesses`.
+    """
+
+    def __init__(self, vm, cpu: CPU, fsb: Bus, counters):
+        self._vm = vm
+        self._cpu = cpu
+        self._fsb = fsb
+        self._counters = counters
+        self._bus_counters: Optional[Dict[int, CountingSlave]] = None
+        self._bus_devices: Dict[int, str] = {}
+
+    @property
+    def throttle_events(self) -> int:
+        """
+        Cycles which took longer than the clock period.
+        """
+        return self._counters.throttle_events
+
+    @property
+    def run_seconds(self) -> float:
+        return self._counters.run_seconds
+
+    @property
+    def idle_seconds(self) -> float:
+        """
+        Time spent by the guest waiting for interrupts.
+        """
+        return self._counters.idle_seconds
+
+    @property
+    def last_run_frequency(self) -> Optional[float]:
+        """
+        Cycles per second achieved by the last run.
+        """
+        return self._counters.last_run_frequency
+
+    def reset(self):
+        self._counters.reset()
+        if self._bus_counters is not None:
+            for counter in self._bus_counters.values():
+                counter.reads = counter.writes = 0
+
+    def _counting_slave(self, address_range: AddressRange, slave: Slave) -> Slave:
+        counter = self._bus_counters.get(id(slave))
+        if counter is None:
+            counter = self._bus_counters[id(slave)] = CountingSlave(slave)
+            self._bus_devices[id(slave)] = f'{slave.__class__.__name__}@{address_range.start_value:#06x}'
+        return counter
+
+    def count_bus_accesses(self, enabled: bool = True):
+        if enabled:
+            if self._bus_counters is None:
+                self._bus_counters = {}
+                self._fsb.instrument(self._counting_slave)
+        else:
+            self._bus_counters = None
+            self._bus_devices = {}
+            self._fsb.instrument(None)
+
+    def collect(self) -> dict:
+        metrics = {
+            'instructions': self._vm.instructions,
+            'cycles': self._vm.cycles,
+            'hardware_interrupts': dict(enumerate(self._cpu.hardware_interrupts_taken)),
+            'software_interrupts': self._cpu.software_interrupts_raised,
+            'throttle_events': self.throttle_events,
+            'run_seconds': self.run_seconds,
+            'idle_seconds': self.idle_seconds,
+            'frequency': self.last_run_frequency,
+        }
+        if self._bus_counters is not None:
+            metrics['bus_accesses'] = {
+                self._bus_devices[key]: {'read': counter.reads, 'write': counter.writes}
+                for key, counter in self._bus_counters.items()}
+        return metrics
+
+    def to_prometheus(self, prefix: str = 'crash_vm') -> str:
+        """
+        Collected metrics in the Prometheus text exposition format.
+        """
+        metrics = self.collect()
+        lines = []
+
+        def family(name, kind, description, samples):
+            lines.append(f'# HELP {prefix}_{name} {description}')
+            lines.append(f'# TYPE {prefix}_{name} {kind}')
+            for labels, value in samples:
+                label_str = ','.join(f'{key}="{label}"' for key, label in labels)
+                lines.append(f'{prefix}_{name}{{{label_str}}} {value}' if labels else f'{prefix}_{name} {value}')
+
+        family('instructions_total', 'counter', 'Executed instructions.', [((), metrics['instructions'])])
+        family('cycles_total', 'counter', 'Executed micro-steps.', [((), metrics['cycles'])])
+        family('hardware_interrupts_total', 'counter', 'Entered hardware interrupt handlers.',
+               [((('level', level),), count) for level, count in metrics['hardware_interrupts'].items()])
+        family('software_interrupts_total', 'counter', 'Raised software interrupts.',
+               [((), metrics['software_interrupts'])])
+        family('throttle_events_total', 'counter', 'Cycles which took longer than the clock period.',
+               [((), metrics['throttle_events'])])
+        family('run_seconds_total', 'counter', 'Wall clock time spent running.', [((), metrics['run_seconds'])])
+        family('idle_seconds_total', 'counter', 'Wall clock time the guest spent waiting for interrupts.',
+               [((), metrics['idle_seconds'])])
+        if metrics['frequency'] is not None:
+            family('frequency_hertz', 'gauge', 'Cycles per second achieved by the last run.',
+                   [((), metrics['frequency'])])
+        if 'bus_accesses' in metrics:
+            family('bus_accesses_total', 'counter', 'Bus accesses by device.',
+                   [((('device', device), ('access', access)), count)
+                    for device, counts in metrics['bus_accesses'].items() for access, count in counts.items()])
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,66 @@
+from ._types import Address, NativeNumber, NATIVE_NUMBERS, WORD_MASK, array
+from .bus import Slave
+from .cpu import SWInterrupt
+from typing import Iterable, List, Union
+
+
+class MMU(Slave):
+    """
+    Bank switching memory management unit.
+
+    Maps a window of `window_pages` pages, `page_size` words each, onto a physical memory of `physical_pages` pages,
+    which may be much larger than the guest address space.
+    Offsets relative to the address the MMU is attached at:
+        0 .. window_pages - 1 - page select registers, register N holds the physical page mapped to window page N
+        window_pages .. len(mmu) - 1 - the window itself
+    Initially window page N is mapped to physical page N. A guest selecting a page past the physical memory
+    raises the InvalidPage software interrupt and the mapping is left unchanged.
+    """
+
+    def __init__(self, physical_pages: int, window_pages: int = 1, page_size: int = 0x100):
+        assert page_size > 0 and page_size & (page_size - 1) == 0, 'Page size must be a power of 2'
+        assert 0 < window_pages <= physical_pages, 'Invalid number of window pages'
+        self._page_size = page_size
+        self._page_shift = page_size.bit_length() - 1
+        self._page_mask = page_size - 1
+        self._physical_pages = physical_pages
+        self._window_pages = window_pages
+        self._memory = array(physical_pages * page_size)
+        self._selected = list(range(window_pages))
+        # translation cache, physical address of the first word of every window page
+        self._translation = [page << self._page_shift for page in self._selected]
+
+    def select(self, window_page: int, physical_page: int):
+        if not 0 <= physical_page < self._physical_pages:
+            raise ValueError(f'Invalid physical page {physical_page}')
+        self._selected[window_page] = physical_page
+        self._translation[window_page] = physical_page << self._page_shift
+
+    def __getitem__(self, address: Address) -> NativeNumber:
+        offset = address.value - self._window_pages
+        if offset < 0:
+            return NATIVE_NUMBERS[self._selected[address.value] & WORD_MASK]
+        return self._memory[self._translation[offset >> self._page_shift] + (offset & self._page_mask)]
+
+    def __setitem__(self, address: Address, value: NativeNumber) -> None:
+        offset = address.value - self._window_pages
+        if offset < 0:
+            physical_page = value.value & WORD_MASK
+            if physical_page >= self._physical_pages:
+                raise SWInterrupt(SWInterrupt.ReservedCodes.InvalidPage.value)
+            self.select(address.value, physical_page)
+            return
+        self._memory[self._translation[offset >> self._page_shift] + (offset & self._page_mask)] = value
+
+    def load(self, values: Iterable[Union[int, NativeNumber]], physical_address: int = 0):
+        for address, value in enumerate(values, physical_address):
+            self._memory[address] = value if isinstance(value, NativeNumber) else NativeNumber(value)
+
+    def physical(self, start: int = 0, end: int = None) -> List[NativeNumber]:
+        return self._memory[start:end]
+
+    def physical_size(self) -> int:
+        return len(self._memory)
+
+    def __len__(self):
+        return self._window_pages * (self._page_size + 1)
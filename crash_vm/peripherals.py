@@ -0,0 +1,48 @@
+from ._types import Address, NativeNumber, NATIVE_NUMBERS, WORD_MASK
+from typing import Tuple
+
+
+class ArgvPeripheral:
+    """
+    Read-only words holding program arguments.
+    """
+    deterministic = True
+
+    def __init__(self, *args: int):
+        super().__init__()
+        self._args = tuple(NATIVE_NUMBERS[arg & WORD_MASK] for arg in args)
+
+    def state(self) -> Tuple[int, ...]:
+        return tuple(arg.value for arg in self._args)
+
+    def __getitem__(self, address: Address) -> NativeNumber:
+        return self._args[address.value]
+
+    def __setitem__(self, address: Address, value: NativeNumber) -> None:
+        pass
+
+    def __len__(self):
+        return len(self._args)
+
+
+class OutputPeripheral:
+    """
+    Write-only words collecting program results.
+    """
+    deterministic = True
+
+    def __init__(self, size: int):
+        super().__init__()
+        self._cells = [NATIVE_NUMBERS[0]] * size
+
+    def values(self) -> Tuple[NativeNumber, ...]:
+        return tuple(self._cells)
+
+    def __getitem__(self, address: Address) -> NativeNumber:
+        return NATIVE_NUMBERS[0]
+
+    def __setitem__(self, address: Address, value: NativeNumber) -> None:
+        self._cells[address.value] = value
+
+    def __len__(self):
+        return len(self._cells)
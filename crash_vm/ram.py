@@ -1,6 +1,10 @@
-from ._types import Address, NativeNumber, memset, sizeof, array
+import io
+import weakref
+from ._types import Address, NativeNumber, NativeFalse, memset, sizeof, array
 from .bus import Slave
-from itertools import count
+from .dump import dump_words, write_header
+from itertools import chain
+from typing import List, MutableMapping, Optional, Sequence, TextIO, Tuple
 
 
 class RAM(Slave):
@@ -10,7 +14,8 @@ class RAM(Slave):
         self.clear()
 
     def __getitem__(self, address: Address) -> NativeNumber:
-        return NativeNumber(int(self._cells[address.value]))
+        # cells hold shared NativeNumber instances, no need to wrap them again
+        return self._cells[address.value]
 
     def __setitem__(self, address: Address, value: NativeNumber) -> None:
         assert isinstance(value, NativeNumber)
@@ -19,21 +24,163 @@ class RAM(Slave):
     def clear(self):
         memset(self._cells, 0, self._capacity * sizeof(NativeNumber))
 
+    def load(self, values: Sequence[NativeNumber], offset: int = 0):
+        assert offset + len(values) <= self._capacity
+        self._cells[offset:offset + len(values)] = values
+
+    def read_block(self, offset: int, n: int) -> List[NativeNumber]:
+        return self._cells[offset:offset + n]
+
+    def write_block(self, offset: int, values: Sequence[NativeNumber]):
+        self.load(values, offset)
+
+    def values(self) -> List[NativeNumber]:
+        return list(self._cells)
+
     def __len__(self):
         return self._capacity
 
+    def dump(self, file: TextIO, start: int = 0, end: Optional[int] = None,
+             snapshot: Optional[Sequence[NativeNumber]] = None, skip_zeros: bool = True):
+        """
+        Write contents of [start, end) to `file`, see the dump module for the format.
+        """
+        file.write(f'{self.__class__.__name__}({len(self)}x{sizeof(NativeNumber) * 8} bits)\n')
+        write_header(file)
+        dump_words(self.read_block, len(self), file, start, end, snapshot, skip_zeros)
+
     def __repr__(self):
-        line_segment_len = 4
-        line_segments_num = 16
-        header = list(map(lambda i: f'{i:0{line_segment_len}x}',
-                          range(line_segments_num))) + ['....'] * line_segments_num
-        hex_str = header + [f'{int(v) & 0xffff:0{line_segment_len}x}' for v in self._cells]
-        hex_str = [' '.join(hex_str[i:i + line_segments_num])
-                   for i in range(0, len(hex_str), line_segments_num)]
-        hex_str = '\n'.join(map(lambda t: (
-                                f'    {t[0] * line_segments_num:0{line_segment_len}x} : '
-                                if t[0] >= 0 else
-                                '    ' + ' ' * (line_segment_len + 3))
-                                + t[1],
-                                zip(count(-2), hex_str)))
-        return f'RAM({self._capacity}x{sizeof(NativeNumber) * 8} bits)\n{hex_str}'
+        output = io.StringIO()
+        self.dump(output)
+        return output.getvalue().rstrip('\n')
+
+
+class _SharedPage(list):
+    # read-only by convention and copied on write, tuples can't be weakly referenced
+    pass
+
+
+class _FrozenPage(list):
+    # private page made read-only by `PagedRAM.freeze`, copied on write as well
+    pass
+
+
+# read-only pages shared between PagedRAM instances, keyed by their content,
+# a page is forgotten once no instance uses it
+_shared_pages: MutableMapping[Tuple[NativeNumber, ...], _SharedPage] = weakref.WeakValueDictionary()
+
+
+def _share_page(page: Tuple[NativeNumber, ...]) -> _SharedPage:
+    shared = _shared_pages.get(page)
+    if shared is None:
+        shared = _shared_pages[page] = _SharedPage(page)
+    return shared
+
+
+def clear_shared_pages():
+    """
+    Forget pages kept for sharing, pages already used by PagedRAM instances stay alive until they are replaced.
+    """
+    _shared_pages.clear()
+
+
+class PagedRAM(RAM):
+    """
+    RAM allocated page by page on first write.
+
+    Untouched pages point to a read-only zero page, and pages written by `load` are shared between all
+    live instances loaded with the same content. Shared pages are read-only and copied on the first write,
+    so memory used by an instance tracks the working set of the guest.
+    """
+
+    def __init__(self, capacity: int, page_size: int = 0x100):
+        assert page_size > 0 and page_size & (page_size - 1) == 0, 'Page size must be a power of 2'
+        self._page_shift = page_size.bit_length() - 1
+        self._page_mask = page_size - 1
+        self._page_size = page_size
+        self._zero_page = _share_page((NativeFalse,) * page_size)
+        self._capacity = capacity
+        self._pages: List[Sequence[NativeNumber]] = []
+        self.clear()
+
+    def __getitem__(self, address: Address) -> NativeNumber:
+        address_value = address.value
+        return self._pages[address_value >> self._page_shift][address_value & self._page_mask]
+
+    def __setitem__(self, address: Address, value: NativeNumber) -> None:
+        assert isinstance(value, NativeNumber)
+        address_value = address.value
+        page_index = address_value >> self._page_shift
+        page = self._pages[page_index]
+        if page.__class__ is not list:
+            # copy on write
+            page = self._pages[page_index] = list(page)
+        page[address_value & self._page_mask] = value
+
+    def clear(self):
+        self._pages = [self._zero_page] * ((self._capacity + self._page_mask) >> self._page_shift)
+
+    def load(self, values: Sequence[NativeNumber], offset: int = 0):
+        assert offset + len(values) <= self._capacity
+        position = 0
+        while position < len(values):
+            address = offset + position
+            page_index = address >> self._page_shift
+            page_offset = address & self._page_mask
+            chunk_len = min(self._page_size - page_offset, len(values) - position)
+            page = list(self._pages[page_index])
+            page[page_offset:page_offset + chunk_len] = values[position:position + chunk_len]
+            self._pages[page_index] = _share_page(tuple(page))
+            position += chunk_len
+
+    def read_block(self, offset: int, n: int) -> List[NativeNumber]:
+        values = []
+        end = offset + n
+        while offset < end:
+            page_offset = offset & self._page_mask
+            chunk_len = min(self._page_size - page_offset, end - offset)
+            values.extend(self._pages[offset >> self._page_shift][page_offset:page_offset + chunk_len])
+            offset += chunk_len
+        return values
+
+    def write_block(self, offset: int, values: Sequence[NativeNumber]):
+        # unlike load, written pages are private to the instance
+        assert offset + len(values) <= self._capacity
+        position = 0
+        while position < len(values):
+            page_index = offset >> self._page_shift
+            page_offset = offset & self._page_mask
+            chunk_len = min(self._page_size - page_offset, len(values) - position)
+            page = self._pages[page_index]
+            if page.__class__ is not list:
+                page = self._pages[page_index] = list(page)
+            page[page_offset:page_offset + chunk_len] = values[position:position + chunk_len]
+            offset += chunk_len
+            position += chunk_len
+
+    def values(self) -> List[NativeNumber]:
+        return list(chain.from_iterable(self._pages))[:self._capacity]
+
+    def resident_pages(self) -> int:
+        """
+        Number of pages privately allocated by this instance.
+        """
+        return sum(1 for page in self._pages if page.__class__ is not _SharedPage)
+
+    def freeze(self) -> List[Sequence[NativeNumber]]:
+        """
+        Make pages written since the last call read-only, so they are copied on their next write, and return
+        all pages. Must not race with writes from other threads.
+        """
+        pages = self._pages
+        for index, page in enumerate(pages):
+            if page.__class__ is list:
+                pages[index] = _FrozenPage(page)
+        return list(pages)
+
+    def changed_ranges(self, frozen: Sequence[Sequence[NativeNumber]]) -> List[Tuple[int, int]]:
+        """
+        Address ranges [start, end) of pages written or loaded since `freeze` returned `frozen`.
+        """
+        return [(index << self._page_shift, min((index + 1) << self._page_shift, self._capacity))
+                for index, (page, frozen_page) in enumerate(zip(self._pages, frozen)) if page is not frozen_page]
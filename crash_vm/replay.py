@@ -0,0 +1,145 @@
+import struct
+import sys
+from ._types import Address, NativeNumber, NATIVE_NUMBERS, WORD_BITS, WORD_MASK, WORD_TYPECODE
+from .bus import Slave
+from array import array
+from typing import BinaryIO, Iterable, List, Optional, Tuple
+
+LOG_MAGIC = b'CVML'
+LOG_VERSION = 2
+# magic, version
+_LOG_PREFIX = struct.Struct('<4sH')
+# followed by bits of logged words, number of peripheral reads, number of interrupt requests
+_LOG_HEADER = struct.Struct('<BII')
+# version 1 logs hold 16 bit words, their header has no word size
+_LOG_HEADER_V1 = struct.Struct('<II')
+
+
+class ReplayError(Exception):
+    pass
+
+
+class ExecutionLog:
+    """
+    Nondeterministic inputs of a run: values returned by peripheral reads, in the order of reads,
+    and hardware interrupt requests as (instruction, level) pairs, where instruction is the number of instructions
+    executed since the recording started before the one the request was seen by.
+    """
+
+    def __init__(self, reads: Iterable[int] = (), interrupts: Iterable[Tuple[int, int]] = ()):
+        self.reads = array(WORD_TYPECODE, reads)
+        self.interrupts: List[Tuple[int, int]] = list(interrupts)
+
+    def save(self, file: BinaryIO):
+        file.write(_LOG_PREFIX.pack(LOG_MAGIC, LOG_VERSION))
+        file.write(_LOG_HEADER.pack(WORD_BITS, len(self.reads), len(self.interrupts)))
+        positions = array('Q', (position for position, _ in self.interrupts))
+        levels = array('B', (level for _, level in self.interrupts))
+        reads = array(WORD_TYPECODE, self.reads)
+        if sys.byteorder == 'big':
+            reads.byteswap()
+            positions.byteswap()
+        file.write(reads.tobytes())
+        file.write(positions.tobytes())
+        file.write(levels.tobytes())
+
+    @classmethod
+    def load(cls, file: BinaryIO) -> 'ExecutionLog':
+        prefix = file.read(_LOG_PREFIX.size)
+        if len(prefix) < _LOG_PREFIX.size:
+            raise ValueError('Invalid execution log')
+        magic, version = _LOG_PREFIX.unpack(prefix)
+        if magic != LOG_MAGIC or version not in (1, LOG_VERSION):
+            raise ValueError(f'Unsupported execution log {magic!r} version {version}')
+        header = _LOG_HEADER if version == LOG_VERSION else _LOG_HEADER_V1
+        data = file.read(header.size)
+        if len(data) < header.size:
+            raise ValueError('Invalid execution log')
+        if version == LOG_VERSION:
+            word_bits, reads_num, interrupts_num = header.unpack(data)
+        else:
+            word_bits = 16
+            reads_num, interrupts_num = header.unpack(data)
+        if word_bits != WORD_BITS:
+            raise ValueError(f'Execution log holds {word_bits} bit words')
+        reads = array(WORD_TYPECODE)
+        positions = array('Q')
+        levels = array('B')
+        try:
+            reads.fromfile(file, reads_num)
+            positions.fromfile(file, interrupts_num)
+            levels.fromfile(file, interrupts_num)
+        except EOFError:
+            raise ValueError('Truncated execution log')
+        if sys.byteorder == 'big':
+            reads.byteswap()
+            positions.byteswap()
+        return cls(reads, zip(positions, levels))
+
+
+class RecordingSlave(Slave):
+    """
+    Passes accesses through to a peripheral, logging values it returns.
+    """
+
+    def __init__(self, slave: Slave, log: ExecutionLog):
+        self._slave = slave
+        self._reads = log.reads
+
+    def __getitem__(self, address: Address) -> NativeNumber:
+        value = self._slave[address]
+        self._reads.append(value.value & WORD_MASK)
+        return value
+
+    def __setitem__(self, address: Address, value: NativeNumber) -> None:
+        self._slave[address] = value
+
+
+class ReplaySlave(Slave):
+    """
+    Stands in for a peripheral during replay, reads return logged values and writes are dropped.
+    """
+
+    def __init__(self, feed: 'ReplayFeed'):
+        self._feed = feed
+
+    def __getitem__(self, address: Address) -> NativeNumber:
+        return self._feed.next_read()
+
+    def __setitem__(self, address: Address, value: NativeNumber) -> None:
+        pass
+
+
+class ReplayFeed:
+    def __init__(self, log: ExecutionLog, base_instructions: int):
+        self._reads = log.reads
+        self._read_position = 0
+        # absolute instruction counts, sorted as recorded
+        self._interrupts = [(base_instructions + position, level) for position, level in log.interrupts]
+        self._interrupt_position = 0
+
+    def next_read(self) -> NativeNumber:
+        if self._read_position >= len(self._reads):
+            raise ReplayError('Guest read more peripheral values than recorded')
+        value = self._reads[self._read_position]
+        self._read_position += 1
+        return NATIVE_NUMBERS[value]
+
+    def due_interrupts(self, instructions: int) -> List[int]:
+        """
+        Levels of interrupts to request before the instruction with the given count starts.
+        """
+        levels = []
+        while self._interrupt_position < len(self._interrupts) and \
+                self._interrupts[self._interrupt_position][0] <= instructions:
+            levels.append(self._interrupts[self._interrupt_position][1])
+            self._interrupt_position += 1
+        return levels
+
+    def next_interrupt(self) -> Optional[int]:
+        """
+        Instruction count of the next logged interrupt request.
+        """
+        if self._interrupt_position < len(self._interrupts):
+            return self._interrupts[self._interrupt_position][0]
+        return None
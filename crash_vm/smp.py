@@ -0,0 +1,211 @@
+"""
+Shared memory multi-core machine.
+
+Every core is a CPU of its own VM running in a separate process, cores share RAM backed by
+`multiprocessing.shared_memory`, so parallel guest code scales across host cores.
+All cores start executing at address 0 and tell themselves apart by the core registers attached right after RAM:
+    0 - read: index of the core, write: send an inter-processor interrupt to the core with the written index
+    1 - read: number of cores
+Inter-processor interrupts are delivered through `VM.irq` at IPI_IRQ_LEVEL. The `Xchg` instruction swaps
+the accumulator with a RAM word atomically against writes of all cores, and is enough to build locks.
+"""
+import multiprocessing
+import os
+import queue
+import time
+from array import array as typed_array
+from multiprocessing import shared_memory
+from ._types import Address, NativeNumber, NATIVE_NUMBERS, WORD_MASK, WORD_TYPECODE, sizeof
+from .bus import Slave
+from .cpu import SWInterrupt
+from .ram import RAM
+from .vm import VM, Engine, RunStatus
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+# hardware interrupt level raised by inter-processor interrupts
+IPI_IRQ_LEVEL = 1
+# instructions a core executes between checks for inter-processor interrupts and stop requests
+IPI_POLL_PERIOD = 256
+# seconds between checks for core processes exited without reporting a result
+RESULT_POLL_INTERVAL = 0.1
+
+
+class SharedRAM(RAM):
+    """
+    RAM backed by a shared memory block, the same memory is used in every process the instance is passed to.
+    Writes are serialized by a lock shared between processes, so `exchange` is atomic against all writes.
+    The block is unlinked when it is closed by the process that created it.
+    """
+
+    def __init__(self, capacity: int, lock=None):
+        self._capacity = capacity
+        self._lock = multiprocessing.Lock() if lock is None else lock
+        self._shm = shared_memory.SharedMemory(create=True, size=max(capacity, 1) * sizeof(NativeNumber))
+        self._owner_pid = os.getpid()
+        self._cells = self._shm.buf.cast(WORD_TYPECODE)
+        self.clear()
+
+    def __getstate__(self):
+        return self._capacity, self._shm.name, self._lock, self._owner_pid
+
+    def __setstate__(self, state):
+        self._capacity, name, self._lock, self._owner_pid = state
+        self._shm = shared_memory.SharedMemory(name=name)
+        self._cells = self._shm.buf.cast(WORD_TYPECODE)
+
+    def __getitem__(self, address: Address) -> NativeNumber:
+        return NATIVE_NUMBERS[self._cells[address.value]]
+
+    def __setitem__(self, address: Address, value: NativeNumber) -> None:
+        assert isinstance(value, NativeNumber)
+        with self._lock:
+            self._cells[address.value] = value.value & WORD_MASK
+
+    def exchange(self, address: Address, value: NativeNumber) -> NativeNumber:
+        with self._lock:
+            previous = self._cells[address.value]
+            self._cells[address.value] = value.value & WORD_MASK
+        return NATIVE_NUMBERS[previous]
+
+    def clear(self):
+        with self._lock:
+            size = self._capacity * sizeof(NativeNumber)
+            self._shm.buf[:size] = bytes(size)
+
+    def load(self, values: Sequence[NativeNumber], offset: int = 0):
+        assert offset + len(values) <= self._capacity
+        words = typed_array(WORD_TYPECODE, [value.value & WORD_MASK for value in values])
+        with self._lock:
+            self._cells[offset:offset + len(values)] = words
+
+    def read_block(self, offset: int, n: int) -> List[NativeNumber]:
+        return [NATIVE_NUMBERS[value] for value in self._cells[offset:offset + n].tolist()]
+
+    def values(self) -> List[NativeNumber]:
+        return [NATIVE_NUMBERS[value] for value in self._cells.tolist()]
+
+    def close(self):
+        self._cells.release()
+        self._shm.close()
+        if os.getpid() == self._owner_pid:
+            self._shm.unlink()
+
+
+class CoreRegisters(Slave):
+    def __init__(self, core: int, ipi_requests):
+        self._core = core
+        self._ipi_requests = ipi_requests
+
+    def __getitem__(self, address: Address) -> NativeNumber:
+        if address.value == 0:
+            return NATIVE_NUMBERS[self._core]
+        return NATIVE_NUMBERS[len(self._ipi_requests)]
+
+    def __setitem__(self, address: Address, value: NativeNumber) -> None:
+        if address.value == 0 and 0 <= value.value < len(self._ipi_requests):
+            self._ipi_requests[value.value] = 1
+
+    def __len__(self):
+        return 2
+
+
+class CoreResult(NamedTuple):
+    core: int
+    status: Optional[RunStatus]  # None if the core was stopped by an unhandled software interrupt
+    interrupt: Optional[int]  # code of the unhandled software interrupt
+    registers: Dict[str, int]
+    cycles: int
+    instructions: int
+
+
+def _run_core(core: int, ram: SharedRAM, ipi_requests, stop, results, engine: Engine,
+              max_cycles: Optional[int], deadline: Optional[float]):
+    registers = CoreRegisters(core, ipi_requests)
+    vm = VM(peripherals=[(len(registers), registers)], ram=ram)
+    status = interrupt = None
+    try:
+        while True:
+            if ipi_requests[core]:
+                ipi_requests[core] = 0
+                vm.irq(IPI_IRQ_LEVEL)
+            status = vm.run(engine=engine, max_instructions=IPI_POLL_PERIOD,
+                            max_cycles=None if max_cycles is None else max_cycles - vm.cycles, deadline=deadline)
+            if status is not RunStatus.BudgetExhausted:
+                break
+            if (max_cycles is not None and vm.cycles >= max_cycles) or \
+                    (deadline is not None and time.monotonic() >= deadline):
+                break
+            if stop.is_set():
+                status = RunStatus.Interrupted
+                break
+    except SWInterrupt as swi:
+        interrupt = swi.code
+        # the rest of the guest may wait for this core forever
+        stop.set()
+    finally:
+        results.put(CoreResult(core, status, interrupt, vm.registers(), vm.cycles, vm.instructions))
+        ram.close()
+
+
+class MultiCoreVM:
+    """
+    Machine with `cores` CPUs sharing `ram_size` words of RAM, see the module documentation for the guest interface.
+    """
+
+    def __init__(self, cores: int = 2, ram_size: int = 256):
+        assert cores > 0, 'At least one core is required'
+        self._context = multiprocessing.get_context()
+        self._cores = cores
+        self._ram = SharedRAM(ram_size, self._context.Lock())
+        self._ipi_requests = self._context.RawArray('B', cores)
+
+    def load_program(self, program):
+        assert len(program) <= len(self._ram)
+        self._ram.load(VM._native_words(program))
+
+    def run(self, engine=Engine.Cycle, max_cycles: int = None, timeout: float = None) -> List[CoreResult]:
+        """
+        Run all cores until each of them halts or exhausts its budget, `max_cycles` is counted per core.
+        A core stopped by an unhandled software interrupt stops the others with RunStatus.Interrupted.
+        Returns results ordered by core index.
+        """
+        engine = Engine(engine)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        stop = self._context.Event()
+        results = self._context.Queue()
+        processes = [self._context.Process(target=_run_core, daemon=True,
+                                           args=(core, self._ram, self._ipi_requests, stop, results, engine,
+                                                 max_cycles, deadline))
+                     for core in range(self._cores)]
+        for process in processes:
+            process.start()
+        collected: Dict[int, CoreResult] = {}
+        try:
+            while len(collected) < len(processes):
+                try:
+                    result = results.get(timeout=RESULT_POLL_INTERVAL)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes) and results.empty():
+                        raise RuntimeError('Core process exited without reporting a result')
+                    continue
+                collected[result.core] = result
+        finally:
+            stop.set()
+            for process in processes:
+                process.join()
+        return [collected[core] for core in range(self._cores)]
+
+    def close(self):
+        self._ram.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __getitem__(self, item: Address) -> NativeNumber:
+        return self._ram[item]
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self._cores} cores)\n\n{self._ram!r}'
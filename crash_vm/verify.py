@@ -0,0 +1,207 @@
+"""
+Load time verification of programs, enabling the verified dispatch of `CPU.verified_cycle`.
+
+Code reachable from address 0 is followed through static jump and call targets, addresses after conditional
+jumps, calls and software interrupts, and handlers in interrupt tables installed with static addresses.
+Operation mode flags are tracked along the way, so arguments known to be addresses are checked statically.
+A program passes when its reachable code:
+    - consists of valid opcodes with their argument words inside RAM
+    - accesses only mapped addresses through static arguments
+    - doesn't store into its own instruction words through static arguments
+Instructions at verified addresses are decoded once, `CPU.verified_cycle` runs them without fetching and checking
+opcodes. Code reached only through computed jumps, e.g. return addresses, is interpreted by `CPU.cycle` as usual.
+Writes through computed addresses can't be checked at load time, `CodeGuard` catches the ones hitting verified code
+and the VM falls back to the checked dispatch.
+"""
+from .bus import Slave
+from .cpu import Instructions, InstructionArgTypes, OMFlags, SWInterrupt, instruction_methods
+from .image import ProgramWord, to_words
+from ._types import Address, NativeNumber, ADDRESSES
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+_INSTRUCTIONS = {instruction.value: instruction for instruction in instruction_methods}
+_ARG_TYPES = {instruction.value: arg_type for instruction, (_, arg_type) in instruction_methods.items()}
+
+# operation mode known at an address, a flag is None when it depends on the path
+_Mode = Tuple[Optional[int], Optional[int], Optional[int]]
+_RESET_MODE: _Mode = (0, 0, 0)
+_UNKNOWN_MODE: _Mode = (None, None, None)
+_MODE_INSTRUCTIONS = {
+    Instructions.A0A: (OMFlags.A0Type.value, 0),
+    Instructions.A0L: (OMFlags.A0Type.value, 1),
+    Instructions.A0V: (OMFlags.A0ValueType.value, 0),
+    Instructions.A0P: (OMFlags.A0ValueType.value, 1),
+    Instructions.A0R: (OMFlags.A0AddressingMode.value, 0),
+    Instructions.A0S: (OMFlags.A0AddressingMode.value, 1),
+}
+_STORES = {Instructions.St, Instructions.Xchg}
+# instructions reading three descriptor words at their argument address
+_BLOCK_TRANSFERS = {Instructions.Mcpy, Instructions.Mset}
+_TERMINATORS = {Instructions.Jmp, Instructions.Ret, Instructions.IHR}
+
+
+class VerificationError(ValueError):
+    def __init__(self, address: int, message: str):
+        super().__init__(f'{address:#06x}: {message}')
+        self.address = address
+
+
+class VerifiedProgram(NamedTuple):
+    instructions: Dict[int, Tuple[int, int]]  # address -> opcode, argument word (0 without argument)
+    code: Set[int]  # addresses of opcode and argument words
+
+
+def _join(first: _Mode, second: _Mode) -> _Mode:
+    return tuple(a if a == b else None for a, b in zip(first, second))
+
+
+def verify(ram: Sequence[ProgramWord], memory_size: int,
+           irq_levels: int = 4, sw_interrupts: int = 32) -> VerifiedProgram:
+    """
+    Verify the program in RAM contents `ram`, starting at address 0, with `memory_size` words mapped on the bus.
+    Raises VerificationError for the first violation found.
+    """
+    words = to_words(ram)
+    ram_size = len(words)
+
+    def check_address(site: int, address: int):
+        if address >= memory_size:
+            raise VerificationError(site, f'argument {address:#06x} is not mapped')
+
+    modes: Dict[int, _Mode] = {}
+    pending: List[Tuple[int, _Mode]] = [(0, _RESET_MODE)]
+    instructions: Dict[int, Tuple[int, int]] = {}
+    stores: List[Tuple[int, int]] = []  # site, static address
+    handler_tables: Set[Tuple[int, bool]] = set()  # table address, whether it is for hardware interrupts
+    raised_codes: Set[int] = set()
+    handlers: Set[int] = set()
+
+    def follow(address: int, mode: _Mode):
+        pending.append((address, mode))
+
+    while True:
+        while pending:
+            address, mode = pending.pop()
+            known = modes.get(address)
+            if known is not None:
+                joined = _join(known, mode)
+                if joined == known:
+                    continue
+                mode = joined
+            modes[address] = mode
+            if address >= ram_size:
+                raise VerificationError(address, 'code outside RAM')
+            opcode = words[address]
+            instruction = _INSTRUCTIONS.get(opcode)
+            if instruction is None:
+                raise VerificationError(address, f'invalid opcode {opcode:#06x}')
+            arg_type = _ARG_TYPES[opcode]
+            argument = 0
+            next_address = address + 1
+            if arg_type is not InstructionArgTypes.NoArg:
+                if next_address >= ram_size:
+                    raise VerificationError(address, 'argument outside RAM')
+                argument = words[next_address]
+                next_address += 1
+            instructions[address] = (opcode, argument)
+
+            literal, pointer, stack = mode
+            # the address an AddressArg argument resolves to, None when computed at run time
+            target = None
+            if arg_type is InstructionArgTypes.ValueAddressArg:
+                if literal == 0 and stack == 0:
+                    check_address(address, argument)
+                elif literal == 1 and pointer == 1:
+                    check_address(address, argument)
+            elif arg_type is InstructionArgTypes.AddressArg and stack == 0:
+                if pointer == 0:
+                    target = argument
+                elif pointer == 1:
+                    check_address(address, argument)
+
+            if instruction in _MODE_INSTRUCTIONS:
+                flag, value = _MODE_INSTRUCTIONS[instruction]
+                mode = tuple(value if i == flag else known_flag for i, known_flag in enumerate(mode))
+            elif instruction in _STORES:
+                if target is not None:
+                    check_address(address, target)
+                    stores.append((address, target))
+            elif instruction in _BLOCK_TRANSFERS:
+                if target is not None:
+                    check_address(address, target + 2)
+            elif instruction in (Instructions.Jmp, Instructions.Jif):
+                if target is not None:
+                    follow(target, mode)
+            elif instruction is Instructions.Call:
+                if target is not None:
+                    check_address(address, target)
+                    follow(target + 1, mode)
+                # the callee may leave any operation mode
+                follow(next_address, _UNKNOWN_MODE)
+                continue
+            elif instruction is Instructions.HIH and target is not None:
+                handler_tables.add((target, True))
+            elif instruction is Instructions.SIH and target is not None:
+                handler_tables.add((target, False))
+            elif instruction is Instructions.Int:
+                if argument == 0:
+                    # halts, code after it is not followed
+                    continue
+                raised_codes.add(argument)
+            elif instruction in (Instructions.Div, Instructions.Mod):
+                raised_codes.add(SWInterrupt.ReservedCodes.DivisionByZero.value)
+            if instruction not in _TERMINATORS:
+                follow(next_address, mode)
+
+        # handlers run in the operation mode of the interrupted code
+        for table, hardware in handler_tables:
+            # software interrupt handlers are followed for codes raised by the program, or by its divisions, only
+            for entry in range(irq_levels) if hardware else sorted(raised_codes):
+                if entry >= (irq_levels if hardware else sw_interrupts) or table + entry >= ram_size:
+                    continue
+                handler = words[table + entry]
+                if handler and handler not in handlers:
+                    handlers.add(handler)
+                    follow(handler, _UNKNOWN_MODE)
+        if not pending:
+            break
+
+    code = set()
+    for address, (opcode, _) in instructions.items():
+        code.add(address)
+        if _ARG_TYPES[opcode] is not InstructionArgTypes.NoArg:
+            code.add(address + 1)
+    for site, target in stores:
+        if target in code:
+            raise VerificationError(site, f'stores into code at {target:#06x}')
+    return VerifiedProgram(instructions, code)
+
+
+class CodeGuard(Slave):
+    """
+    Overlaid on RAM over the span of verified code, calls `on_code_write` before a verified word is overwritten.
+    """
+
+    def __init__(self, ram: Slave, start: int, code: Set[int], on_code_write: Callable[[], None]):
+        self._ram = ram
+        self._start = start
+        self._code = code
+        self._on_code_write = on_code_write
+
+    def __getitem__(self, address: Address) -> NativeNumber:
+        return self._ram[ADDRESSES[address.value + self._start]]
+
+    def __setitem__(self, address: Address, value: NativeNumber) -> None:
+        address_value = address.value + self._start
+        if address_value in self._code:
+            self._on_code_write()
+        self._ram[ADDRESSES[address_value]] = value
+
+    def read_block(self, offset: int, n: int) -> List[NativeNumber]:
+        return self._ram.read_block(offset + self._start, n)
+
+    def write_block(self, offset: int, values: Sequence[NativeNumber]) -> None:
+        start = offset + self._start
+        if any(address in self._code for address in range(start, start + len(values))):
+            self._on_code_write()
+        self._ram.write_block(start, values)
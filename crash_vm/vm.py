@@ -1,83 +1,787 @@
-import time
 import sys
-from ._types import NativeNumber, Address, AddressRange
+import time
+from ._types import NativeNumber, Address, AddressRange, WORD_BITS, WORD_MASK
 from .cpu import CPU, SWInterrupt
-from .ram import RAM
-from .bus import Bus
-from itertools import count
+from .ram import RAM, PagedRAM
+from .bus import Bus, Slave
 from enum import Enum
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, TextIO, Tuple
+
+# debugging, memoization, metrics, record and replay, checkpoints and verification are imported on first use,
+# so running a program only pays for the interpreter
+if TYPE_CHECKING:
+    from .checkpoint import Checkpointer, CheckpointState
+    from .debug import WatchedSlave, WatchpointHit, WatchpointCallback
+    from .memo import Memoizer, MemoizedRoutine
+    from .metrics import Metrics
+    from .replay import ExecutionLog, ReplayFeed
+    from .verify import CodeGuard, VerifiedProgram
+
+
+class Engine(Enum):
+    Cycle = 'cycle'  # micro-step granular, supports frequency
+    Fast = 'fast'  # instruction granular
+
+
+class RunStatus(Enum):
+    Halted = 'halted'
+    BudgetExhausted = 'budget_exhausted'
+    Interrupted = 'interrupted'
+    Breakpoint = 'breakpoint'
+    Watchpoint = 'watchpoint'
+
+
+class DebugStop(Exception):
+    def __init__(self, status: RunStatus):
+        super().__init__()
+        self.status = status
+
+
+class _RunCounters:
+    """
+    Run statistics kept in plain fields by the VM, reported by `Metrics`.
+    """
+    __slots__ = ('throttle_events', 'run_seconds', 'idle_seconds', 'last_run_frequency')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.throttle_events = 0  # cycles which took longer than the clock period
+        self.run_seconds = 0.0
+        self.idle_seconds = 0.0  # spent by the guest waiting for interrupts
+        self.last_run_frequency: Optional[float] = None  # cycles per second achieved by the last run
+
+    def record_run(self, cycles: int, seconds: float):
+        self.run_seconds += seconds
+        if seconds > 0:
+            self.last_run_frequency = cycles / seconds
 
 
 class VM:
-    def __init__(self, ram_size=256, peripherals=()):
+    # instructions executed between budget and clock interrupt checks
+    BUDGET_CHECK_PERIOD = 1024
+
+    def __init__(self, ram_size=256, peripherals=(), ram_page_size=None, ram: Optional[RAM] = None):
         self._fsb = Bus()
-        self._ram = RAM(ram_size)
+        self._owns_ram = ram is None
+        if ram is not None:
+            # externally owned RAM, e.g. shared with other VMs
+            self._ram = ram
+            ram_size = len(ram)
+        else:
+            # paged RAM allocates memory on first write and shares program pages between VMs
+            self._ram = RAM(ram_size) if ram_page_size is None else PagedRAM(ram_size, ram_page_size)
         self._fsb.attach(AddressRange(0, ram_size), self._ram)
         next_pool_address = ram_size
+        self._peripherals = []
         for pool_size, peripheral in peripherals:
             self._fsb.attach(AddressRange(next_pool_address, next_pool_address + pool_size), peripheral)
+            self._peripherals.append(peripheral)
             next_pool_address += pool_size
+        self._memory_size = next_pool_address
         self._cpu = CPU(self._fsb)
+        self._cpu.idle_handler = self._idle
+        self._run_deadline: Optional[float] = None
         self._clock_interrupt_ts = int(time.time())
+        self._cycle_iter = None  # instruction in flight
+        self._stop_requested = False
+        self._breakpoints = set()
+        self._breakpoint_resume_address = None
+        self._watchpoints: Dict[int, 'WatchedSlave'] = {}
+        self._watchpoint_stop_pending = False
+        self.watchpoint_hits: List['WatchpointHit'] = []
+        self._memoizer: Optional['Memoizer'] = None
+        # set while the loaded program runs with the verified dispatch
+        self.verified_program: Optional['VerifiedProgram'] = None
+        self._code_guard: Optional['CodeGuard'] = None
+        self._cpu_cycle = self._cpu.cycle
+        # instruction generators source, instrumented only while breakpoints or memoized routines are installed
+        self._next_instruction = self._cpu_cycle
+        self.cycles = 0
+        self.instructions = 0
+        self._counters = _RunCounters()
+        self._metrics: Optional['Metrics'] = None
+        self._recording: Optional['ExecutionLog'] = None
+        self._recording_base = 0
+        self._replay: Optional['ReplayFeed'] = None
+        self._stand_ins: List[Tuple[Slave, Slave]] = []  # (peripheral, slave attached in its place)
+        self._checkpointer: Optional['Checkpointer'] = None
+        # paged RAM owned by the VM at the last checkpoint, its changed pages are not copies of these anymore
+        self._checkpoint_pages: Optional[List[Sequence[NativeNumber]]] = None
+        self._auto_checkpoint_path: Optional[str] = None
+        self._auto_checkpoint_cycles = 0
+        self._next_auto_checkpoint = 0
+
+    @property
+    def metrics(self) -> 'Metrics':
+        if self._metrics is None:
+            from .metrics import Metrics
+            self._metrics = Metrics(self, self._cpu, self._fsb, self._counters)
+        return self._metrics
 
     def _breakpoint(self):
         print(self)
 
-    def _cycle(self, cycle_iter):
+    def _software_interrupt(self, interrupt: SWInterrupt):
+        if interrupt.code == SWInterrupt.ReservedCodes.Breakpoint.value:
+            self._breakpoint()
+        else:
+            raise interrupt
+
+    def _clock(self):
+        if self._replay is not None:
+            # replayed runs get clock interrupts from the log
+            return
+        ts = int(time.time())
+        if ts > self._clock_interrupt_ts:
+            self._clock_interrupt_ts = ts
+            self.irq(self._cpu.get_irq_levels() - 1)
+
+    def _idle(self):
+        # the guest waits for an interrupt, sleep until one is posted, the clock ticks, the run is stopped
+        # or reaches its deadline
+        if self._recording is not None or self._replay is not None:
+            # interrupts are logged and replayed between chunks of instructions, the guest spins on Wait instead
+            return
+        start_ts = time.perf_counter()
+        deadline = self._run_deadline
+        try:
+            while not self._stop_requested:
+                timeout = self._clock_interrupt_ts + 1 - time.time()
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    timeout = min(timeout, remaining)
+                if self._cpu.wait_for_interrupt(max(timeout, 0)):
+                    return
+                self._clock()
+                if self._cpu.interrupt_pending():
+                    return
+        finally:
+            self._counters.idle_seconds += time.perf_counter() - start_ts
+
+    def _run_cycle_engine(self, instructions: int, cycles_stop: float, period_ns: int):
+        cpu_cycle = self._next_instruction
+        cycles = self.cycles
+        executed = 0
+        cycle_iter = self._cycle_iter
+        throttle_events = 0
+        # an instruction stopped by a watchpoint ends the chunk
+        watched = bool(self._watchpoints)
+        step_ts_ns = time.perf_counter_ns()
         try:
-            try:
-                next(cycle_iter)
-            except StopIteration:
-                ts = int(time.time())
-                if ts > self._clock_interrupt_ts:
-                    self._clock_interrupt_ts = ts
-                    self._cpu.irq(self._cpu.get_irq_levels() - 1)
-                cycle_iter = self._cpu.cycle()
+            while executed < instructions:
+                if cycle_iter is None:
+                    cycle_iter = cpu_cycle()
+                try:
+                    for _ in cycle_iter:
+                        cycles += 1
+                        if period_ns:
+                            cycle_overtime_ns = period_ns - (time.perf_counter_ns() - step_ts_ns)
+                            if cycle_overtime_ns >= 0:
+                                time.sleep(cycle_overtime_ns * 0.000000001)
+                            else:
+                                throttle_events += 1
+                            step_ts_ns = time.perf_counter_ns()
+                        if cycles >= cycles_stop:
+                            # the instruction in flight is resumed by the next run
+                            return
+                except SWInterrupt as interrupt:
+                    self._software_interrupt(interrupt)
+                cycle_iter = None
+                executed += 1
+                if watched and self._watchpoint_stop_pending:
+                    return
+        finally:
+            self.cycles = cycles
+            self.instructions += executed
+            self._cycle_iter = cycle_iter
+            self._counters.throttle_events += throttle_events
+
+    def _run_fast_engine(self, instructions: int, cycles_stop: float):
+        cpu_cycle = self._next_instruction
+        cycles = self.cycles
+        executed = 0
+        cycle_iter = self._cycle_iter
+        watched = bool(self._watchpoints)
+        try:
+            while executed < instructions and cycles < cycles_stop:
+                if cycle_iter is None:
+                    cycle_iter = cpu_cycle()
+                try:
+                    # drain the whole instruction, no per micro-step bookkeeping
+                    for _ in cycle_iter:
+                        cycles += 1
+                except SWInterrupt as interrupt:
+                    self._software_interrupt(interrupt)
+                cycle_iter = None
+                executed += 1
+                if watched and self._watchpoint_stop_pending:
+                    return
+        finally:
+            self.cycles = cycles
+            self.instructions += executed
+            self._cycle_iter = cycle_iter
+
+    def run(self, frequency=None, engine=Engine.Cycle,
+            max_cycles: int = None, max_instructions: int = None, deadline: float = None) -> RunStatus:
+        """
+        Run until the program halts, a budget is exhausted or `stop` is called.
+
+        Budgets are counted from the start of the call, `deadline` is a `time.monotonic` timestamp.
+        Deadline, `stop` requests and the clock interrupt are checked every BUDGET_CHECK_PERIOD
+        instructions (every instruction when `frequency` is set). The fast engine checks `max_cycles` at instruction
+        boundaries, so it may be exceeded by the rest of the last instruction.
+        An instruction left in flight by the cycle budget is resumed by the next run.
+        """
+        engine = Engine(engine)
+        if engine is Engine.Fast and frequency is not None:
+            raise ValueError(f'{engine} engine does not support frequency')
+        cycles_stop = float('inf') if max_cycles is None else self.cycles + max_cycles
+        instructions_stop = float('inf') if max_instructions is None else self.instructions + max_instructions
+        check_period = self.BUDGET_CHECK_PERIOD if frequency is None else 1
+        period_ns = 0 if frequency is None else int(1000000000.0 / frequency)
+        self._stop_requested = False
+        self._watchpoint_stop_pending = False
+        self._run_deadline = deadline
+        start_cycles = self.cycles
+        start_ts = time.perf_counter()
+        try:
+            while True:
+                if self._stop_requested:
+                    return RunStatus.Interrupted
+                if self._watchpoint_stop_pending:
+                    self._watchpoint_stop_pending = False
+                    return RunStatus.Watchpoint
+                if not self._cpu.drain_posted_interrupts:
+                    self._request_posted_interrupts()
+                instructions = min(check_period, instructions_stop - self.instructions)
+                if instructions <= 0 or self.cycles >= cycles_stop or \
+                        (deadline is not None and time.monotonic() >= deadline):
+                    return RunStatus.BudgetExhausted
+                if self._replay is not None:
+                    instructions = self._replay_interrupts(instructions)
+                if engine is Engine.Fast:
+                    self._run_fast_engine(instructions, cycles_stop)
+                else:
+                    self._run_cycle_engine(instructions, cycles_stop, period_ns)
+                self._clock()
+                if self._auto_checkpoint_path is not None and self.cycles >= self._next_auto_checkpoint and \
+                        self._cycle_iter is None:
+                    self._auto_checkpoint()
         except SWInterrupt as interrupt:
-            if interrupt.code == SWInterrupt.ReservedCodes.Breakpoint.value:
-                self._breakpoint()
+            # interrupted instruction can't be resumed
+            self._cycle_iter = None
+            if interrupt.code == SWInterrupt.ReservedCodes.Halt.value:
+                return RunStatus.Halted
             else:
                 raise interrupt
-        return cycle_iter
+        except DebugStop as stop:
+            return stop.status
+        except KeyboardInterrupt:
+            return RunStatus.Interrupted
+        finally:
+            self._counters.record_run(self.cycles - start_cycles, time.perf_counter() - start_ts)
 
-    def run(self, frequency=None):
-        self._clock_interrupt_ts = int(time.time())
+    def run_translated(self, module, max_instructions: int = None, deadline: float = None) -> RunStatus:
+        """
+        Run a module produced by `aot.translate` from the program loaded in RAM.
+        Addresses without a translated block and pending or posted hardware interrupts are handled
+        by the interpreter, instruction and cycle counts are kept as if the program was interpreted.
+        Budgets, `stop` requests, the deadline and the clock interrupt are checked between blocks.
+        Writes into the translated code switch the rest of the run to the interpreter, a block storing into
+        its own code completes as translated. Blocks bypass breakpoints, watchpoints, memoized routines
+        and record and replay, while any of them is active the program is run by `run` with the fast engine.
+        """
+        if getattr(module, 'WORD_BITS', 16) != WORD_BITS:
+            raise ValueError(f'Module is translated for {module.WORD_BITS} bit words')
+        for address, words in module.CODE:
+            if address + len(words) > len(self._ram) or \
+                    [value.value & WORD_MASK for value in self._ram.read_block(address, len(words))] != list(words):
+                raise ValueError(f'Code at {address:#06x} differs from the translated program')
+        if self.instrumented():
+            return self.run(engine=Engine.Fast, max_instructions=max_instructions, deadline=deadline)
+        from .verify import CodeGuard
+        blocks = dict(module.BLOCKS)
+        code = {address for start, words in module.CODE for address in range(start, start + len(words))}
+        if self.verified_program is not None:
+            # the guard is served before the one of verified code, so it covers both
+            code |= self.verified_program.code
+
+        def on_code_write():
+            blocks.clear()
+            if self.verified_program is not None:
+                self._forget_verified()
+
+        code_start = min(code, default=0)
+        code_guard = CodeGuard(self._ram, code_start, code, on_code_write)
+        if code:
+            self._fsb.overlay(AddressRange(code_start, max(code) + 1), code_guard)
+        cpu = self._cpu
+        fsb = self._fsb
+        instructions_stop = float('inf') if max_instructions is None else self.instructions + max_instructions
+        self._stop_requested = False
+        self._run_deadline = deadline
+        start_cycles = self.cycles
+        start_ts = time.perf_counter()
         try:
-            if frequency is None:
-                cycle_iter = self._cpu.cycle()
-                while True:
-                    cycle_iter = self._cycle(cycle_iter)
-            else:
-                period_ns = int(1000000000.0 / frequency)
-                cycle_iter = self._cpu.cycle()
-                while True:
-                    cycle_start_ts_ns = time.perf_counter_ns()
-                    cycle_iter = self._cycle(cycle_iter)
-                    cycle_overtime_ns = period_ns - (time.perf_counter_ns() - cycle_start_ts_ns)
-                    if cycle_overtime_ns >= 0:
-                        time.sleep(cycle_overtime_ns * 0.000000001)
+            if self._cycle_iter is not None:
+                self._run_fast_engine(1, float('inf'))
+            while True:
+                if self._stop_requested:
+                    return RunStatus.Interrupted
+                if self.instructions >= instructions_stop or \
+                        (deadline is not None and time.monotonic() >= deadline):
+                    return RunStatus.BudgetExhausted
+                for _ in range(self.BUDGET_CHECK_PERIOD):
+                    block = blocks.get(cpu.get_instruction_address().value)
+                    # posted and requested interrupts are served by the interpreter before the next instruction,
+                    # a block returns no instructions when entered in an operation mode it is not specialized for
+                    instructions, cycles = (0, 0) if block is None or cpu.interrupts_posted() or \
+                        cpu.interrupt_pending() else block(cpu, fsb)
+                    if instructions:
+                        self.instructions += instructions
+                        self.cycles += cycles
                     else:
-                        print(self._cpu, 'throttling to', 1000000000.0 / (period_ns - cycle_overtime_ns), 'Hz',
-                              file=sys.stderr)
+                        self._run_fast_engine(1, float('inf'))
+                    if self.instructions >= instructions_stop:
+                        break
+                self._clock()
         except SWInterrupt as interrupt:
             if interrupt.code == SWInterrupt.ReservedCodes.Halt.value:
-                pass
+                return RunStatus.Halted
             else:
                 raise interrupt
+        except KeyboardInterrupt:
+            return RunStatus.Interrupted
+        finally:
+            self._fsb.detach(code_guard)
+            self._counters.record_run(self.cycles - start_cycles, time.perf_counter() - start_ts)
+
+    def _debug_cycle(self):
+        # stops are raised before the instruction generator is created, so no CPU state is touched
+        address = self._cpu.get_instruction_address().value
+        if address in self._breakpoints and address != self._breakpoint_resume_address:
+            self._breakpoint_resume_address = address
+            raise DebugStop(RunStatus.Breakpoint)
+        self._breakpoint_resume_address = None
+        if self._memoizer is not None and self._memoizer.enter(address):
+            # the call was replaced by its cached result, counted as an instruction taking no cycles
+            return iter(())
+        return self._cpu_cycle()
+
+    def _update_instrumentation(self):
+        # watchpoints are served by their bus overlays, engines end the chunk after an instruction stopped by one
+        instrumented = self._breakpoints or self._memoizer is not None
+        self._next_instruction = self._debug_cycle if instrumented else self._cpu_cycle
+
+    def _watchpoint_hit(self, callback: Optional['WatchpointCallback'], hit: 'WatchpointHit'):
+        self.watchpoint_hits.append(hit)
+        if callback is None or callback(hit):
+            self._watchpoint_stop_pending = True
+
+    def add_breakpoint(self, address: int):
+        """
+        Stop runs with RunStatus.Breakpoint before executing the instruction at `address`.
+        Checked before an instruction is fetched, so a handler entered by a hardware interrupt
+        is not stopped at its first instruction.
+        """
+        self._breakpoints.add(Address(address).value)
+        self._update_instrumentation()
+
+    def remove_breakpoint(self, address: int):
+        self._breakpoints.discard(Address(address).value)
+        self._update_instrumentation()
+
+    def add_watchpoint(self, address: int, read: bool = True, write: bool = True,
+                       callback: 'WatchpointCallback' = None):
+        """
+        Record accesses to `address` in `watchpoint_hits` and stop runs with RunStatus.Watchpoint right after
+        the accessing instruction, unless `callback` is given and doesn't return True.
+        Only accesses to the watched address are routed through the watchpoint, other instructions run
+        at full speed.
+        """
+        from .debug import WatchedSlave
+        address = Address(address)
+        self.remove_watchpoint(address.value)
+        slave, local_address = self._fsb.resolve(address)
+        watched = WatchedSlave(address, slave, local_address, read, write,
+                               lambda hit: self._watchpoint_hit(callback, hit))
+        self._fsb.overlay(AddressRange(address.value, address.value + 1), watched)
+        self._watchpoints[address.value] = watched
+
+    def _reinstall_watchpoints(self):
+        # keeps watchpoints served before overlays attached or detached after them, e.g. code guards,
+        # and forwarding to the slave now serving their address
+        watchpoints = list(self._watchpoints.values())
+        for watched in watchpoints:
+            self._fsb.detach(watched)
+        for watched in watchpoints:
+            watched.retarget(*self._fsb.resolve(watched.address))
+            self._fsb.overlay(AddressRange(watched.address.value, watched.address.value + 1), watched)
+
+    def remove_watchpoint(self, address: int):
+        watched = self._watchpoints.pop(Address(address).value, None)
+        if watched is not None:
+            self._fsb.detach(watched)
+
+    def memoize(self, address: int, args: int = 1, returns: int = 1, maxsize: int = 1024) -> 'MemoizedRoutine':
+        """
+        Cache results of the subroutine at `address`, taking `args` arguments and returning `returns` values
+        by the stack calling convention. Repeated calls with the same arguments jump straight to the return
+        address with cached values pushed, least recently used results beyond `maxsize` are dropped.
+        The routine must be pure: it may only touch its own stack frame and must not depend on anything
+        but its arguments, which is not verified. Returned object holds the cache and hit statistics.
+        """
+        from .memo import Memoizer, MemoizedRoutine
+        if self._memoizer is None:
+            self._memoizer = Memoizer(self._cpu, self._fsb)
+        routine = MemoizedRoutine(Address(address).value, args, returns, maxsize)
+        self._memoizer.routines[routine.address] = routine
+        self._update_instrumentation()
+        return routine
+
+    def unmemoize(self, address: int):
+        if self._memoizer is None:
+            return
+        self._memoizer.routines.pop(Address(address).value, None)
+        if not self._memoizer.routines:
+            self._memoizer = None
+        self._update_instrumentation()
+
+    def run_for(self, cycles: int, engine=Engine.Cycle) -> RunStatus:
+        """
+        Execute a chunk of at most `cycles` cycles, so hosts can interleave execution with their own work.
+        Returns RunStatus.BudgetExhausted while the program keeps running, an instruction in flight is resumed
+        by the next call.
+        """
+        return self.run(engine=engine, max_cycles=cycles)
+
+    def step(self, instructions: int = 1, engine=Engine.Cycle) -> RunStatus:
+        """
+        Execute a chunk of at most `instructions` instructions.
+        """
+        return self.run(engine=engine, max_instructions=instructions)
+
+    def irq(self, level: int):
+        """
+        Request a hardware interrupt of the given level, served before the next instruction.
+        Ignored while replaying, when interrupts come from the log.
+        """
+        if self._replay is not None:
+            return
+        if self._recording is not None:
+            # an instruction in flight has already checked for interrupts
+            position = self.instructions + (self._cycle_iter is not None) - self._recording_base
+            self._recording.interrupts.append((position, level))
+        self._cpu.irq(level)
+
+    def post_irq(self, level: int):
+        """
+        Request a hardware interrupt from any thread, e.g. one serving host I/O for a peripheral.
+        It is requested before the next instruction and wakes up a guest idling in Wait.
+        While recording or replaying posted interrupts are requested between chunks of instructions, through `irq`.
+        """
+        self._cpu.post_irq(level)
+
+    def _request_posted_interrupts(self):
+        for level in self._cpu.take_posted_interrupts():
+            self.irq(level)
+
+    def _replay_interrupts(self, instructions: int) -> int:
+        # request interrupts due before the next instruction, and end the chunk before the next logged one
+        if self._cycle_iter is None:
+            for level in self._replay.due_interrupts(self.instructions):
+                self._cpu.irq(level)
+        next_interrupt = self._replay.next_interrupt()
+        if next_interrupt is not None:
+            instructions = min(instructions, next_interrupt - self.instructions)
+        return instructions
+
+    def start_recording(self) -> 'ExecutionLog':
+        """
+        Log values returned by peripherals and hardware interrupt requests, including the clock interrupt,
+        so the run can be reproduced by `start_replay` on a VM loaded with the same program.
+        """
+        from .replay import ExecutionLog, RecordingSlave
+        assert self._recording is None and self._replay is None, 'Already recording or replaying'
+        self._recording = ExecutionLog()
+        self._recording_base = self.instructions
+        self._cpu.drain_posted_interrupts = False
+        self._stand_in_peripherals(lambda peripheral: RecordingSlave(peripheral, self._recording))
+        return self._recording
+
+    def stop_recording(self) -> 'ExecutionLog':
+        log = self._recording
+        assert log is not None, 'Not recording'
+        self._restore_peripherals()
+        self._recording = None
+        self._cpu.drain_posted_interrupts = True
+        return log
+
+    def start_replay(self, log: 'ExecutionLog'):
+        """
+        Feed a recorded run back: peripherals are replaced by logged values, their writes are dropped,
+        and interrupts are requested at the logged instructions instead of by the clock or `irq`.
+        Replayed runs don't depend on real time, so they should be run without `frequency`.
+        """
+        from .replay import ReplayFeed, ReplaySlave
+        assert self._recording is None and self._replay is None, 'Already recording or replaying'
+        self._replay = ReplayFeed(log, self.instructions)
+        self._cpu.drain_posted_interrupts = False
+        self._stand_in_peripherals(lambda peripheral: ReplaySlave(self._replay))
+
+    def stop_replay(self):
+        assert self._replay is not None, 'Not replaying'
+        self._restore_peripherals()
+        self._replay = None
+        self._cpu.drain_posted_interrupts = True
+
+    def _checkpoint_state(self) -> 'CheckpointState':
+        from .checkpoint import CheckpointState
+        return CheckpointState(self.cycles, self.instructions, self._cpu.to_dict(), self._cpu.requested_interrupts(),
+                               self._ram.read_block(0, len(self._ram)))
+
+    def _get_checkpointer(self) -> 'Checkpointer':
+        if self._checkpointer is None:
+            from .checkpoint import Checkpointer
+            self._checkpointer = Checkpointer()
+        return self._checkpointer
+
+    def _save_checkpoint(self, path: str, background: bool):
+        changed = None
+        if self._checkpoint_pages is not None:
+            changed = self._ram.changed_ranges(self._checkpoint_pages)
+        self._get_checkpointer().save(path, self._checkpoint_state(), background, changed)
+        self._track_checkpoint_pages()
+
+    def _track_checkpoint_pages(self):
+        # pages written later are copied on write, so changed pages are found without comparing their words
+        if self._owns_ram and isinstance(self._ram, PagedRAM):
+            self._checkpoint_pages = self._ram.freeze()
+
+    def save_checkpoint(self, path: str):
+        """
+        Save CPU registers, requested interrupts, counters and RAM to `path`. Saving again to the same path
+        appends only RAM pages changed since the last checkpoint, paged RAM owned by the VM tracks them
+        as they are written. Peripherals state is not saved.
+        An instruction left in flight by a cycle budget can't be serialized, it has to be completed first,
+        e.g. by `step`.
+        """
+        if self._cycle_iter is not None:
+            raise ValueError('An instruction is in flight, complete it before saving a checkpoint')
+        self._save_checkpoint(path, background=False)
+
+    def load_checkpoint(self, path: str):
+        """
+        Restore a state saved by `save_checkpoint` into a VM with the same RAM size and peripherals.
+        """
+        state = self._get_checkpointer().load(path)
+        if len(state.ram) != len(self._ram):
+            raise ValueError(f'Checkpoint RAM size {len(state.ram)} differs from {len(self._ram)}')
+        self._ram.load(state.ram)
+        self._cpu.from_dict(state.registers)
+        self._cpu.set_requested_interrupts(state.interrupts)
+        self._cycle_iter = None
+        self.cycles = state.cycles
+        self.instructions = state.instructions
+        self._next_auto_checkpoint = self.cycles + self._auto_checkpoint_cycles
+        self._track_checkpoint_pages()
+        self._forget_memoized()
+        self._forget_verified()
+
+    def auto_checkpoint(self, path: Optional[str], every_cycles: int = 10000000):
+        """
+        Save checkpoints to `path` while running, at the first instruction boundary after every `every_cycles`
+        cycles. Files are written by a background thread. None disables automatic checkpoints.
+        """
+        self._auto_checkpoint_path = path
+        self._auto_checkpoint_cycles = every_cycles
+        self._next_auto_checkpoint = self.cycles + every_cycles
+
+    def _auto_checkpoint(self):
+        self._save_checkpoint(self._auto_checkpoint_path, background=True)
+        self._next_auto_checkpoint = self.cycles + self._auto_checkpoint_cycles
+
+    def wait_checkpoint(self):
+        """
+        Wait until the last automatic checkpoint is written.
+        """
+        if self._checkpointer is not None:
+            self._checkpointer.wait()
+
+    def _stand_in_peripherals(self, factory: Callable[[Slave], Slave]):
+        self._stand_ins = [(peripheral, factory(peripheral)) for peripheral in self._peripherals]
+        for peripheral, stand_in in self._stand_ins:
+            self._fsb.replace(peripheral, stand_in)
+
+    def _restore_peripherals(self):
+        for peripheral, stand_in in self._stand_ins:
+            self._fsb.replace(stand_in, peripheral)
+        self._stand_ins = []
+
+    def stop(self):
+        """
+        Request a running VM to stop, may be called from other threads and signal handlers.
+        """
+        self._stop_requested = True
+        self._cpu.wake()
 
     def reset(self):
         self._ram.clear()
         self._cpu.reset()
+        self._cycle_iter = None
+        self._clock_interrupt_ts = int(time.time())
+        self._forget_memoized()
+        self._forget_verified()
+        self.cycles = 0
+        self.instructions = 0
+        self._counters.reset()
+        if self._metrics is not None:
+            self._metrics.reset()
+
+    @staticmethod
+    def _native_words(program) -> List[NativeNumber]:
+        return [NativeNumber(value.value if isinstance(value, (Enum, NativeNumber, Address)) else value)
+                for value in program]
+
+    def _forget_memoized(self):
+        # cached results belong to the code they were computed by
+        if self._memoizer is not None:
+            self._memoizer.clear()
+
+    def _forget_verified(self):
+        # verified code was overwritten, later instructions are checked
+        if self._code_guard is not None:
+            self._fsb.detach(self._code_guard)
+            self._code_guard = None
+            self._reinstall_watchpoints()
+        self.verified_program = None
+        self._cpu.set_verified({})
+        self._cpu_cycle = self._cpu.cycle
+        self._update_instrumentation()
 
-    def load_program(self, program):
+    def load_program(self, program, verify: bool = False):
+        """
+        Load a program at address 0. With `verify` its code is checked by `verify.verify`, which raises
+        VerificationError, and runs with the verified dispatch until it is overwritten or another program is loaded.
+        Code in RAM shared with other VMs is not guarded against their writes.
+        """
         assert len(program) <= len(self._ram)
-        for address, value in zip(count(), program):
-            if isinstance(value, (Enum, NativeNumber, Address)):
-                value = value.value
-            self._ram[Address(address)] = NativeNumber(value)
+        self._ram.load(self._native_words(program))
+        self._forget_memoized()
+        self._forget_verified()
+        if verify:
+            from .verify import CodeGuard, verify as verify_program
+            verified = verify_program(self._ram.values(), self._memory_size, self._cpu.get_irq_levels())
+            self._code_guard = CodeGuard(self._ram, min(verified.code), verified.code, self._forget_verified)
+            self._fsb.overlay(AddressRange(min(verified.code), max(verified.code) + 1), self._code_guard)
+            self._reinstall_watchpoints()
+            self.verified_program = verified
+            self._cpu.set_verified(verified.instructions)
+            self._cpu_cycle = self._cpu.verified_cycle
+            self._update_instrumentation()
+
+    def patch(self, diff):
+        """
+        Apply (address, words) runs, as returned by asm.IncrementalAssembler.update, to RAM.
+        May be called on a stopped VM between runs, execution resumes with patched code.
+        """
+        for address, words in diff:
+            self._ram.load(self._native_words(words), address)
+        self._forget_memoized()
+        self._forget_verified()
+
+    def read_block(self, address: int, n: int) -> List[NativeNumber]:
+        """
+        Read `n` words of guest memory starting at `address`, e.g. to extract results.
+        """
+        return self._fsb.read_block(address, n)
+
+    def write_block(self, address: int, values) -> None:
+        self._fsb.write_block(address, self._native_words(values))
 
     def __getitem__(self, item: Address) -> NativeNumber:
         return self._fsb[item]
 
+    def registers(self) -> Dict[str, int]:
+        """
+        Values of CPU registers by name.
+        """
+        return self._cpu.to_dict()
+
+    def set_registers(self, registers: Dict[str, int]):
+        """
+        Restore registers returned by `registers`.
+        """
+        self._cpu.from_dict(registers)
+
+    def requested_interrupts(self) -> List[int]:
+        """
+        Levels of hardware interrupts requested and not served yet.
+        """
+        return self._cpu.requested_interrupts()
+
+    def set_requested_interrupts(self, levels: Sequence[int]):
+        self._cpu.set_requested_interrupts(levels)
+
+    def interrupts_posted(self) -> bool:
+        """
+        Whether interrupts posted by `post_irq` wait to be requested.
+        """
+        return self._cpu.interrupts_posted()
+
+    def interrupts_taken(self) -> Tuple[int, int]:
+        """
+        Numbers of entered hardware interrupt handlers and of raised software interrupts.
+        """
+        return sum(self._cpu.hardware_interrupts_taken), self._cpu.software_interrupts_raised
+
+    def instruction_in_flight(self) -> bool:
+        """
+        Whether a cycle budget stopped a run in the middle of an instruction, which the next run resumes.
+        """
+        return self._cycle_iter is not None
+
+    def instrumented(self) -> bool:
+        """
+        Whether breakpoints, watchpoints, memoized routines, recording or replay are active,
+        runs then depend on more than the VM state.
+        """
+        return bool(self._breakpoints or self._watchpoints) or self._memoizer is not None or \
+            self._recording is not None or self._replay is not None
+
+    def peripherals(self) -> List[Slave]:
+        """
+        Attached peripherals, in attachment order.
+        """
+        return list(self._peripherals)
+
+    def account_run(self, cycles: int, instructions: int, software_interrupts: int, seconds: float):
+        """
+        Count a run whose effects were applied without executing it, e.g. restored from a cache.
+        """
+        self.cycles += cycles
+        self.instructions += instructions
+        self._cpu.software_interrupts_raised += software_interrupts
+        self._counters.record_run(cycles, seconds)
+
+    def snapshot(self) -> List[NativeNumber]:
+        """
+        Copy of RAM contents, to be passed to `dump` later to show changed words only.
+        """
+        return self._ram.values()
+
+    def dump(self, file: TextIO = None, start: int = 0, end: int = None,
+             snapshot: Optional[Sequence[NativeNumber]] = None, skip_zeros: bool = True):
+        """
+        Write CPU registers and RAM words [start, end) to `file`, standard output by default.
+        """
+        file = sys.stdout if file is None else file
+        file.write(f'{self._cpu!r}\n\n')
+        self._ram.dump(file, start, end, snapshot, skip_zeros)
+
     def __repr__(self):
         return '\n\n'.join([self._cpu.__repr__(), self._ram.__repr__()])
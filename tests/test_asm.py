@@ -0,0 +1,195 @@
+import unittest
+from crash_vm import VM, RunStatus, Address, asm_compile
+from crash_vm.asm import IncrementalAssembler, CompilationError
+from crash_vm.link import assemble_module, link, LinkError
+from crash_vm.image import to_words
+from test_basic_programs import factorial_asm_program
+from test_basic_peripherals import ArgvPeripheral, TupleOutputPeripheral
+
+counter_asm_program = '''
+    loop:
+        Ld :counter
+        Add :const_1
+        St :counter
+        Jmp :loop
+    Offset 0x20
+    const_1:
+        1
+    counter:
+        0
+'''
+
+factorial_main_module = '''
+        IMPORT fun_factorial_1_1 stack
+        STK :stack  # set stack pointer
+
+        # call fun_factorial_1_1(arg)
+        A0L  # literal arg mode
+        LD :post_fun_factorial_1_1_call_0
+        PUSH  # push return address
+        A0A  # address arg mode
+        LD 0xf0  # load arg
+        PUSH
+        JMP :fun_factorial_1_1
+
+    post_fun_factorial_1_1_call_0:
+        A0A  # address arg mode
+        A0V  # value arg mode
+        A0S  # stack offset addressing mode
+        LD 0  # load returned value
+        POP 3  # cleanup returned value, arg and return address
+        A0R  # RAM addressing mode
+        ST 0xf1
+        INT 0
+'''
+
+stack_module = '''
+        EXPORT stack
+    stack:
+'''
+
+factorial_library_module = '''
+        EXPORT fun_factorial_1_1
+    fun_factorial_1_1:
+        A0A  # address arg mode
+        A0V  # value arg mode
+        A0S  # stack offset addressing mode
+        LD 0  # load arg
+        A0R  # RAM addressing mode
+        JIF :fun_factorial_1_1_arg_not_0
+        # arg == 0
+            A0L  # literal arg mode
+            A0S  # stack offset addressing mode
+            LD 1  # returned value
+            PUSH  # push returned value
+            A0A  # address arg mode
+            A0P  # pointer arg mode
+            JMP 2  # return
+        # else
+        fun_factorial_1_1_arg_not_0:
+            # call fun_factorial_1_1(arg - 1)
+            A0L  # literal arg mode
+            A0S  # stack offset addressing mode
+            LD :post_fun_factorial_1_1_call_recursive
+            PUSH  # push return address
+            A0A  # address arg mode
+            LD 1
+            A0L  # literal arg mode
+            ADD -1
+            PUSH
+            A0R  # RAM addressing mode
+            JMP :fun_factorial_1_1
+
+            post_fun_factorial_1_1_call_recursive:
+            A0A  # address arg mode
+            A0V  # value arg mode
+            A0S  # stack offset addressing mode
+            LD 0  # load fun_factorial_1_1(arg - 1), returned value
+            MUL 3  # arg * f(arg - 1), returned value
+            POP 3  # cleanup returned value, arg and return address
+            PUSH  # push returned value
+            A0P  # pointer arg mode
+            JMP 2  # return
+'''
+
+
+class TestIncrementalAssembler(unittest.TestCase):
+    def test_update_matches_compile(self):
+        source, _, _ = factorial_asm_program(5)
+        assembler = IncrementalAssembler(source)
+        self.assertEqual(to_words(assembler.program), to_words(asm_compile(source)))
+
+        changed = source.replace('Mul :a_i', 'Add :a_i')
+        diff = assembler.update(changed)
+        self.assertEqual(len(diff), 1)
+        self.assertEqual(len(diff[0][1]), 1)
+        self.assertEqual(to_words(assembler.program), to_words(asm_compile(changed)))
+
+        # inserted line shifts the following code and labels
+        inserted = changed.replace('    run:\n', '    run:\n            Noop\n')
+        assembler.update(inserted)
+        self.assertEqual(to_words(assembler.program), to_words(asm_compile(inserted)))
+
+    def test_update_error_keeps_state(self):
+        source, _, _ = factorial_asm_program(5)
+        assembler = IncrementalAssembler(source)
+        program = list(assembler.program)
+        with self.assertRaises(CompilationError):
+            assembler.update('    Noop\n' + source.replace('Mul :a_i', 'Mul :missing'))
+        with self.assertRaises(CompilationError):
+            assembler.update(source.replace('Mul :a_i', 'Bad :a_i'))
+        self.assertEqual(assembler.update(source), [])
+        self.assertEqual(assembler.program, program)
+
+    def test_live_patch(self):
+        assembler = IncrementalAssembler(counter_asm_program)
+        vm = VM()
+        vm.load_program(assembler.program)
+        self.assertEqual(vm.run(max_instructions=40), RunStatus.BudgetExhausted)
+        self.assertEqual(vm[Address(0x21)].value, 10)
+
+        vm.patch(assembler.update(counter_asm_program.replace('Jmp :loop', 'Int 0')))
+        self.assertEqual(vm.run(), RunStatus.Halted)
+        self.assertEqual(vm[Address(0x21)].value, 11)
+
+
+class TestLinker(unittest.TestCase):
+    def test_link(self):
+        program = link([factorial_main_module, factorial_library_module, stack_module])
+        library = assemble_module(factorial_library_module)
+        self.assertIs(library, assemble_module(factorial_library_module))
+        self.assertEqual(library.exports['fun_factorial_1_1'], 0)
+        self.assertEqual(program.symbols['fun_factorial_1_1'].value, len(assemble_module(factorial_main_module)))
+        self.assertEqual(program.symbols['stack'].value, len(program))
+
+        for test_in, test_out in [(0, 1), (3, 6), (5, 120)]:
+            argvp = ArgvPeripheral(test_in)
+            outp = TupleOutputPeripheral(1)
+            vm = VM(0xf0, [(1, argvp), (1, outp)])
+            vm.load_program(program)
+            self.assertEqual(vm.run(), RunStatus.Halted)
+            self.assertEqual(outp.values()[0].value, test_out)
+
+    def test_local_labels(self):
+        counter_module = '''
+            loop:
+                A0A
+                LD :counter
+                A0L
+                ADD {step}
+                A0A
+                ST :counter
+                A0L
+                LT {limit}
+                JIF :loop
+                {end}
+            counter:
+                0
+        '''
+        first = 'IMPORT finish\n' + counter_module.format(step=1, limit=3, end='JMP :finish')
+        second = 'EXPORT finish\nfinish:\n' + counter_module.format(step=2, limit=10, end='INT 0')
+        program = link([first, second])
+        # loop and counter are local to each module
+        self.assertEqual(list(program.symbols), ['finish'])
+        self.assertEqual(assemble_module(second).exports, {'finish': 0})
+        vm = VM()
+        vm.load_program(program)
+        self.assertEqual(vm.run(), RunStatus.Halted)
+        first_size = len(assemble_module(first))
+        self.assertEqual(vm[Address(first_size - 1)].value, 3)
+        self.assertEqual(vm[Address(len(program) - 1)].value, 10)
+
+    def test_link_errors(self):
+        with self.assertRaises(LinkError):
+            link([factorial_main_module, stack_module])
+        with self.assertRaises(LinkError):
+            link([factorial_main_module, factorial_library_module, factorial_library_module, stack_module])
+        # stack is not exported
+        with self.assertRaises(LinkError):
+            link([factorial_main_module, factorial_library_module, 'stack:'])
+        with self.assertRaises(LinkError):
+            assemble_module('JMP :undeclared')
+        with self.assertRaises(LinkError):
+            assemble_module('EXPORT missing')
+        with self.assertRaises(LinkError):
+            assemble_module('IMPORT loop\nloop:\nJMP :loop')
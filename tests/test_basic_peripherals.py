@@ -1,6 +1,11 @@
 import unittest
+import io
+import random
+import threading
 import time
-from crash_vm import VM, asm_compile, NativeNumber, Address
+from crash_vm import VM, MMU, RunStatus, asm_compile, NativeNumber, Address
+from crash_vm.replay import ExecutionLog, ReplayError
+from crash_vm.cpu import SWInterrupt
 from typing import Type
 
 factorial_asm_program = '''
@@ -81,6 +86,114 @@ OFFSET 0xF0
 out:
 '''
 
+bank_switch_asm_program = '''
+    # map physical page 5 to window page 0 and write 11 to its first word
+        A0L
+        LD 5
+        A0A
+        ST 0xE0
+        A0L
+        LD 11
+        A0A
+        ST 0xE2
+
+    # map physical page 6 to window page 0 and write 22 to its first word
+        A0L
+        LD 6
+        A0A
+        ST 0xE0
+        A0L
+        LD 22
+        A0A
+        ST 0xE2
+
+    # map physical page 5 back and output its first word
+        A0L
+        LD 5
+        A0A
+        ST 0xE0
+        LD 0xE2
+        ST 0x102
+        INT 0
+'''
+
+entropy_sum_asm_program = '''
+init:
+    STK :stack
+    HIH :hardware_interrupt_handlers_table
+
+loop:
+    A0A
+    LD :sum
+    ADD 0xF0  # read entropy
+    ST :sum
+    LD :ticks
+    A0L
+    GT 2
+    NOT
+    A0A
+    JIF :loop
+    INT 0
+
+fun_hwi_handler:
+    A0A
+    LD :ticks
+    A0L
+    ADD 1
+    A0A
+    ST :ticks
+    IHR
+
+hardware_interrupt_handlers_table:
+    0
+    0
+    0
+    :fun_hwi_handler
+
+sum:
+    0
+ticks:
+    0
+stack:
+'''
+
+
+wait_posted_irq_asm_program = '''
+init:
+    STK :stack
+    HIH :hardware_interrupt_handlers_table
+
+loop:
+    WAIT
+    A0A
+    LD :received
+    A0L
+    GT 2
+    NOT
+    A0A
+    JIF :loop
+    INT 0
+
+fun_io_hwi_handler:
+    A0A
+    LD :received
+    A0L
+    ADD 1
+    A0A
+    ST :received
+    IHR
+
+hardware_interrupt_handlers_table:
+    0
+    0
+    :fun_io_hwi_handler
+    0
+
+received:
+    0
+stack:
+'''
+
 
 class ArgvPeripheral:
     def __init__(self, *args):
@@ -106,6 +219,15 @@ class TupleOutputPeripheral:
         self._cells[address.value] = value
 
 
+class EntropyPeripheral:
+    def __init__(self, seed=None):
+        super().__init__()
+        self._random = random.Random(seed)
+
+    def __getitem__(self, address: Address) -> NativeNumber:
+        return NativeNumber(self._random.randrange(0x10000))
+
+
 class ProfiledQueuesOutputPeripheral:
     def __init__(self, num_queues=1):
         super().__init__()
@@ -167,3 +289,93 @@ class TestPeripherals(unittest.TestCase):
         actual_out, = self.vm_exec(clock_tick_asm_program, out_cls=ProfiledQueuesOutputPeripheral)
         self.assertSequenceEqual(list(map(lambda n: n[1].value, actual_out)), [1, 2, 3, 4, 5])
         self.assertEqual(round((actual_out[-1][0] - actual_out[0][0]) / 1000000000), 4)
+
+    def test_bank_switch_asm_program(self):
+        mmu = MMU(physical_pages=8, window_pages=2, page_size=16)
+        outp = TupleOutputPeripheral(1)
+        vm = VM(0xE0, [(len(mmu), mmu), (1, outp)])
+        vm.load_program(asm_compile(bank_switch_asm_program))
+        vm.run()
+        actual_out, = outp.values()
+        self.assertEqual(actual_out.value, 11)
+        self.assertEqual(mmu.physical(5 * 16, 5 * 16 + 1)[0].value, 11)
+        self.assertEqual(mmu.physical(6 * 16, 6 * 16 + 1)[0].value, 22)
+        self.assertEqual(mmu.physical_size(), 8 * 16)
+
+    def test_bank_switch_invalid_page(self):
+        mmu = MMU(physical_pages=8, window_pages=2, page_size=16)
+        vm = VM(0xE0, [(len(mmu), mmu)])
+        vm.load_program(asm_compile('''
+            A0L
+            LD 8
+            A0A
+            ST 0xE0
+            INT 0
+        '''))
+        with self.assertRaises(SWInterrupt) as raised:
+            vm.run()
+        self.assertEqual(raised.exception.code, SWInterrupt.ReservedCodes.InvalidPage.value)
+        self.assertEqual(mmu[Address(0)].value, 0)
+        with self.assertRaises(ValueError):
+            mmu.select(0, 8)
+
+    def test_posted_irq(self):
+        program = asm_compile(wait_posted_irq_asm_program)
+        vm = VM(0xF0)
+        vm.load_program(program)
+
+        def post():
+            for _ in range(3):
+                time.sleep(0.05)
+                vm.post_irq(2)
+
+        poster = threading.Thread(target=post)
+        poster.start()
+        self.assertEqual(vm.run(), RunStatus.Halted)
+        poster.join()
+        self.assertEqual(vm[Address(len(program) - 1)].value, 3)
+        # the guest idled instead of spinning between interrupts
+        self.assertLess(vm.instructions, 100)
+        self.assertGreater(vm.metrics.idle_seconds, 0.1)
+        with self.assertRaises(ValueError):
+            vm.post_irq(4)
+
+        vm = VM(0xF0)
+        vm.load_program(program)
+        threading.Timer(0.05, vm.stop).start()
+        self.assertEqual(vm.run(), RunStatus.Interrupted)
+
+    def test_record_replay(self):
+        program = asm_compile(entropy_sum_asm_program)
+        sum_address = len(program) - 2
+
+        recorded = VM(0xF0, [(1, EntropyPeripheral())])
+        recorded.load_program(program)
+        log = recorded.start_recording()
+        chunks = 0
+        # interrupts requested between chunks, some of them with an instruction in flight
+        while recorded.run_for(37) == RunStatus.BudgetExhausted:
+            chunks += 1
+            if chunks % 10 == 0:
+                recorded.irq(3)
+        self.assertIs(recorded.stop_recording(), log)
+        self.assertGreaterEqual(len(log.interrupts), 3)
+
+        log_file = io.BytesIO()
+        log.save(log_file)
+        log_file.seek(0)
+
+        replayed = VM(0xF0, [(1, EntropyPeripheral())])
+        replayed.load_program(program)
+        replayed.start_replay(ExecutionLog.load(log_file))
+        self.assertEqual(replayed.run(), RunStatus.Halted)
+        replayed.stop_replay()
+        self.assertEqual(replayed[Address(sum_address)], recorded[Address(sum_address)])
+        self.assertEqual(replayed._cpu.to_dict(), recorded._cpu.to_dict())
+        self.assertEqual((replayed.instructions, replayed.cycles), (recorded.instructions, recorded.cycles))
+
+        replayed = VM(0xF0, [(1, EntropyPeripheral())])
+        replayed.load_program(program)
+        replayed.start_replay(ExecutionLog(log.reads[:10], log.interrupts))
+        with self.assertRaises(ReplayError):
+            replayed.run()
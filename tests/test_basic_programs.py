@@ -1,6 +1,19 @@
 import unittest
 from enum import Enum
-from crash_vm import VM, Instructions as Ins, Address, NativeNumber, asm_compile
+from types import ModuleType
+import importlib.util
+import io
+import os
+import tempfile
+import gc
+import threading
+import time
+from crash_vm import VM, PagedRAM, Engine, RunStatus, Instructions as Ins, Address, NativeNumber, asm_compile
+from crash_vm.ram import _shared_pages
+from crash_vm.cpu import SWInterrupt
+from crash_vm._types import WORD_BITS, WORD_MASK
+from crash_vm.link import link
+from crash_vm.verify import VerificationError
 
 
 def padr(seq, num, value=0):
@@ -204,6 +217,62 @@ def function_factorial_recursive_program(a):
     ''', 80, 80)
 
 
+def call_factorial_recursive_program(a):
+    return (f'''
+        OFFSET 0
+            STK :stack  # set stack pointer
+
+            # call fun_factorial({a})
+            A0L  # literal arg mode
+            LD {a}  # set arg0
+            PUSH
+            CALL :fun_factorial
+            A0A  # address arg mode
+            A0S  # stack offset addressing mode
+            LD 0  # load returned value
+            POP 3  # cleanup returned value, arg and return address
+
+            PUSH  # push program result
+            INT 0
+
+            fun_factorial:
+                1  # number of arguments
+                A0A  # address arg mode
+                A0S  # stack offset addressing mode
+                LD 0  # load arg
+                A0R  # RAM addressing mode
+                JIF :fun_factorial_arg_not_0
+                # arg == 0
+                    A0L  # literal arg mode
+                    LD 1  # returned value
+                    PUSH  # push returned value
+                    RET 2  # return
+                # else
+                fun_factorial_arg_not_0:
+                    # call fun_factorial(arg - 1)
+                    A0L  # literal arg mode
+                    SUB 1
+                    PUSH
+                    CALL :fun_factorial
+                    A0A  # address arg mode
+                    A0S  # stack offset addressing mode
+                    LD 0  # load fun_factorial(arg - 1), returned value
+                    MUL 3  # arg * f(arg - 1), returned value
+                    POP 3  # cleanup returned value, arg and return address
+                    PUSH  # push returned value
+                    RET 2  # return
+
+        OFFSET 80
+        stack:
+    ''', 80, 80)
+
+
+infinite_loop_asm_program = '''
+    loop:
+        Jmp :loop
+'''
+
+
 def quad_equation(a, b, c):
     _temp = 247
     _2 = 248
@@ -257,6 +326,69 @@ def quad_equation(a, b, c):
     ], 128), (_sqrt_D, _x1, _x2), 247
 
 
+# divisions by zero are counted by the software interrupt handler, execution continues after them
+division_by_zero_program = '''
+init:
+    STK :stack
+    SIH :software_interrupt_handlers_table
+    A0L
+    LD 7
+    MOD 0
+    DIV 0
+    A0A
+    ST :result
+    INT 0
+
+fun_division_handler:
+    A0A
+    LD :errors
+    A0L
+    ADD 1
+    A0A
+    ST :errors
+    IHR
+
+software_interrupt_handlers_table:
+    0
+    0
+    0
+    0
+    :fun_division_handler
+errors:
+    0
+result:
+    0
+stack:
+'''
+
+# adds 1 to its result, then patches the argument of LD at address 1 to 10 through a pointer and runs again
+self_modifying_program = '''
+    A0L
+    LD 1
+    A0A
+    ADD :result
+    ST :result
+    LD :done
+    JIF :finish
+    A0L
+    LD 10
+    A0A
+    A0P
+    ST :patch_address
+    A0V
+    ST :done
+    JMP 0
+finish:
+    INT 0
+result:
+    0
+done:
+    0
+patch_address:
+    2
+'''
+
+
 class TestBasicPrograms(unittest.TestCase):
     def assertCodeSegmentUnchanged(self, program: list, vm: VM, instructions_segment_size: int):
         for i in range(instructions_segment_size):
@@ -264,13 +396,13 @@ class TestBasicPrograms(unittest.TestCase):
                                     else program[i])
             self.assertEqual(vm[Address(i)].value, expected.value)
 
-    def vm_exec(self, program, frequency=None):
-        vm = VM()
+    def vm_exec(self, program, frequency=None, ram_page_size=None, engine=Engine.Cycle):
+        vm = VM(ram_page_size=ram_page_size)
         program_code, results_addresses, instructions_segment_size = program
         if isinstance(program_code, str):
             program_code = asm_compile(program_code)
         vm.load_program(program_code)
-        vm.run(frequency)
+        vm.run(frequency, engine=engine)
         print(vm)
         self.assertCodeSegmentUnchanged(program_code, vm, instructions_segment_size)
 
@@ -325,6 +457,25 @@ class TestBasicPrograms(unittest.TestCase):
             actual_out = self.vm_exec(function_factorial_recursive_program(test_in))
             self.assertEqual(actual_out, test_out)
 
+    def test_call_ret(self):
+        for engine in (Engine.Cycle, Engine.Fast):
+            for test_in, test_out in self.factorial_test_set:
+                actual_out = self.vm_exec(call_factorial_recursive_program(test_in), engine=engine)
+                self.assertEqual(actual_out, test_out)
+
+        instructions = []
+        for program in (function_factorial_recursive_program(7), call_factorial_recursive_program(7)):
+            vm = VM()
+            vm.load_program(asm_compile(program[0]))
+            self.assertEqual(vm.run(), RunStatus.Halted)
+            instructions.append(vm.instructions)
+        self.assertLess(instructions[1], instructions[0] * 2 // 3)
+
+    def test_fact_recurs_func_fast_engine(self):
+        for test_in, test_out in self.factorial_test_set:
+            actual_out = self.vm_exec(function_factorial_recursive_program(test_in), engine=Engine.Fast)
+            self.assertEqual(actual_out, test_out)
+
     def test_quad_equation(self):
         test_set = [
             ((1, 1, 0), (1, 0, -1)),
@@ -334,3 +485,730 @@ class TestBasicPrograms(unittest.TestCase):
         for test_in, test_out in test_set:
             actual_out = self.vm_exec(quad_equation(*test_in))
             self.assertEqual(actual_out, test_out)
+
+    def test_fact_recurs_func_paged_ram(self):
+        for test_in, test_out in self.factorial_test_set:
+            actual_out = self.vm_exec(function_factorial_recursive_program(test_in), ram_page_size=16)
+            self.assertEqual(actual_out, test_out)
+
+    def test_paged_ram_sharing(self):
+        program_code = asm_compile(function_factorial_recursive_program(5)[0])
+        first, second = VM(0x1000, ram_page_size=16), VM(0x1000, ram_page_size=16)
+        first.load_program(program_code)
+        second.load_program(program_code)
+        self.assertIsInstance(first._ram, PagedRAM)
+        self.assertEqual(first._ram.resident_pages(), 0)
+        self.assertIs(first._ram._pages[0], second._ram._pages[0])
+        self.assertIs(first._ram._pages[-1], second._ram._pages[-1])
+        first.run()
+        self.assertEqual(first[Address(80)].value, 120)
+        self.assertEqual(second[Address(80)].value, 0)
+        self.assertLess(first._ram.resident_pages(), 4)
+        program_page = tuple(second._ram._pages[0])
+        self.assertIn(program_page, _shared_pages)
+        del first, second
+        gc.collect()  # the VM references itself through its bus callbacks
+        self.assertNotIn(program_page, _shared_pages)
+
+    def test_budgets(self):
+        for engine in Engine:
+            vm = VM()
+            vm.load_program(asm_compile(infinite_loop_asm_program))
+            self.assertEqual(vm.run(engine=engine, max_instructions=3000), RunStatus.BudgetExhausted)
+            self.assertEqual(vm.instructions, 3000)
+            self.assertEqual(vm.run(engine=engine, max_cycles=1000), RunStatus.BudgetExhausted)
+            self.assertGreaterEqual(vm.cycles, 3000 * 4 + 1000)
+            self.assertEqual(vm.run(engine=engine, deadline=time.monotonic() + 0.05), RunStatus.BudgetExhausted)
+            self.assertEqual(vm.run(engine=engine, deadline=time.monotonic() - 1), RunStatus.BudgetExhausted)
+        self.assertEqual(vm.cycles, vm.instructions * 4)
+
+    def test_exact_cycle_budget_resume(self):
+        program_code = asm_compile(function_factorial_recursive_program(5)[0])
+        reference = VM()
+        reference.load_program(program_code)
+        self.assertEqual(reference.run(), RunStatus.Halted)
+
+        vm = VM()
+        vm.load_program(program_code)
+        runs = 0
+        while vm.run(max_cycles=7) != RunStatus.Halted:
+            runs += 1
+            self.assertEqual(vm.cycles, runs * 7)
+        self.assertEqual(vm[Address(80)].value, 120)
+        self.assertEqual((vm.cycles, vm.instructions), (reference.cycles, reference.instructions))
+
+    def test_stop(self):
+        vm = VM()
+        vm.load_program(asm_compile(infinite_loop_asm_program))
+        timer = threading.Timer(0.05, vm.stop)
+        timer.start()
+        self.assertEqual(vm.run(engine=Engine.Fast), RunStatus.Interrupted)
+        self.assertGreater(vm.instructions, 0)
+
+    def test_breakpoint(self):
+        program_code, result_address, _ = factorial_asm_program(5)
+        vm = VM()
+        vm.load_program(asm_compile(program_code))
+        iteration_begin = 8
+        vm.add_breakpoint(iteration_begin)
+        hits = 0
+        while vm.run() == RunStatus.Breakpoint:
+            self.assertEqual(vm._cpu.get_instruction_address().value, iteration_begin)
+            hits += 1
+        self.assertEqual(hits, 4)
+        self.assertEqual(vm[Address(result_address)].value, 120)
+
+    def test_watchpoint(self):
+        program_code, result_address, _ = factorial_asm_program(5)
+        vm = VM()
+        vm.load_program(asm_compile(program_code))
+        vm.add_watchpoint(result_address, read=False)
+        self.assertEqual(vm._next_instruction, vm._cpu.cycle)
+        stops = []
+        status = vm.step()
+        while status != RunStatus.Halted:
+            if status == RunStatus.Watchpoint:
+                stops.append(vm.instructions)
+                self.assertEqual(vm[Address(result_address)].value, [5, 20, 60, 120][len(stops) - 1])
+            status = vm.step()
+        self.assertEqual(len(stops), 4)
+        self.assertEqual([(hit.write, hit.value.value) for hit in vm.watchpoint_hits],
+                         [(True, 5), (True, 20), (True, 60), (True, 120)])
+
+        # runs stop right after the accessing instruction, not at the end of a chunk of instructions
+        for engine in Engine:
+            vm.reset()
+            vm.load_program(asm_compile(program_code))
+            vm.watchpoint_hits.clear()
+            run_stops = []
+            status = vm.run(engine=engine)
+            while status == RunStatus.Watchpoint:
+                run_stops.append(vm.instructions)
+                self.assertEqual(len(vm.watchpoint_hits), len(run_stops))
+                status = vm.run(engine=engine)
+            self.assertEqual(status, RunStatus.Halted)
+            self.assertEqual(run_stops, stops)
+
+        vm.reset()
+        vm.load_program(asm_compile(program_code))
+        vm.watchpoint_hits.clear()
+        vm.add_watchpoint(result_address, callback=lambda hit: False)
+        self.assertEqual(vm.run(), RunStatus.Halted)
+        self.assertEqual(len(vm.watchpoint_hits), 8)
+        vm.remove_watchpoint(result_address)
+        self.assertEqual(vm._next_instruction, vm._cpu.cycle)
+
+    def test_watchpoint_verified(self):
+        program_code = asm_compile('''
+            A0L
+            LD 5
+            A0A
+            ST :data
+            JMP :finish
+        data:
+            0
+        finish:
+            INT 0
+        ''')
+        data_address = len(program_code) - 3
+        for watch_first in (True, False):
+            vm = VM()
+            if watch_first:
+                vm.add_watchpoint(data_address, read=False, callback=lambda hit: False)
+            vm.load_program(program_code, verify=True)
+            if not watch_first:
+                vm.add_watchpoint(data_address, read=False, callback=lambda hit: False)
+            self.assertEqual(vm.run(), RunStatus.Halted)
+            self.assertIsNotNone(vm.verified_program)
+            self.assertEqual([(hit.write, hit.value.value) for hit in vm.watchpoint_hits], [(True, 5)])
+            # the watchpoint outlives the guard of replaced code
+            vm.reset()
+            vm.load_program(program_code)
+            self.assertEqual(vm.run(), RunStatus.Halted)
+            self.assertEqual(len(vm.watchpoint_hits), 2)
+
+    def test_chunked_execution(self):
+        program_code = asm_compile(function_factorial_recursive_program(6)[0])
+        reference = VM()
+        reference.load_program(program_code)
+        reference.run()
+
+        for engine in Engine:
+            vm = VM()
+            vm.load_program(program_code)
+            chunks = 1
+            while vm.run_for(50, engine=engine) == RunStatus.BudgetExhausted:
+                chunks += 1
+            self.assertGreater(chunks, reference.cycles // 60)
+            self.assertEqual(vm[Address(80)].value, 720)
+            self.assertEqual(vm.instructions, reference.instructions)
+
+        vm = VM()
+        vm.load_program(program_code)
+        steps = 1
+        while vm.step() == RunStatus.BudgetExhausted:
+            steps += 1
+            self.assertEqual(vm.instructions, steps - 1)
+        self.assertEqual(vm[Address(80)].value, 720)
+        self.assertEqual(vm.cycles, reference.cycles)
+
+    def test_memoized_subroutine(self):
+        routine_source = function_factorial_recursive_program(0)[0].split('INT 0', 1)[1]
+        program = link([f'''
+            EXPORT fun_factorial_1_1
+            STK :stack
+            A0L  # literal arg mode
+            LD :post_call_0
+            PUSH  # push return address
+            LD 5
+            PUSH
+            JMP :fun_factorial_1_1
+            post_call_0:
+            A0A  # address arg mode
+            A0V  # value arg mode
+            A0S  # stack offset addressing mode
+            LD 0  # load returned value
+            POP 3
+            PUSH  # push first result
+            A0L  # literal arg mode
+            LD :post_call_1
+            PUSH  # push return address
+            LD 6
+            PUSH
+            A0R  # RAM addressing mode
+            JMP :fun_factorial_1_1
+            post_call_1:
+            A0A  # address arg mode
+            A0V  # value arg mode
+            A0S  # stack offset addressing mode
+            LD 0  # load returned value
+            POP 3
+            PUSH  # push second result
+            INT 0
+        ''' + routine_source.replace('OFFSET 80', 'OFFSET 120')])
+        reference = VM()
+        reference.load_program(program)
+        reference.run()
+
+        for engine in Engine:
+            vm = VM()
+            vm.load_program(program)
+            routine = vm.memoize(program.symbols['fun_factorial_1_1'].value)
+            self.assertEqual(vm.run(engine=engine), RunStatus.Halted)
+            self.assertEqual((vm[Address(120)].value, vm[Address(121)].value), (120, 720))
+            self.assertEqual(vm._cpu.to_dict(), reference._cpu.to_dict())
+            # f(6) calls f(5), which is known from the first call
+            self.assertEqual((routine.misses, routine.hits), (6 + 1, 1))
+            self.assertEqual(len(routine.cache), 7)
+            self.assertLess(vm.instructions, reference.instructions)
+
+        vm.load_program(program)
+        self.assertEqual(len(routine.cache), 0)
+        vm.unmemoize(routine.address)
+        self.assertEqual(vm._next_instruction, vm._cpu.cycle)
+
+    def test_metrics(self):
+        program_code = asm_compile(function_factorial_recursive_program(5)[0])
+        vm = VM()
+        vm.metrics.count_bus_accesses()
+        vm.load_program(program_code)
+        # clock period far below the cost of a cycle, every cycle overruns it
+        self.assertEqual(vm.run(frequency=1e9), RunStatus.Halted)
+        metrics = vm.metrics.collect()
+        self.assertEqual(metrics['instructions'], vm.instructions)
+        self.assertEqual(metrics['cycles'], vm.cycles)
+        self.assertEqual(metrics['throttle_events'], vm.cycles)
+        self.assertEqual(metrics['software_interrupts'], 1)
+        self.assertGreater(metrics['frequency'], 0)
+        ram_accesses = metrics['bus_accesses']['RAM@0x0000']
+        self.assertGreater(ram_accesses['read'], vm.instructions)
+        self.assertGreater(ram_accesses['write'], 0)
+
+        exported = vm.metrics.to_prometheus()
+        self.assertIn(f'crash_vm_instructions_total {vm.instructions}\n', exported)
+        self.assertIn('crash_vm_bus_accesses_total{device="RAM@0x0000",access="read"} '
+                      f'{ram_accesses["read"]}\n', exported)
+        self.assertIn('# TYPE crash_vm_frequency_hertz gauge\n', exported)
+
+        vm.metrics.count_bus_accesses(False)
+        self.assertNotIn('bus_accesses', vm.metrics.collect())
+
+    def test_checkpoints(self):
+        program_code = asm_compile(function_factorial_recursive_program(6)[0])
+        reference = VM(0x400)
+        reference.load_program(program_code)
+        reference.run()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'vm.checkpoint')
+            vm = VM(0x400)
+            vm.load_program(program_code)
+            vm.run_for(101)  # stops in the middle of an instruction
+            with self.assertRaises(ValueError):
+                vm.save_checkpoint(path)
+            vm.step()
+            vm.save_checkpoint(path)
+            full_size = os.path.getsize(path)
+            vm.step(20)
+            vm.save_checkpoint(path)
+            # only the page holding the stack changed
+            self.assertLess(os.path.getsize(path) - full_size, full_size // 2)
+
+            restored = VM(0x400)
+            restored.load_checkpoint(path)
+            self.assertEqual((restored.cycles, restored.instructions), (vm.cycles, vm.instructions))
+            self.assertEqual(restored._cpu.to_dict(), vm._cpu.to_dict())
+            self.assertEqual(restored.run(), RunStatus.Halted)
+            self.assertEqual(restored[Address(80)].value, 720)
+            self.assertEqual(restored._cpu.to_dict(), reference._cpu.to_dict())
+            self.assertEqual(restored.cycles, reference.cycles)
+
+            # a truncated append is ignored
+            with open(path, 'ab') as file:
+                file.write(b'CVMC\x01')
+            restored = VM(0x400)
+            restored.load_checkpoint(path)
+            self.assertEqual(restored.instructions, vm.instructions)
+
+            # paged RAM tracks changed pages instead of comparing words
+            paged_path = os.path.join(directory, 'paged.checkpoint')
+            vm = VM(0x400, ram_page_size=0x40)
+            vm.load_program(program_code)
+            vm.step(30)
+            vm.save_checkpoint(paged_path)
+            full_size = os.path.getsize(paged_path)
+            self.assertEqual(vm._ram.changed_ranges(vm._checkpoint_pages), [])
+            vm.step(20)
+            self.assertEqual(len(vm._ram.changed_ranges(vm._checkpoint_pages)), 1)
+            vm.save_checkpoint(paged_path)
+            self.assertLess(os.path.getsize(paged_path) - full_size, full_size // 2)
+            restored = VM(0x400, ram_page_size=0x40)
+            restored.load_checkpoint(paged_path)
+            self.assertEqual(restored.read_block(0, 0x400), vm.read_block(0, 0x400))
+            self.assertEqual(restored.run(), RunStatus.Halted)
+            self.assertEqual(restored[Address(80)].value, 720)
+
+            auto_path = os.path.join(directory, 'auto.checkpoint')
+            vm = VM(0x400)
+            vm.load_program(program_code)
+            vm.auto_checkpoint(auto_path, every_cycles=100)
+            while vm.step(10) == RunStatus.BudgetExhausted:
+                pass
+            vm.wait_checkpoint()
+            restored = VM(0x400)
+            restored.load_checkpoint(auto_path)
+            self.assertGreater(restored.instructions, 0)
+            self.assertEqual(restored.run(), RunStatus.Halted)
+            self.assertEqual(restored[Address(80)].value, 720)
+            self.assertEqual(restored.instructions, reference.instructions)
+
+    def test_translated(self):
+        from crash_vm.aot import translate
+        programs = [function_factorial_recursive_program(7), quad_equation(1, 2, -3), factorial_program(6),
+                    call_factorial_recursive_program(7)]
+        with tempfile.TemporaryDirectory() as directory:
+            for index, (program_code, results_addresses, _) in enumerate(programs):
+                if isinstance(program_code, str):
+                    program_code = asm_compile(program_code)
+                path = os.path.join(directory, f'translated_{index}.py')
+                with open(path, 'w') as module_file:
+                    module_file.write(translate(program_code))
+                spec = importlib.util.spec_from_file_location(f'translated_{index}', path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                self.assertGreater(len(module.BLOCKS), 0)
+
+                reference = VM()
+                reference.load_program(program_code)
+                self.assertEqual(reference.run(), RunStatus.Halted)
+                vm = VM()
+                vm.load_program(program_code)
+                self.assertEqual(vm.run_translated(module), RunStatus.Halted)
+                self.assertEqual(vm._cpu.to_dict(), reference._cpu.to_dict())
+                self.assertEqual((vm.cycles, vm.instructions), (reference.cycles, reference.instructions))
+                for address in (results_addresses if isinstance(results_addresses, tuple) else (results_addresses,)):
+                    self.assertEqual(vm[Address(address)].value, reference[Address(address)].value)
+
+                # budgets stop between blocks
+                vm = VM()
+                vm.load_program(program_code)
+                self.assertEqual(vm.run_translated(module, max_instructions=5), RunStatus.BudgetExhausted)
+                self.assertEqual(vm.run_translated(module), RunStatus.Halted)
+                self.assertEqual(vm.cycles, reference.cycles)
+
+            vm = VM()
+            vm.load_program(asm_compile(function_factorial_recursive_program(6)[0]))
+            with self.assertRaises(ValueError):
+                vm.run_translated(module)
+
+            # code written by the program is interpreted
+            program_code = asm_compile(self_modifying_program)
+            path = os.path.join(directory, 'self_modifying.py')
+            with open(path, 'w') as module_file:
+                module_file.write(translate(program_code))
+            spec = importlib.util.spec_from_file_location('self_modifying', path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            for verify in (False, True):
+                vm = VM()
+                vm.load_program(program_code, verify=verify)
+                self.assertEqual(vm.run_translated(module), RunStatus.Halted)
+                self.assertEqual(vm.read_block(len(program_code) - 3, 1)[0].value, 11)
+                self.assertIsNone(vm.verified_program)
+                self.assertEqual(len(vm._fsb.attached()), 1)
+
+            # instrumented runs are interpreted
+            vm = VM()
+            vm.load_program(program_code)
+            vm.add_breakpoint(22)  # JMP 0
+            self.assertEqual(vm.run_translated(module), RunStatus.Breakpoint)
+            self.assertEqual(vm._cpu.get_instruction_address().value, 22)
+            vm.remove_breakpoint(22)
+            # the code was patched already, it doesn't match the module anymore
+            with self.assertRaises(ValueError):
+                vm.run_translated(module)
+            self.assertEqual(vm.run(), RunStatus.Halted)
+            self.assertEqual(vm.read_block(len(program_code) - 3, 1)[0].value, 11)
+
+    def test_translated_data_literals(self):
+        from crash_vm.aot import translate
+        program_code = asm_compile('''
+            A0L
+            LD :table
+            A0A
+            ST :pointer
+        loop:
+            A0L
+            LD 7
+            A0A
+            A0P
+            ST :pointer
+            A0V
+            LD :pointer
+            A0L
+            ADD 1
+            A0A
+            ST :pointer
+            A0L
+            LT :table_end
+            JIF :loop
+            INT 0
+        pointer:
+            0
+        table:
+            0
+            0
+            0
+            0
+        table_end:
+        ''')
+        table = len(program_code) - 4
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'data_literals.py')
+            with open(path, 'w') as module_file:
+                module_file.write(translate(program_code))
+            spec = importlib.util.spec_from_file_location('data_literals', path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        # the table address is loaded as data, neither it nor the argument word of LD are blocks
+        self.assertEqual(sorted(module.BLOCKS), [0, 6])
+        self.assertTrue(all(address + len(words) <= table for address, words in module.CODE))
+        reference = VM()
+        reference.load_program(program_code)
+        self.assertEqual(reference.run(), RunStatus.Halted)
+        vm = VM()
+        vm.load_program(program_code)
+        self.assertEqual(vm.run_translated(module), RunStatus.Halted)
+        self.assertEqual([value.value for value in vm.read_block(table, 4)], [7] * 4)
+        self.assertEqual((vm.cycles, vm.instructions), (reference.cycles, reference.instructions))
+
+    def test_translated_posted_irq(self):
+        from crash_vm.aot import translate
+        program_code = asm_compile('''
+            STK :stack
+            HIH :hardware_interrupt_handlers_table
+        loop:
+            JMP :loop
+        fun_io_hwi_handler:
+            INT 0
+        fun_clock_hwi_handler:
+            IHR
+        hardware_interrupt_handlers_table:
+            0
+            0
+            :fun_io_hwi_handler
+            :fun_clock_hwi_handler
+        stack:
+        ''')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'posted_irq.py')
+            with open(path, 'w') as module_file:
+                module_file.write(translate(program_code))
+            spec = importlib.util.spec_from_file_location('posted_irq', path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        vm = VM()
+        vm.load_program(program_code)
+        posted_at = []
+
+        def post():
+            time.sleep(0.05)
+            vm.post_irq(2)
+            posted_at.append(vm.instructions)
+
+        poster = threading.Thread(target=post)
+        poster.start()
+        self.assertEqual(vm.run_translated(module, deadline=time.monotonic() + 5), RunStatus.Halted)
+        poster.join()
+        # served before the next block, as the interpreter does before the next instruction
+        self.assertLess(vm.instructions - posted_at[0], 100)
+
+    def test_division_by_zero(self):
+        from crash_vm.aot import translate
+        program_code = asm_compile(division_by_zero_program)
+        errors_address = len(program_code) - 2
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'division_by_zero.py')
+            with open(path, 'w') as module_file:
+                module_file.write(translate(program_code))
+            spec = importlib.util.spec_from_file_location('division_by_zero', path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        runs = (lambda vm: vm.run(), lambda vm: vm.run(engine=Engine.Fast), lambda vm: vm.run_translated(module))
+        reference = None
+        for verify in (False, True):
+            for run in runs:
+                vm = VM()
+                vm.load_program(program_code, verify=verify)
+                self.assertEqual(run(vm), RunStatus.Halted)
+                self.assertEqual([value.value for value in vm.read_block(errors_address, 2)], [2, 7])
+                if reference is None:
+                    reference = vm
+                self.assertEqual((vm.cycles, vm.instructions), (reference.cycles, reference.instructions))
+
+        # without a handler the interrupt stops the run
+        vm = VM()
+        vm.load_program(asm_compile('''
+            A0L
+            LD 7
+            DIV 0
+            INT 0
+        '''))
+        with self.assertRaises(SWInterrupt) as raised:
+            vm.run()
+        self.assertEqual(raised.exception.code, SWInterrupt.ReservedCodes.DivisionByZero.value)
+
+    def test_alu_instructions(self):
+        from crash_vm.aot import translate
+
+        def truncated_remainder(a, b):
+            return abs(a) % abs(b) * (-1 if a < 0 else 1)
+
+        operations = {
+            'Sub': lambda a, b: a - b,
+            'Mod': truncated_remainder,
+            'Eq': lambda a, b: int(a == b),
+            'Lt': lambda a, b: int(a < b),
+            'Shl': lambda a, b: a << min(b & WORD_MASK, WORD_BITS),
+            'Shr': lambda a, b: (a & WORD_MASK) >> min(b & WORD_MASK, WORD_BITS),
+            'BAnd': lambda a, b: a & b,
+            'BOr': lambda a, b: a | b,
+            'BXor': lambda a, b: a ^ b,
+        }
+        operands = [(7, 3), (-7, 3), (7, -3), (-32768, 1), (32767, -1), (5, 5), (0x1234, 4), (-1, 15), (1, 16),
+                    (-2, 100)]
+        for name, operation in operations.items():
+            source = ''.join(f'''
+                A0L
+                Ld {a}
+                A0A
+                {name} :b{index}
+                St :r{index}
+            ''' for index, (a, _) in enumerate(operands)) + '        Int 0\n' + ''.join(f'''
+            b{index}:
+                {b}
+            r{index}:
+                0
+            ''' for index, (_, b) in enumerate(operands))
+            program_code = asm_compile(source)
+            module = ModuleType('translated')
+            exec(translate(program_code), module.__dict__)
+            runs = (lambda vm: vm.run(), lambda vm: vm.run(engine=Engine.Fast), lambda vm: vm.run_translated(module))
+            for run in runs:
+                vm = VM()
+                vm.load_program(program_code)
+                self.assertEqual(run(vm), RunStatus.Halted)
+                for index, (a, b) in enumerate(operands):
+                    address = len(program_code) - 2 * len(operands) + 2 * index + 1
+                    self.assertEqual(vm[Address(address)].value, NativeNumber(operation(a, b)).value, (name, a, b))
+
+    def test_block_memory_instructions(self):
+        program_code = asm_compile('''
+                STK :stack
+                HIH :hardware_interrupt_handlers_table
+                MSET :fill           # 0x100..0x13f = 7
+                MCPY :copy           # 0x100..0x11f -> 0x180..0x19f, interrupted by the test
+                A0L
+                LD 1
+                A0A
+                ST 0x10c
+                MCPY :overlapping    # 0x100..0x11f -> 0x104..0x123
+                INT 0
+
+            fun_clock_hwi_handler:
+                A0A
+                LD :handled
+                A0L
+                ADD 1
+                A0A
+                ST :handled
+                IHR
+
+            hardware_interrupt_handlers_table:
+                0
+                0
+                0
+                :fun_clock_hwi_handler
+
+            fill:
+                7
+                0x100
+                0x40
+            copy:
+                0x100
+                0x180
+                0x20
+            overlapping:
+                0x100
+                0x104
+                0x20
+            handled:
+                0
+            stack:
+        ''')
+        handled = len(program_code) - 1
+
+        for engine, posted in ((Engine.Cycle, False), (Engine.Fast, False), (Engine.Cycle, True)):
+            vm = VM(0x200)
+            vm.load_program(program_code)
+            # stop in the middle of the copy and raise the clock interrupt
+            vm.run(engine=engine, max_instructions=3)
+            vm.run(engine=Engine.Cycle, max_cycles=20)
+            if posted:
+                vm.post_irq(3)
+            else:
+                vm.irq(3)
+            self.assertEqual(vm.run(engine=engine), RunStatus.Halted)
+            self.assertEqual(vm[Address(handled)].value, 1)
+            self.assertEqual([vm[Address(address)].value for address in range(0x180, 0x1a0)], [7] * 0x20)
+            self.assertEqual(vm[Address(0x1a0)].value, 0)
+            self.assertEqual([vm[Address(address)].value for address in range(0x100, 0x141)],
+                             [7] * 0x10 + [1] + [7] * 0x2f + [0])
+            # only the interrupted descriptor holds the progress at the interrupt
+            fill, copy, overlapping = handled - 9, handled - 6, handled - 3
+            self.assertEqual([vm[Address(address)].value for address in range(fill, fill + 3)], [7, 0x100, 0x40])
+            self.assertEqual([vm[Address(address)].value for address in range(overlapping, overlapping + 3)],
+                             [0x100, 0x104, 0x20])
+            source, destination, count = (vm[Address(address)].value for address in range(copy, copy + 3))
+            self.assertTrue(0 < count < 0x20)
+            self.assertEqual((source - 0x100, destination - 0x180), (0x20 - count, 0x20 - count))
+
+    def test_registers(self):
+        vm = VM(0x100)
+        vm.load_program(asm_compile('''
+            A0L
+            LD 42
+            INT 0
+        '''))
+        vm.run()
+        registers = vm.registers()
+        self.assertEqual(set(registers), {'IA', 'OC', 'OM', 'A0', 'AC', 'SP', 'HI', 'SI', 'IL'})
+        self.assertEqual(registers['AC'], 42)
+
+    def test_dump(self):
+        def w(value):
+            # a word as dumped
+            return f'{value & WORD_MASK:0{WORD_BITS // 4}x}'
+
+        vm = VM(0x10000 - 0x10)
+        vm.write_block(0x20, [1, 2, 3])
+        vm.write_block(0x8000, [-1])
+        output = io.StringIO()
+        vm.dump(output)
+        lines = output.getvalue().splitlines()
+        ram_lines = lines[lines.index(f'RAM(65520x{WORD_BITS} bits)') + 3:]
+        zeros = ' ' + w(0)
+        self.assertEqual(ram_lines, [
+            '    *',
+            f'    {w(0x20)} : {w(1)} {w(2)} {w(3)}' + zeros * 13,
+            '    *',
+            f'    {w(0x8000)} : {w(-1)}' + zeros * 15,
+            '    *',
+        ])
+
+        snapshot = vm.snapshot()
+        vm.write_block(0x21, [7])
+        vm.write_block(0xffe0, [9])
+        output = io.StringIO()
+        vm.dump(output, snapshot=snapshot)
+        self.assertEqual(output.getvalue().splitlines()[-2:],
+                         [f'    {w(0x20)} : {" " * len(w(0))} {w(7)}', f'    {w(0xffe0)} : {w(9)}'])
+
+        output = io.StringIO()
+        vm.dump(output, start=0x24, end=0x31, skip_zeros=False)
+        self.assertEqual(output.getvalue().splitlines()[-2:], [f'    {w(0x20)} : {w(1)} {w(7)} {w(3)}' + zeros * 13,
+                                                               f'    {w(0x30)} :' + zeros * 16])
+        self.assertEqual(repr(vm._ram).splitlines()[3:], [
+            '    *',
+            f'    {w(0x20)} : {w(1)} {w(7)} {w(3)}' + zeros * 13,
+            '    *',
+            f'    {w(0x8000)} : {w(-1)}' + zeros * 15,
+            '    *',
+            f'    {w(0xffe0)} : {w(9)}' + zeros * 15,
+        ])
+
+    def test_verified_dispatch(self):
+        for program in (factorial_asm_program(7), function_factorial_recursive_program(7),
+                        call_factorial_recursive_program(7), quad_equation(1, -3, 2)):
+            program_code = asm_compile(program[0]) if isinstance(program[0], str) else program[0]
+            for engine in (Engine.Cycle, Engine.Fast):
+                states = []
+                for verify in (False, True):
+                    vm = VM()
+                    vm.load_program(program_code, verify=verify)
+                    self.assertEqual(vm.run(engine=engine), RunStatus.Halted)
+                    states.append((vm._cpu.to_dict(), vm.cycles, vm.instructions, vm.snapshot()))
+                    self.assertEqual(vm.verified_program is not None, verify)
+                self.assertEqual(states[0], states[1])
+
+        for source, address in [
+                ('Ld :data\nNeg\n0x99\ndata:\n1', 3),  # invalid opcode
+                ('A0L\nLd 1\nA0A\nSt :code\ncode:\nInt 0', 4),  # store into code
+                ('Ld 0x200\nInt 0', 0),  # unmapped argument
+        ]:
+            with self.assertRaises(VerificationError) as raised:
+                VM().load_program(asm_compile(source), verify=True)
+            self.assertEqual(raised.exception.address, address)
+
+        # computed stores into code are caught at run time and the program continues with checked dispatch
+        self_modifying = asm_compile('''
+                A0L
+                Ld 0xff
+                A0P
+                St :pointer
+                A0V
+            patched:
+                Neg
+                A0A
+                St :result
+                Int 0
+            pointer:
+                :patched
+            result:
+                0
+        ''')
+        vm = VM()
+        vm.load_program(self_modifying, verify=True)
+        self.assertEqual(vm.run(), RunStatus.Halted)
+        self.assertIsNone(vm.verified_program)
+        self.assertEqual(vm[Address(len(self_modifying) - 1)].value, 0xff)
@@ -0,0 +1,44 @@
+import unittest
+from crash_vm import VM, Bus, RAM, PagedRAM, AddressRange, Address, NativeNumber
+
+
+class WordOutputPeripheral:
+    def __init__(self, size):
+        super().__init__()
+        self._cells = [NativeNumber(0)] * size
+
+    def __getitem__(self, address: Address) -> NativeNumber:
+        return self._cells[address.value]
+
+    def __setitem__(self, address: Address, value: NativeNumber) -> None:
+        self._cells[address.value] = value
+
+
+class TestBlockTransfers(unittest.TestCase):
+    def test_block_spanning_slaves(self):
+        output = WordOutputPeripheral(4)
+        vm = VM(8, [(4, output)])
+        vm.write_block(6, range(1, 7))
+        self.assertEqual([value.value for value in vm.read_block(4, 8)], [0, 0, 1, 2, 3, 4, 5, 6])
+        self.assertEqual([value.value for value in output._cells], [3, 4, 5, 6])
+        with self.assertRaises(ValueError):
+            vm.read_block(10, 4)
+
+    def test_block_with_overlay(self):
+        vm = VM(16)
+        vm.add_watchpoint(5, callback=lambda hit: False)
+        vm.write_block(0, range(16))
+        self.assertEqual([value.value for value in vm.read_block(0, 16)], list(range(16)))
+        self.assertEqual([(hit.write, hit.value.value) for hit in vm.watchpoint_hits], [(True, 5), (False, 5)])
+
+    def test_paged_ram_blocks(self):
+        bus = Bus()
+        ram = PagedRAM(64, 16)
+        bus.attach(AddressRange(0, 64), ram)
+        bus.write_block(10, [NativeNumber(value) for value in range(30)])
+        self.assertEqual(ram.resident_pages(), 3)
+        self.assertEqual([value.value for value in bus.read_block(8, 34)], [0, 0] + list(range(30)) + [0, 0])
+
+        plain = RAM(64)
+        plain.write_block(10, ram.read_block(10, 30))
+        self.assertEqual(plain.values(), ram.values())
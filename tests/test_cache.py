@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+from crash_vm import VM, Engine, RunStatus, asm_compile
+from crash_vm.cache import ResultCache
+from crash_vm.peripherals import ArgvPeripheral, OutputPeripheral
+from test_basic_peripherals import factorial_asm_program, clock_tick_asm_program, TupleOutputPeripheral
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.temp_dir.name)
+        self.program = asm_compile(factorial_asm_program)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def factorial_vm(self, arg):
+        output = OutputPeripheral(1)
+        vm = VM(0xf0, [(1, ArgvPeripheral(arg)), (1, output)])
+        vm.load_program(self.program)
+        return vm, output
+
+    def test_hit(self):
+        vm, output = self.factorial_vm(5)
+        result = self.cache.run(vm)
+        self.assertFalse(result.hit)
+        self.assertEqual(result.status, RunStatus.Halted)
+        self.assertEqual(result.outputs, [[120]])
+
+        cached_vm, cached_output = self.factorial_vm(5)
+        cached = self.cache.run(cached_vm)
+        self.assertTrue(cached.hit)
+        self.assertEqual(cached_output.values()[0].value, 120)
+        self.assertEqual(cached_vm.registers(), vm.registers())
+        self.assertEqual((cached_vm.cycles, cached_vm.instructions), (vm.cycles, vm.instructions))
+
+        # other inputs and budgets are other runs
+        self.assertFalse(self.cache.run(self.factorial_vm(4)[0]).hit)
+        self.assertFalse(self.cache.run(self.factorial_vm(5)[0], max_instructions=10).hit)
+        self.assertTrue(self.cache.run(self.factorial_vm(5)[0], max_instructions=10).hit)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 3))
+
+    def test_budget_hit_continues(self):
+        vm, output = self.factorial_vm(5)
+        self.assertEqual(self.cache.run(vm, max_instructions=30).status, RunStatus.BudgetExhausted)
+        self.assertEqual(vm.run(), RunStatus.Halted)
+
+        cached_vm, cached_output = self.factorial_vm(5)
+        cached = self.cache.run(cached_vm, max_instructions=30)
+        self.assertTrue(cached.hit)
+        self.assertEqual(cached.status, RunStatus.BudgetExhausted)
+        reference, _ = self.factorial_vm(5)
+        reference.run(max_instructions=30)
+        self.assertEqual(cached_vm.snapshot(), reference.snapshot())
+        self.assertEqual(cached_vm.metrics.collect()['software_interrupts'],
+                         reference.metrics.collect()['software_interrupts'])
+        self.assertGreater(cached_vm.metrics.run_seconds, 0)
+        self.assertEqual(cached_vm.run(), RunStatus.Halted)
+        self.assertEqual(cached_output.values()[0].value, 120)
+        self.assertEqual((cached_vm.cycles, cached_vm.instructions), (vm.cycles, vm.instructions))
+
+    def test_engine_key(self):
+        vm, _ = self.factorial_vm(5)
+        self.assertFalse(self.cache.run(vm, engine=Engine.Fast, max_cycles=10).hit)
+        cycle_vm, _ = self.factorial_vm(5)
+        self.assertFalse(self.cache.run(cycle_vm, engine=Engine.Cycle, max_cycles=10).hit)
+        self.assertEqual(cycle_vm.cycles, 10)
+        self.assertTrue(cycle_vm.instruction_in_flight())
+
+    def test_instrumented_uncacheable(self):
+        self.cache.run(self.factorial_vm(5)[0])
+        vm, _ = self.factorial_vm(5)
+        vm.add_breakpoint(2)
+        result = self.cache.run(vm)
+        self.assertFalse(result.hit)
+        self.assertEqual(result.status, RunStatus.Breakpoint)
+        self.assertEqual(self.cache.uncacheable, 1)
+        vm.remove_breakpoint(2)
+        vm.add_watchpoint(0xf1, read=False)
+        self.assertIsNone(self.cache.key(vm, None, None))
+        vm.remove_watchpoint(0xf1)
+        vm.start_recording()
+        self.assertIsNone(self.cache.key(vm, None, None))
+
+    def test_uncacheable(self):
+        vm = VM(0xf0, [(1, ArgvPeripheral(5)), (1, TupleOutputPeripheral(1))])
+        vm.load_program(self.program)
+        self.assertFalse(self.cache.run(vm).hit)
+        self.assertEqual(self.cache.uncacheable, 1)
+
+        # the clock interrupt handler makes the run depend on the wall clock
+        vm = VM(0xf0, [(1, OutputPeripheral(1))])
+        vm.load_program(asm_compile(clock_tick_asm_program))
+        vm._clock_interrupt_ts -= 1
+        self.assertEqual(self.cache.run(vm, max_instructions=VM.BUDGET_CHECK_PERIOD * 2).status,
+                         RunStatus.BudgetExhausted)
+        self.assertEqual(vm._cpu.hardware_interrupts_taken[3], 1)
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+    def test_eviction(self):
+        def entry_path(arg):
+            key = self.cache.key(self.factorial_vm(arg)[0], None, None)
+            return os.path.join(self.temp_dir.name, key + '.json')
+
+        for arg in (1, 2):
+            self.cache.run(self.factorial_vm(arg)[0])
+            os.utime(entry_path(arg), (arg, arg))
+        self.cache.max_bytes = os.path.getsize(entry_path(1)) + os.path.getsize(entry_path(2)) + 16
+        # the oldest entry is used again and outlives the second one
+        self.assertTrue(self.cache.run(self.factorial_vm(1)[0]).hit)
+        self.cache.run(self.factorial_vm(3)[0])
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)),
+                         sorted(os.path.basename(entry_path(arg)) for arg in (1, 3)))
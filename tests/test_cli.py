@@ -0,0 +1,108 @@
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from crash_vm import VM, RunStatus, asm_compile
+from crash_vm.__main__ import main
+from crash_vm._types import WORD_BITS
+from crash_vm.peripherals import ArgvPeripheral, OutputPeripheral
+from test_basic_peripherals import factorial_asm_program
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestCLI(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source_path = os.path.join(self.temp_dir.name, 'factorial.asm')
+        with open(self.source_path, 'w') as source:
+            source.write(factorial_asm_program)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def cli_exec(self, *argv):
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            exit_code = main(list(argv))
+        self.assertEqual(exit_code, 0)
+        return json.loads(stdout.getvalue())
+
+    def test_run_source(self):
+        for engine in ('cycle', 'fast'):
+            result = self.cli_exec('run', self.source_path, '--arg', '5', '--engine', engine)
+            self.assertEqual(result['status'], 'halted')
+            self.assertEqual(result['out'], [120])
+            self.assertGreater(result['cycles'], result['instructions'])
+            verified = self.cli_exec('run', self.source_path, '--arg', '5', '--engine', engine, '--verify')
+            self.assertEqual((verified['out'], verified['cycles']), (result['out'], result['cycles']))
+
+    def test_run_image(self):
+        image_path = os.path.join(self.temp_dir.name, 'factorial.img')
+        main(['compile', self.source_path, '-o', image_path])
+        result = self.cli_exec('run', image_path, '--arg', '4', '--ram', '0xf0')
+        self.assertEqual(result['out'], [24])
+
+        # images of the other word size are rejected instead of loaded as other words
+        other_path = os.path.join(self.temp_dir.name, 'other.img')
+        environment = dict(os.environ, CRASH_VM_WORD_BITS='32' if WORD_BITS == 16 else '16')
+        subprocess.check_call([sys.executable, '-m', 'crash_vm', 'compile', self.source_path, '-o', other_path],
+                              cwd=ROOT, env=environment)
+        with self.assertRaises(ValueError):
+            main(['run', other_path])
+        with open(image_path, 'r+b') as image:
+            image.write(b'RAW!')
+        with self.assertRaises(ValueError):
+            main(['run', image_path])
+
+    def test_max_cycles(self):
+        result = self.cli_exec('run', self.source_path, '--arg', '5', '--max-cycles', '10')
+        self.assertEqual(result['status'], 'budget_exhausted')
+        self.assertEqual(result['cycles'], 10)
+
+    def test_run_32_bit_words(self):
+        # the word size is fixed when crash_vm is imported, so runs are done by fresh interpreters
+        environment = dict(os.environ, CRASH_VM_WORD_BITS='32')
+        for engine in ('cycle', 'fast'):
+            output = subprocess.check_output([sys.executable, '-m', 'crash_vm', 'run', self.source_path, '--arg', '12',
+                                              '--engine', engine, '--verify'], cwd=ROOT, env=environment)
+            self.assertEqual(json.loads(output)['out'], [479001600])
+        # 16 bit words overflow
+        self.assertEqual(self.cli_exec('run', self.source_path, '--arg', '12')['out'],
+                         [-1024 if WORD_BITS == 16 else 479001600])
+
+    def test_lazy_imports(self):
+        script = ('import json, sys, crash_vm; vm = crash_vm.VM(); vm.add_breakpoint(1); vm.run(max_instructions=1); '
+                  'print(json.dumps([name for name in sys.modules if name.startswith("crash_vm.")]))')
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=ROOT)
+        loaded = set(json.loads(output))
+        for module in ('asm', 'debug', 'memo', 'metrics', 'replay', 'checkpoint', 'verify', 'smp'):
+            self.assertNotIn(f'crash_vm.{module}', loaded)
+
+    def test_run_cache(self):
+        cache_path = os.path.join(self.temp_dir.name, 'cache')
+        first = self.cli_exec('run', self.source_path, '--arg', '5', '--cache', cache_path)
+        second = self.cli_exec('run', self.source_path, '--arg', '5', '--cache', cache_path)
+        self.assertEqual((first['cached'], second['cached']), (False, True))
+        for key in ('status', 'out', 'registers', 'cycles', 'instructions'):
+            self.assertEqual(first[key], second[key])
+
+    def test_translate(self):
+        module_path = os.path.join(self.temp_dir.name, 'factorial_aot.py')
+        self.assertEqual(main(['translate', self.source_path, '-o', module_path]), 0)
+        spec = importlib.util.spec_from_file_location('factorial_aot', module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        output = OutputPeripheral(1)
+        vm = VM(0xf0, [(1, ArgvPeripheral(5)), (1, output)])
+        vm.load_program(asm_compile(factorial_asm_program))
+        self.assertEqual(vm.run_translated(module), RunStatus.Halted)
+        self.assertEqual(output.values()[0].value, 120)
+        result = self.cli_exec('run', self.source_path, '--arg', '5')
+        self.assertEqual((vm.cycles, vm.instructions), (result['cycles'], result['instructions']))
@@ -0,0 +1,129 @@
+import unittest
+from crash_vm import Address, RunStatus, asm_compile
+
+try:
+    from crash_vm import MultiCoreVM
+except ImportError:  # multiprocessing.shared_memory requires python 3.8
+    MultiCoreVM = None
+
+RAM_SIZE = 0xf0
+
+locked_counter_asm_program = '''
+    take:
+        A0L
+        LD 1
+        A0A
+        XCHG :lock  # spin until the lock is free
+        JIF :take
+        LD :remaining
+        NOT
+        JIF :done
+        LD :remaining
+        A0L
+        ADD -1
+        A0A
+        ST :remaining
+        LD :counter
+        A0L
+        ADD 1
+        A0A
+        ST :counter
+        A0L
+        LD 0
+        A0A
+        ST :lock
+        JMP :take
+    done:
+        A0L
+        LD 0
+        A0A
+        ST :lock
+        INT 0
+
+    lock:
+        0
+    remaining:
+        300
+    counter:
+        0
+'''
+
+ipi_asm_program = f'''
+        LD {RAM_SIZE}  # core index
+        JIF :core_1
+    # core 0 waits for core 1 to install its handler and interrupts it
+    wait_ready:
+        LD :ready
+        NOT
+        JIF :wait_ready
+        A0L
+        LD 1
+        A0A
+        ST {RAM_SIZE}
+        INT 0
+
+    core_1:
+        STK :stack
+        HIH :hardware_interrupt_handlers_table
+        A0L
+        LD 1
+        A0A
+        ST :ready
+    spin:
+        LD :flag
+        NOT
+        JIF :spin
+        INT 0
+
+    fun_ipi_handler:
+        A0L
+        LD 1
+        A0A
+        ST :flag
+        IHR
+
+    hardware_interrupt_handlers_table:
+        0
+        :fun_ipi_handler
+        0
+        0
+    ready:
+        0
+    flag:
+        0
+    stack:
+'''
+
+
+@unittest.skipIf(MultiCoreVM is None, 'multiprocessing.shared_memory is not available')
+class TestMultiCore(unittest.TestCase):
+    def test_locked_counter(self):
+        program = asm_compile(locked_counter_asm_program)
+        with MultiCoreVM(2, RAM_SIZE) as vm:
+            vm.load_program(program)
+            results = vm.run(timeout=60)
+            self.assertEqual([result.status for result in results], [RunStatus.Halted] * 2)
+            counter_address = len(program) - 1
+            self.assertEqual(vm[Address(counter_address)].value, 300)
+            self.assertEqual(vm[Address(counter_address - 1)].value, 0)
+
+    def test_inter_processor_interrupt(self):
+        with MultiCoreVM(2, RAM_SIZE) as vm:
+            vm.load_program(asm_compile(ipi_asm_program))
+            results = vm.run(timeout=60)
+            self.assertEqual([result.status for result in results], [RunStatus.Halted] * 2)
+            self.assertEqual(results[1].registers['IL'], 0)
+
+    def test_failed_core_stops_others(self):
+        with MultiCoreVM(2, RAM_SIZE) as vm:
+            vm.load_program(asm_compile(f'''
+                LD {RAM_SIZE}
+                JIF :core_1
+            loop:
+                JMP :loop
+            core_1:
+                INT 5
+            '''))
+            results = vm.run(timeout=60)
+            self.assertEqual(results[0].status, RunStatus.Interrupted)
+            self.assertEqual(results[1].interrupt, 5)
@@ -0,0 +1,43 @@
+import pickle
+import unittest
+from crash_vm import NativeNumber, Address
+from crash_vm._types import ADDRESSES, MAX_FLYWEIGHTS, NATIVE_NUMBERS, SIGN_BIT, WORD_BITS, WORD_MASK
+
+
+class TestTypes(unittest.TestCase):
+    def test_native_number_range(self):
+        self.assertEqual(NativeNumber(SIGN_BIT - 1).value, SIGN_BIT - 1)
+        self.assertEqual(NativeNumber(SIGN_BIT).value, -SIGN_BIT)
+        self.assertEqual(NativeNumber(-1).value, -1)
+        self.assertEqual(NativeNumber(WORD_MASK + 2).value, 1)
+
+    def test_address_range(self):
+        self.assertEqual(Address(-1).value, WORD_MASK)
+        self.assertEqual(Address(WORD_MASK + 2).value, 1)
+
+    @unittest.skipUnless(WORD_BITS == 16, 'wide words are dropped by their tables')
+    def test_flyweight(self):
+        self.assertIs(NativeNumber(5), NativeNumber(0x10005))
+        self.assertIs(Address(-1), Address(0xffff))
+        self.assertIs(pickle.loads(pickle.dumps(NativeNumber(-7))), NativeNumber(-7))
+
+    @unittest.skipUnless(WORD_BITS == 32, 'only wide words reach the table bound')
+    def test_bounded_flyweights(self):
+        first = NativeNumber(-7)
+        for value in range(MAX_FLYWEIGHTS + 1):
+            NativeNumber(value << 8)
+            Address(value << 8)
+        self.assertLessEqual(len(NATIVE_NUMBERS), MAX_FLYWEIGHTS)
+        self.assertLessEqual(len(ADDRESSES), MAX_FLYWEIGHTS)
+        # instances dropped by the table are still equal to new ones
+        self.assertEqual(first, NativeNumber(-7))
+        self.assertEqual(hash(first), hash(NativeNumber(-7)))
+        self.assertNotEqual(first, NativeNumber(7))
+        self.assertNotEqual(NativeNumber(7), Address(7))
+        self.assertEqual(pickle.loads(pickle.dumps(first)), first)
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            NativeNumber(1).value = 2
+        with self.assertRaises(AttributeError):
+            Address(1).other = 2
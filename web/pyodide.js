@@ -43,6 +43,9 @@ languagePluginLoader.then(() => {
 	});
 });
 
+// cycles executed between yielding to the browser
+const RUN_CHUNK_CYCLES = 20000;
+
 function run() {
 	let bytecode = crash_vm.asm_compile(code_editor.getValue());
 	let in_arg_input = document.getElementById('in_arg_input');
@@ -50,12 +53,35 @@ function run() {
 	let out_peripheral = {};
 	let vm = crash_vm.VM(0xf0, [[1, in_peripheral], [1, out_peripheral]]);
 	vm.load_program(bytecode);
-	vm.run();
-	let log_text_area = document.getElementById('log_text_area');
-	let result_string = 'Result:\n';
-	for (let key in out_peripheral) {
-		result_string += out_peripheral[key].value.toString() + '\n';
+	let run_button = document.getElementById('run_button');
+	run_button.disabled = true;
+
+	function show_result() {
+		let log_text_area = document.getElementById('log_text_area');
+		let result_string = 'Result:\n';
+		for (let key in out_peripheral) {
+			result_string += out_peripheral[key].value.toString() + '\n';
+		}
+		log_text_area.value = result_string + '\n\n' + vm.toString();
+		log_text_area.removeAttribute('hidden');
+		run_button.disabled = false;
 	}
-	log_text_area.value = result_string + '\n\n' + vm.toString();
-	log_text_area.removeAttribute('hidden');
+
+	function run_chunk() {
+		let status;
+		try {
+			status = vm.run_for(RUN_CHUNK_CYCLES).value;
+		} catch (e) {
+			run_button.disabled = false;
+			throw e;
+		}
+		if (status === 'halted') {
+			show_result();
+		} else {
+			// let the page render and handle input before the next chunk
+			setTimeout(run_chunk, 0);
+		}
+	}
+
+	run_chunk();
 }